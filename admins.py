@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+
+from aiogram import types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+logger = logging.getLogger(f'TrueModer.{__name__}')
+
+ADMINS_TTL = 10 * 60  # seconds to trust cached administrators of chat
+RECHECK_INTERVAL = 5  # seconds, user not found among administrators is rechecked by fetching them again
+REFRESH_AHEAD = 0.8  # part of ttl after which cached administrators are refreshed in background
+
+INVALIDATING_TYPES = types.ContentType.NEW_CHAT_MEMBERS + types.ContentType.LEFT_CHAT_MEMBER
+
+
+class AdminCache:
+    """
+    Administrators of chats, fetched at once by getChatAdministrators
+
+    Fresh entries are served from memory, entries close to expiration are served and refreshed in background,
+    expired ones are fetched again. Concurrent fetches of one chat share one API call.
+    """
+
+    def __init__(self, bot, ttl=ADMINS_TTL, clock=time.monotonic):
+        self._bot = bot
+        self.ttl = ttl
+        self.clock = clock
+        self._chats = {}
+        self._fetching = {}
+
+        self.hits = 0
+        self.fetches = 0
+
+    def __len__(self):
+        return len(self._chats)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.fetches
+        return self.hits / total if total else 0.0
+
+    async def _fetch(self, chat_id):
+        try:
+            members = await self._bot.get_chat_administrators(chat_id)
+            admins = frozenset(member.user.id for member in members if member.is_admin())
+            self._chats[chat_id] = admins, self.clock()
+            self.fetches += 1
+            logger.debug('Fetched %d administrators of chat %s', len(admins), chat_id)
+            return admins
+        finally:
+            del self._fetching[chat_id]
+
+    def _fetch_once(self, chat_id):
+        fetching = self._fetching.get(chat_id)
+        if fetching is None:
+            fetching = self._fetching[chat_id] = asyncio.ensure_future(self._fetch(chat_id))
+        return fetching
+
+    def _refresh_in_background(self, chat_id):
+        if chat_id in self._fetching:
+            return
+
+        def done(future):
+            if not future.cancelled() and future.exception():
+                logger.warning('Failed to refresh administrators of chat %s: %s', chat_id, future.exception())
+
+        self._fetch_once(chat_id).add_done_callback(done)
+
+    async def get(self, chat_id):
+        """
+        Get administrators of chat
+
+        :param chat_id:
+        :return: user ids of administrators
+        :rtype: frozenset
+        """
+        entry = self._chats.get(chat_id)
+        if entry is None:
+            return await asyncio.shield(self._fetch_once(chat_id))
+
+        admins, fetched = entry
+        age = self.clock() - fetched
+
+        if age >= self.ttl:
+            try:
+                return await asyncio.shield(self._fetch_once(chat_id))
+            except Exception as e:
+                logger.warning('Failed to fetch administrators of chat %s, stale ones are used: %s', chat_id, e)
+                return admins
+
+        if age >= self.ttl * REFRESH_AHEAD:
+            self._refresh_in_background(chat_id)
+
+        self.hits += 1
+        return admins
+
+    async def is_admin(self, chat_id, user_id, recheck=False):
+        """
+        :param chat_id:
+        :param user_id:
+        :param recheck: fetch administrators again if user is not among cached ones,
+            unless they were fetched less than RECHECK_INTERVAL ago
+        :return: True if user is administrator of chat
+        :rtype: bool
+        """
+        if user_id in await self.get(chat_id):
+            return True
+
+        entry = self._chats.get(chat_id)
+        if not recheck or entry is None or self.clock() - entry[1] < RECHECK_INTERVAL:
+            return False
+
+        try:
+            return user_id in await asyncio.shield(self._fetch_once(chat_id))
+        except Exception as e:
+            logger.warning('Failed to recheck administrators of chat %s: %s', chat_id, e)
+            return False
+
+    def invalidate(self, chat_id):
+        """ Forget administrators of chat, they will be fetched on next check """
+        self._chats.pop(chat_id, None)
+
+
+class AdminCacheMiddleware(BaseMiddleware):
+    """
+    Invalidates administrators of chat when members of chat change
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        super(AdminCacheMiddleware, self).__init__()
+
+    async def on_pre_process_message(self, message: types.Message):
+        if message.content_type in INVALIDATING_TYPES:
+            self.cache.invalidate(message.chat.id)
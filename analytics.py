@@ -0,0 +1,197 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import Counter, deque
+
+logger = logging.getLogger(f'TrueModer.{__name__}')
+
+BUFFER_SIZE = 10000  # events kept at most, the new ones are dropped above that
+BATCH_SIZE = 100  # events sent at once
+FLUSH_INTERVAL = 5  # seconds between flushes of not full batch
+SAMPLE_WATERMARK = 0.5  # part of buffer filled, above which events are sampled
+
+
+class BaseSink:
+    """
+    Analytics events buffer, flushed in batches by size or by time
+
+    Registering never blocks. Above `watermark` part of buffer events are sampled with probability
+    falling to zero at full buffer, every kept event carries its weight. Events of full buffer are dropped.
+    Sampled out and dropped events are counted by intent.
+    """
+
+    def __init__(self, buffer_size=BUFFER_SIZE, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 watermark=SAMPLE_WATERMARK, loop=None):
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.watermark = watermark
+        self.loop = loop
+
+        self._buffer = deque()
+        self._batch_ready = asyncio.Event()
+        self._flusher = None
+        self._random = random.Random()
+
+        self.registered = 0
+        self.sent = 0
+        self.failed = 0
+        self.sampled_out = Counter()
+        self.dropped = Counter()
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def register_message(self, user_id, intent, message=None):
+        """
+        Register message of user
+
+        :param user_id:
+        :param intent: intention of user, e.g. 'normal message'
+        :param message: text of message
+        :return: True if event is buffered
+        :rtype: bool
+        """
+        self.registered += 1
+        fill = len(self._buffer) / self.buffer_size
+
+        if fill >= 1:
+            self.dropped[intent] += 1
+            return False
+
+        weight = 1.0
+        if fill > self.watermark:
+            probability = (1 - fill) / (1 - self.watermark)
+            if self._random.random() >= probability:
+                self.sampled_out[intent] += 1
+                return False
+            weight = 1 / probability
+
+        self._buffer.append({'time': time.time(), 'user_id': user_id, 'intent': intent, 'message': message,
+                             'weight': weight})
+        if len(self._buffer) >= self.batch_size:
+            self._batch_ready.set()
+        return True
+
+    async def send(self, events):
+        """
+        Send batch of events
+
+        :param events: list of event dicts
+        """
+        raise NotImplementedError
+
+    async def flush(self):
+        """ Send all buffered events """
+        while self._buffer:
+            count = min(self.batch_size, len(self._buffer))
+            events = [self._buffer.popleft() for _ in range(count)]
+            try:
+                await self.send(events)
+            except Exception:
+                self.failed += len(events)
+                logger.exception('Failed to send %d analytics events', len(events))
+            else:
+                self.sent += len(events)
+
+        if self.sampled_out or self.dropped:
+            logger.warning('Analytics overloaded, sampled out: %s, dropped: %s',
+                           dict(self.sampled_out), dict(self.dropped))
+
+    async def _flush_periodically(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await self.flush()
+
+    async def open(self):
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+        if self._flusher is None:
+            self._flusher = self.loop.create_task(self._flush_periodically())
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+
+
+class NullSink(BaseSink):
+    """
+    Discards events, for running without analytics
+    """
+
+    async def send(self, events):
+        pass
+
+
+class JSONLSink(BaseSink):
+    """
+    Appends events to local file, one json per line
+    """
+
+    def __init__(self, path, **kwargs):
+        super(JSONLSink, self).__init__(**kwargs)
+        self.path = path
+
+    def _write(self, lines):
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.writelines(lines)
+
+    async def send(self, events):
+        lines = [json.dumps(event, ensure_ascii=False) + '\n' for event in events]
+        await self.loop.run_in_executor(None, self._write, lines)
+
+
+class ChatbaseSink(BaseSink):
+    """
+    Sends events to Chatbase, one batch per request
+    """
+
+    def __init__(self, cb, **kwargs):
+        """
+        :param cb: Chatbase client
+        :type cb: aiochatbase.Chatbase
+        """
+        super(ChatbaseSink, self).__init__(**kwargs)
+        self.cb = cb
+
+    async def send(self, events):
+        messages = [await self.cb.prepare_message(user_id=event['user_id'], intent=event['intent'],
+                                                  message=event['message'], time_stamp=event['time'])
+                    for event in events]
+        await self.cb.register_messages(messages, task=False)
+
+    async def close(self):
+        await super(ChatbaseSink, self).close()
+        await self.cb.close()
+
+
+def get_sink(mode, **kwargs):
+    """
+    Get analytics sink by ANALYTICS mode
+
+    :param mode: 'chatbase', 'jsonl' or False to discard events
+    :param kwargs: sink arguments, `cb` for Chatbase and `path` for JSONL
+    :return: sink
+    :rtype: BaseSink
+    """
+    cb = kwargs.pop('cb', None)
+    path = kwargs.pop('path', None)
+
+    if not mode:
+        return NullSink(**kwargs)
+
+    if mode == 'jsonl':
+        return JSONLSink(path, **kwargs)
+
+    if mode == 'chatbase':
+        return ChatbaseSink(cb, **kwargs)
+
+    raise ValueError(f'Unknown ANALYTICS mode: {mode!r}')
@@ -1,108 +1,173 @@
-import asyncio
+import logging
+import time
+from array import array
+from collections import OrderedDict
 
 from aiogram import types
-from aiogram.dispatcher import CancelHandler, DEFAULT_RATE_LIMIT, ctx
+from aiogram.dispatcher import CancelHandler
 from aiogram.dispatcher.middlewares import BaseMiddleware
-from aiogram.utils import context
-from aiogram.utils.exceptions import Throttled
+import metrics
 from languages import underscore as _
 
+logger = logging.getLogger(f'TrueModer.{__name__}')
 
 FLOOD_LOCK_MESSAGE = _('<b>Не надо флудить!</b>')
 FLOOD_MUTE_TIME = 120  # seconds
 
+BURST_COUNT = 5  # messages at most...
+BURST_WINDOW = 2  # ...in that many seconds
+SUSTAINED_COUNT = 20  # messages at most...
+SUSTAINED_WINDOW = 60  # ...in that many seconds
+MAX_TRACKED = 100000  # users tracked at most, the longest idle are dropped first
 
-def rate_limit(limit: float, key=None):
-    """
-    Decorator for configuring rate limit and key in different functions.
+# verdicts
+BURST = 'burst'
+SUSTAINED = 'sustained'
+FLOODING = 'flooding'  # message of already punished user
 
-    :param limit:
-    :param key:
-    :return:
-    """
 
-    def decorator(func):
-        setattr(func, 'throttling_rate_limit', limit)
-        if key:
-            setattr(func, 'throttling_key', key)
-        return func
+class FloodRecord:
+    """
+    Ring buffer of last message timestamps of user in chat and the last album of user
+    """
+    __slots__ = 'times', 'index', 'last', 'muted_until', 'media_group'
 
-    return decorator
+    def __init__(self, size):
+        self.times = array('d', [float('-inf')]) * size
+        self.index = 0
+        self.last = 0.0
+        self.muted_until = 0.0
+        self.media_group = None
 
 
-class ThrottlingMiddleware(BaseMiddleware):
-    """
-    Simple middleware
+class FloodDetector:
     """
+    Sliding window flood detector keyed by (chat_id, user_id)
 
-    def __init__(self, limit=DEFAULT_RATE_LIMIT, key_prefix='antiflood_'):
-        self.rate_limit = limit
-        self.prefix = key_prefix
-        super(ThrottlingMiddleware, self).__init__()
+    Each message is checked in O(1): it is flood if message `count - 1` messages earlier
+    is within the window of burst or sustained threshold.
+    Records are kept in order of activity, idle ones are evicted from the front on every check.
+    """
 
-    async def on_process_message(self, message: types.Message):
+    def __init__(self, burst_count=BURST_COUNT, burst_window=BURST_WINDOW, sustained_count=SUSTAINED_COUNT,
+                 sustained_window=SUSTAINED_WINDOW, mute_time=FLOOD_MUTE_TIME, max_size=MAX_TRACKED,
+                 clock=time.monotonic):
+        self.burst_count = burst_count
+        self.burst_window = burst_window
+        self.sustained_count = sustained_count
+        self.sustained_window = sustained_window
+        self.mute_time = mute_time
+        self.max_size = max_size
+        self.clock = clock
+
+        self.size = max(burst_count, sustained_count)
+        self.idle = max(burst_window, sustained_window, mute_time)
+        self._records = OrderedDict()
+
+    def __len__(self):
+        return len(self._records)
+
+    def _evict(self, now):
+        records = self._records
+        while records:
+            record = next(iter(records.values()))
+            if now - record.last <= self.idle and len(records) <= self.max_size:
+                break
+            records.popitem(last=False)
+
+    def hit(self, chat_id, user_id, media_group_id=None):
         """
-        This handler is called when dispatcher receives a message
+        Register message of user in chat. Album arrives as a message per item, so it is counted once
 
-        :param message:
+        :param chat_id:
+        :param user_id:
+        :param media_group_id: album of message
+        :return: BURST or SUSTAINED if message starts flood, FLOODING if user is already punished, else None
+        :rtype: str or None
         """
-        # Get current handler
-        handler = context.get_value('handler')
+        now = self.clock()
+        key = chat_id, user_id
 
-        # Get dispatcher from context
-        dispatcher = ctx.get_dispatcher()
-
-        # If handler was configured, get rate limit and key from handler
-        if handler:
-            limit = getattr(handler, 'throttling_rate_limit', self.rate_limit)
-            key = getattr(handler, 'throttling_key', f"{self.prefix}_{handler.__name__}")
+        record = self._records.get(key)
+        if record is None:
+            record = self._records[key] = FloodRecord(self.size)
         else:
-            limit = self.rate_limit
-            key = f"{self.prefix}_message"
+            self._records.move_to_end(key)
 
-        # Use Dispatcher.throttle method.
-        try:
-            await dispatcher.throttle(key, rate=limit)
-        except Throttled as t:
-            # Execute action
-            await self.message_throttled(message, t)
+        if media_group_id is not None and media_group_id == record.media_group:
+            record.last = now
+            return FLOODING if now < record.muted_until else None
+        record.media_group = media_group_id
 
-            # Cancel current handler
-            raise CancelHandler()
+        times = record.times
+        index = record.index
+        times[index] = now
+        record.index = (index + 1) % self.size
+        record.last = now
+        self._evict(now)
 
-    async def message_throttled(self, message: types.Message, throttled: Throttled):
-        """
-        Notify user only on first exceed and notify about unlocking only on last exceed
+        if now < record.muted_until:
+            return FLOODING
 
-        :param message:
-        :param throttled:
+        verdict = None
+        if now - times[(index - self.burst_count + 1) % self.size] <= self.burst_window:
+            verdict = BURST
+        elif now - times[(index - self.sustained_count + 1) % self.size] <= self.sustained_window:
+            verdict = SUSTAINED
+
+        if verdict:
+            record.muted_until = now + self.mute_time
+        return verdict
+
+
+class FloodMiddleware(BaseMiddleware):
+    """
+    Checks every group message with flood detector, administrators are not checked.
+    User is muted on flood start, their messages are not handled until mute ends
+    """
+
+    def __init__(self, moder, detector=None):
+        """
+        :param moder: moderator
+        :type moder: moderator.Moderator
+        :param detector: flood detector
         """
-        from engine import moder
+        self.moder = moder
+        self.detector = detector or FloodDetector()
+        super(FloodMiddleware, self).__init__()
+
+    async def on_pre_process_message(self, message: types.Message):
+        from config import super_admins
 
         chat = message.chat
         user = message.from_user
-        handler = context.get_value('handler')
-        dispatcher = ctx.get_dispatcher()
 
-        if handler:
-            key = getattr(handler, 'throttling_key', f"{self.prefix}_{handler.__name__}")
-        else:
-            key = f"{self.prefix}_message"
+        if not user or not types.ChatType.is_group_or_super_group(chat):
+            return
+
+        if user.id in super_admins or await self.moder.admins.is_admin(chat.id, user.id):
+            return
 
-        # Calculate how many time is left till the block ends
-        delta = throttled.rate - throttled.delta
+        verdict = self.detector.hit(chat.id, user.id, message.media_group_id)
+        if not verdict:
+            return
 
-        # Prevent flooding
-        if throttled.exceeded_count <= 2:
-            await moder.restrict_user(chat.id, user.id, FLOOD_MUTE_TIME)
-            await message.reply(FLOOD_LOCK_MESSAGE)
+        metrics.THROTTLED.inc(verdict)
+        if verdict != FLOODING:
+            await self.message_flooded(message, verdict)
 
-        # Sleep.
-        await asyncio.sleep(delta)
+        raise CancelHandler()
 
-        # Check lock status
-        thr = await dispatcher.check_key(key)
+    async def message_flooded(self, message: types.Message, verdict):
+        """
+        Mute user and notify chat
+
+        :param message:
+        :param verdict: BURST or SUSTAINED
+        """
+        chat = message.chat
+        user = message.from_user
 
-        # # If current message is not last with current key - do not send message
-        # if thr.exceeded_count == throttled.exceeded_count:
-        #     await message.reply('Unlocked.')
+        logger.info('%s flood from user %s in chat %s', verdict.capitalize(), user.id, chat.id)
+        await self.moder.restrict_user(chat.id, user.id, self.detector.mute_time)
+        await self.moder.say(chat.id, FLOOD_LOCK_MESSAGE)
@@ -0,0 +1,63 @@
+"""
+Explicit matcher throughput: default my_patterns path vs strict external_patterns mode
+
+Usage: python -m benchmarks.bench_explicit [count]
+"""
+import logging
+import re
+import sys
+import time
+
+from benchmarks import corpus
+from explicit import matcher, external_patterns
+
+
+def run(texts, cache_size=0, **kwargs):
+    """
+    Run matcher over texts
+
+    :param cache_size: verdict cache size, 0 to measure matching itself
+    :return: messages per second
+    :rtype: float
+    """
+    matcher.cache.clear()
+    matcher.cache.size = cache_size
+
+    start = time.perf_counter()
+    for text in texts:
+        matcher.match(text, **kwargs)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def run_naive(texts):
+    """
+    Run every external pattern one by one, as it would be done without strict matcher
+
+    :return: messages per second
+    :rtype: float
+    """
+    patterns = [re.compile(pattern, flags=re.IGNORECASE) for pattern in external_patterns]
+
+    start = time.perf_counter()
+    for text in texts:
+        any(pattern.search(text) for pattern in patterns)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main(count=20000):
+    logging.disable(logging.CRITICAL)
+    texts = corpus.mixed(count)
+
+    # compile strict patterns before measuring
+    _ = matcher.strict
+
+    print(f'{count} messages of mixed chat text')
+    print(f'my_patterns:            {run(texts):10.0f} msg/s')
+    print(f'strict:                 {run(texts, strict=True):10.0f} msg/s')
+    print(f'strict, 1 ms budget:    {run(texts, strict=True, budget=0.001):10.0f} msg/s')
+    print(f'naive external_patterns: {run_naive(texts):9.0f} msg/s')
+    print(f'strict, verdict cache:  {run(texts, cache_size=4096, strict=True):10.0f} msg/s')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,103 @@
+"""
+Multiprocess webhook throughput: fake Telegram posts updates to master, workers parse them and search explicit
+
+Usage: python -m benchmarks.bench_webhook [count] [workers...]
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import sys
+import time
+
+from benchmarks import corpus
+import cluster
+
+CONCURRENCY = 64  # webhook requests at once, like Telegram with max_connections
+
+
+def bench_worker(socket_path, processed):
+    """
+    Worker doing the CPU part of update handling: parse update and search explicit in strict mode
+
+    :param socket_path:
+    :param processed: shared counter of processed updates
+    """
+    from aiogram import types
+    from explicit import matcher
+
+    logging.disable(logging.CRITICAL)
+    matcher.cache.size = 0
+    _ = matcher.strict
+
+    async def process(body):
+        update = types.Update(**json.loads(body))
+        matcher.match(update.message.text, strict=True)
+        with processed.get_lock():
+            processed.value += 1
+
+    cluster.run_worker(socket_path, process, loop=asyncio.new_event_loop())
+
+
+async def post_updates(url, updates):
+    import aiohttp
+
+    queue = iter(updates)
+
+    async def sender(session):
+        for body in queue:
+            async with session.post(url, data=body, headers={'Content-Type': 'application/json'}) as response:
+                await response.read()
+
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(sender(session) for _ in range(CONCURRENCY)))
+
+
+async def run(updates, workers):
+    """
+    Run master and workers, post updates and wait for all of them to be processed
+
+    :return: updates per second
+    :rtype: float
+    """
+    from aiohttp import web
+
+    processed = multiprocessing.Value('i', 0)
+    processes, sockets = cluster.start_workers(workers, bench_worker, (processed,))
+    master = cluster.Master(sockets)
+    runner = web.AppRunner(master.make_app('/webhook'))
+
+    try:
+        await cluster.wait_sockets(sockets)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+
+        start = time.perf_counter()
+        await post_updates(f'http://{host}:{port}/webhook', updates)
+        while processed.value < len(updates):
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - start
+
+    finally:
+        await master.close()
+        await runner.cleanup()
+        cluster.stop_workers(processes)
+
+    print(f'{workers} workers: {len(updates) / elapsed:8.0f} updates/s, routed {master.forwarded}')
+    return len(updates) / elapsed
+
+
+def main(count=5000, workers=(1, 2, 4)):
+    logging.disable(logging.CRITICAL)
+    updates = corpus.updates(count)
+
+    print(f'{count} updates from 100 chats, {multiprocessing.cpu_count()} cpu')
+    for number in workers:
+        asyncio.get_event_loop().run_until_complete(run(updates, number))
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args[:1], *([args[1:]] if args[1:] else []))
@@ -0,0 +1,185 @@
+"""
+Synthetic chat corpora for benchmarks
+"""
+import json
+import random
+import re
+
+CLEAN = (
+    'Привет всем, как дела?',
+    'Кто-нибудь знает, во сколько завтра встреча?',
+    'Спасибо, всё получилось',
+    'Скиньте ссылку на документацию, пожалуйста',
+    'Сегодня отличная погода, пойдём гулять в парк после работы',
+    'Я опоздаю минут на десять, начинайте без меня',
+    'А у кого-нибудь была такая ошибка при установке?',
+    'Обновил до последней версии, теперь всё работает быстрее',
+    'ок',
+    'Да, согласен',
+    'Ребята, давайте не будем ругаться и вернёмся к теме чата',
+    'Посмотрите исходники, там всё подробно описано в комментариях',
+    'Кто поедет на конференцию в следующем месяце?',
+    'Хорошая идея, надо попробовать на выходных',
+    'Сабля висела на стене рядом с картой',
+    'Цена выросла на сто рублей, но это всё равно дешевле, чем в магазине',
+    'Не стоит злоупотреблять кофе перед сном',
+    'Можно вопрос по поводу настройки сервера? У меня падает при старте',
+    'Вечером созвонимся и всё обсудим',
+    'Не психуй, сейчас разберёмся',
+)
+
+EXPLICIT = (
+    'Да пиздец какой-то',
+    'хуй знает, что с этим делать',
+    'бля, опять сломалось',
+    'ну ты и хуйло',
+    'Это просто пиздец, ребята',
+    'заебали уже со своими вопросами',
+)
+
+OBFUSCATED = (
+    'ну ты и х.у.й',
+    'п-и-з-д-е-ц полный',
+    'ж0па какая-то',
+    'xyйня всё это',
+    'ну и с у к а же ты',
+    'м_у_д_а_к',
+)
+
+DURATIONS = (
+    '!мут',
+    '!мут 5 минут',
+    '!мут на 30 мин',
+    '!молчи 2 часа',
+    '!мут на полчаса',
+    '!мут на пару часов',
+    '!мут на несколько минут',
+    '!бан на день',
+    '!бан 3 дня',
+    '!бан на сутки',
+    '!бан на пару недель',
+    '!бан на полгода, потому что достал',
+)
+
+# clean words containing letters of explicit stems
+LOOKALIKE = tuple('''
+    хлеб хлебать хлебнуть хлебница хлебопек хлебушек колебаться колеблясь колебля колебание колеблют мандарин мандарины
+    мандат мандолина мандраж команда командир командировка скомандовать дерматолог дерматин хулиган хулиганы
+    хулиганство хула хулить корабль корабля корабел оскорблять оскорбление оскорбляют потреблять потребляют употреблять
+    употребляя злоупотреблять злоупотребляя потребитель рубль рубля сабля сабли сабельный грабли гребля конопля
+    небо небеса ребенок ребята требовать требует гребень погреб погребение учебник учеба учебный учебка себе себя
+    хребет щебет щебетать скребок сдобный удобный подобный особенно особый лебедь лебедка серебро серебряный вебинар
+    гиперболе амеба зебра ибо любо любой любовь глубокий глубина голубь голубой стебель мебель мебельщик колыбель
+    гибель небольшой неблагодарный неблизкий небрежно ебонит сукно сукна искусство искусный сусек суккулент сутки
+    сутра суть сучок сучить наука науки ракурс ручка рука поручение безрукавка мука мукомол мудрость мудрый
+    премудрость мудрец мудрёный муза музей музыка муравей манеж манера мантия манто манифест рахманинов германия
+    романтика пиджак пиджаки пион пионер пиво пижама пилот пицца спидометр спидвей педагог педагогика педаль педант
+    педиатр педиатрия педикюр энциклопедия жокей жонглер жолудь жоржина гандбол гондола гондольер говор говорить
+    говядина блюдо блюдце блюз облако облака бляха бляшка трахея трахеит трахома страх страхование страховка сражение
+    срам срамной сравнить сравнение сразу страница сорока херувим херувимский херсон херес хересский хэллоуин хек
+    хвала ахиллес ахинея нахимов нахал нахлобучить нахмуриться нахрап шеренга шерсть шериф дура дурак дураки дурман
+    дурной чмок чмокнуть тварь творог лохматый лохань лохмотья лохнесс ананас анестезия падение падать падеж запад
+    западный западня паспорт залп курган курьер елка минерал миндаль мина министр минута сектор секунда поскольку
+'''.split())
+
+VOCABULARY = tuple(sorted({word for text in CLEAN for word in re.findall(r'\w+', text.lower())}))
+
+_URL = re.compile(r'https?://\S+')
+
+
+def messages(corpus, count, seed=0):
+    """
+    Make list of messages from corpus
+
+    :param corpus: tuple of texts
+    :param count: messages count
+    :param seed: random seed
+    :return: list of messages
+    :rtype: list
+    """
+    rnd = random.Random(seed)
+    return [rnd.choice(corpus) for _ in range(count)]
+
+
+def mixed(count, seed=0, explicit_share=0.05, obfuscated_share=0.02):
+    """
+    Make realistic chat stream: mostly clean messages with some explicit and obfuscated ones
+
+    :return: list of messages
+    :rtype: list
+    """
+    rnd = random.Random(seed)
+    result = []
+
+    for _ in range(count):
+        roll = rnd.random()
+        if roll < obfuscated_share:
+            result.append(rnd.choice(OBFUSCATED))
+        elif roll < obfuscated_share + explicit_share:
+            result.append(rnd.choice(EXPLICIT))
+        else:
+            result.append(rnd.choice(CLEAN))
+
+    return result
+
+
+def chatter(count, seed=0, explicit_share=0.05, obfuscated_share=0.02, link_share=0.02):
+    """
+    Make chat stream of unique messages: random words of clean corpus with some explicit, obfuscated
+    and link messages. Unlike `mixed`, different users don't repeat each other, so it doesn't look like raid
+
+    :return: list of messages
+    :rtype: list
+    """
+    rnd = random.Random(seed)
+    result = []
+
+    for index in range(count):
+        text = ' '.join(rnd.choice(VOCABULARY) for _ in range(rnd.randint(1, 12))).capitalize()
+        roll = rnd.random()
+        if roll < obfuscated_share:
+            text = f'{text} {rnd.choice(OBFUSCATED)}'
+        elif roll < obfuscated_share + explicit_share:
+            text = f'{text} {rnd.choice(EXPLICIT)}'
+        elif roll < obfuscated_share + explicit_share + link_share:
+            text = f'{text} https://example.com/{index}'
+        result.append(text)
+
+    return result
+
+
+def updates(count, chats=100, users=1000, seed=0, texts=None):
+    """
+    Make fake Telegram updates with text messages of mixed stream in supergroups
+
+    :param count: updates count
+    :param chats: count of chats
+    :param users: count of users
+    :param seed: random seed
+    :param texts: texts of messages, mixed stream by default
+    :return: list of raw json updates
+    :rtype: list
+    """
+    rnd = random.Random(seed)
+    result = []
+
+    for update_id, text in enumerate(texts or mixed(count, seed), 1):
+        chat_id = -1001000000000 - rnd.randrange(chats)
+        user_id = 100000 + rnd.randrange(users)
+        update = {
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'from': {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}'},
+                'chat': {'id': chat_id, 'title': f'Chat {chat_id}', 'type': 'supergroup'},
+                'date': 1530000000 + update_id,
+                'text': text,
+            },
+        }
+        urls = [{'type': 'url', 'offset': match.start(), 'length': match.end() - match.start()}
+                for match in _URL.finditer(text)]
+        if urls:
+            update['message']['entities'] = urls
+        result.append(json.dumps(update, ensure_ascii=False, separators=(',', ':')).encode())
+
+    return result
@@ -0,0 +1,257 @@
+"""
+Benchmark suite of moderation pipeline with JSON results:
+explicit search on clean, explicit and obfuscated corpora, duration parser and end-to-end update handling
+by dispatcher with Bot API stubbed by aresponses, with pre-dispatch filter and without it
+
+Usage: python -m benchmarks.suite [--count N] [--output results.json] [--baseline old.json [--tolerance 0.2]]
+Exits with code 1 if messages per second or p99 latency of any benchmark is worse than baseline by tolerance.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import platform
+import re
+import sys
+import time
+
+from benchmarks import corpus
+
+TOLERANCE = 0.2  # part of baseline, by which result may be worse
+TOKEN = '123456789:AAEswagGNsfuREYdagrCPkgLvda1C_5frsZs'
+
+
+def result(name, latencies, elapsed, cpu):
+    """
+    Result of benchmark
+
+    :param name:
+    :param latencies: seconds of every call
+    :param elapsed: seconds of all calls
+    :param cpu: CPU seconds of process during all calls
+    :rtype: dict
+    """
+    latencies = sorted(latencies)
+    return {
+        'name': name,
+        'count': len(latencies),
+        'per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 4),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 4),
+        'cpu_ms': round(cpu / len(latencies) * 1000, 4),
+    }
+
+
+def measure(name, func, items):
+    """ Call func on every item """
+    latencies = []
+    start, cpu_start = time.perf_counter(), time.process_time()
+    for item in items:
+        call_start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - call_start)
+    return result(name, latencies, time.perf_counter() - start, time.process_time() - cpu_start)
+
+
+async def measure_async(name, func, items):
+    """ Await func on every item """
+    latencies = []
+    start, cpu_start = time.perf_counter(), time.process_time()
+    for item in items:
+        call_start = time.perf_counter()
+        await func(item)
+        latencies.append(time.perf_counter() - call_start)
+    return result(name, latencies, time.perf_counter() - start, time.process_time() - cpu_start)
+
+
+def bench_explicit(count):
+    from explicit import matcher
+
+    matcher.cache.size = 0
+    _ = matcher.strict
+
+    results = []
+    for name, texts in (('clean', corpus.messages(corpus.CLEAN, count)),
+                        ('explicit', corpus.messages(corpus.EXPLICIT, count)),
+                        ('obfuscated', corpus.messages(corpus.OBFUSCATED, count)),
+                        ('mixed', corpus.mixed(count))):
+        results.append(measure(f'explicit.{name}', matcher.match, texts))
+        results.append(measure(f'explicit.{name}.strict', lambda text: matcher.match(text, strict=True), texts))
+    return results
+
+
+def bench_get_time(count):
+    from aiogram import types
+    import duration
+    from moderator import Moderator
+
+    texts = corpus.messages(corpus.DURATIONS, count)
+    messages = [types.Message(text=text) for text in texts]
+    loop = asyncio.new_event_loop()
+    try:
+        return [measure('duration.parse', duration.parse, texts),
+                loop.run_until_complete(measure_async('get_time', Moderator.get_time, messages))]
+    finally:
+        loop.close()
+
+
+API_RESULTS = {
+    'getMe': {'id': 1, 'is_bot': True, 'first_name': 'TrueModer', 'username': 'TrueModerBot'},
+    'sendMessage': {'message_id': 1, 'date': 1530000000, 'chat': {'id': 1, 'type': 'supergroup'}},
+    'getChatAdministrators': [],
+    'getChat': {'id': 1, 'type': 'supergroup'},
+}
+_METHOD = re.compile(r'/bot[^/]+/(\w+)')
+
+
+async def api_handler(request):
+    """ Fake Bot API: every request succeeds """
+    from aiohttp import web
+
+    method = _METHOD.match(request.path).group(1)
+    return web.json_response({'ok': True, 'result': API_RESULTS.get(method, True)})
+
+
+def bench_dispatcher(count, prefilter=True):
+    """
+    Handle updates one by one with real handlers and middlewares. Bot API limits are lifted,
+    storage and analytics are disabled, so only handling itself is measured
+
+    :param count: updates
+    :param prefilter: use pre-dispatch filter
+    """
+    import config
+
+    config.TELEGRAM_TOKEN = TOKEN
+    config.PROXY_URL = ''
+    config.DB_MODE = False
+    config.ANALYTICS = False
+    config.EXPLICIT_WORKERS = 0
+    config.METRICS_DUMP_INTERVAL = False
+    config.PREFILTER = prefilter
+
+    from aiogram import types
+    from aresponses import ResponsesMockServer
+    import bot
+    import engine
+    from scheduler import ActionScheduler
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    app = engine.get_app(loop)
+    app.dp.run_tasks_by_default = False
+    app.moder.scheduler = app.moder.deletions.scheduler = ActionScheduler(rate=1e9, burst=1e9, chat_rate=1e9,
+                                                                          chat_burst=1e9, enforce_chat_rate=1e9,
+                                                                          enforce_chat_burst=1e9)
+    app.moder.deletions.delay = 0
+
+    updates = [types.Update(**json.loads(body)) for body in corpus.updates(count, texts=corpus.chatter(count))]
+
+    async def run():
+        async with ResponsesMockServer() as server:
+            server.add(response=api_handler, repeat=server.INFINITY)
+            await bot.setup(app.dp)
+            try:
+                name = 'dispatcher' if prefilter else 'dispatcher.full_chain'
+                return await measure_async(name, app.dp.process_update, updates)
+            finally:
+                await bot.on_shutdown(app.dp)
+
+    try:
+        return [loop.run_until_complete(run())]
+    finally:
+        loop.close()
+
+
+def isolated(func, *args):
+    """ Run benchmark in own process, so the application of one run doesn't leak to another """
+    with multiprocessing.Pool(1) as pool:
+        return pool.apply(func, args)
+
+
+def run(count):
+    """
+    Run all benchmarks
+
+    :param count: messages of every benchmark
+    :rtype: dict
+    """
+    logging.disable(logging.CRITICAL)
+    benchmarks = (
+        ('explicit', bench_explicit, (count,)),
+        ('get_time', bench_get_time, (count,)),
+        ('dispatcher.full_chain', isolated, (bench_dispatcher, count, False)),
+        ('dispatcher', isolated, (bench_dispatcher, count, True)),
+    )
+    results = []
+    for name, func, args in benchmarks:
+        # failed benchmark shouldn't lose results of others
+        try:
+            results += func(*args)
+        except Exception as e:
+            results.append({'name': name, 'skipped': f'{type(e).__name__}: {e}'})
+    return {
+        'python': platform.python_version(),
+        'cpu_count': multiprocessing.cpu_count(),
+        'count': count,
+        'results': results,
+    }
+
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    """
+    Find regressions against baseline
+
+    :param report: current results
+    :param baseline: old results
+    :param tolerance: part of baseline, by which result may be worse
+    :return: descriptions of regressions
+    :rtype: list
+    """
+    old = {item['name']: item for item in baseline['results']}
+    regressions = []
+
+    for item in report['results']:
+        base = old.get(item['name'])
+        if base is None or 'skipped' in item or 'skipped' in base:
+            continue
+        if item['per_second'] < base['per_second'] * (1 - tolerance):
+            regressions.append(f"{item['name']}: {item['per_second']} msg/s, was {base['per_second']}")
+        if item['p99_ms'] > base['p99_ms'] * (1 + tolerance):
+            regressions.append(f"{item['name']}: p99 {item['p99_ms']} ms, was {base['p99_ms']}")
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of moderation pipeline')
+    parser.add_argument('--count', type=int, default=5000, help='messages of every benchmark')
+    parser.add_argument('--output', help='file of JSON results, stdout by default')
+    parser.add_argument('--baseline', help='file of JSON results to compare with')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='allowed part of regression')
+    args = parser.parse_args(argv)
+
+    report = run(args.count)
+    for item in report['results']:
+        if 'skipped' in item:
+            print(f"Skipped {item['name']}: {item['skipped']}", file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f'Regression: {regression}', file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
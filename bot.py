@@ -1,20 +1,26 @@
 import asyncio
+import json
+import logging
 
 from aiogram import types
-from aiogram.utils.executor import start_polling, start_webhook
+from aiogram.utils.executor import Executor, start_polling
 
+import cluster
 import config
+import engine
+import explicit
 import help
-from antiflood import ThrottlingMiddleware
-from engine import dp, moder, bot, cb
+import metrics
+from admins import AdminCacheMiddleware
+from antiflood import FloodMiddleware
 from languages import underscore as _
 from misc import setup_logger
+from policy import MEDIA_TYPES
+from prefilter import PrefilterMiddleware
 
-logger = setup_logger()
-loop = asyncio.get_event_loop()
+logger = logging.getLogger('TrueModer')
 
 
-@dp.errors_handler()
 async def errors_handler(dispatcher, update, exception):
     """
     Exceptions handler. Catches all exceptions within task factory tasks.
@@ -40,21 +46,23 @@ async def errors_handler(dispatcher, update, exception):
         return
 
     if isinstance(exception, Unauthorized):
-        logger.info(f'Unauthorized: {exception}')
+        logger.info('Unauthorized: %s', exception)
         return
 
     if isinstance(exception, InvalidQueryID):
-        logger.exception(f'InvalidQueryID: {exception} \nUpdate: {update}')
+        logger.exception('InvalidQueryID: %s in update %s', exception, update.update_id)
+        logger.debug('Update: %s', update)
         return
 
     if isinstance(exception, TelegramAPIError):
-        logger.exception(f'TelegramAPIError: {exception} \nUpdate: {update}')
+        logger.exception('TelegramAPIError: %s in update %s', exception, update.update_id)
+        logger.debug('Update: %s', update)
         return
 
-    logger.exception(f'Update: {update} \n{exception}')
+    logger.exception('%s in update %s', exception, update.update_id)
+    logger.debug('Update: %s', update)
 
 
-@dp.message_handler(types.ChatType.is_private, commands=['start', 'help'])
 async def start_private(message: types.Message):
     """
     Handle start and help commands in private chat
@@ -71,29 +79,41 @@ async def start_private(message: types.Message):
     await message.reply(text, reply_markup=markup, reply=False)
 
 
-TYPES_TO_DELETE = types.ContentType.STICKER + types.ContentType.VIDEO_NOTE + types.ContentType.VIDEO + \
-                  types.ContentType.DOCUMENT + types.ContentType.CONTACT + types.ContentType.PHOTO + \
-                  types.ContentType.GAME + types.ContentType.ANIMATION
-
-
-@dp.message_handler(types.ChatType.is_super_group, content_types=TYPES_TO_DELETE)
+@metrics.handler('delete_media')
 async def delete_media(message: types.Message):
+    """ Delete media of content types deleted by chat policy """
     user = message.from_user
     chat = message.chat
 
     if user.id in config.super_admins:
         return
 
-    await message.delete()
-    logger.info(f'Deleted message from {user.full_name} ({user.id}) in {chat.full_name} ({chat.id})')
+    policy = await engine.moder.policies.get(chat.id)
+    if user.id in policy.exempt or not policy.deletes(message.content_type):
+        return
+
+    await engine.moder.delete_message(message)
+    logger.info('Deleted media from user %s in chat %s', user.id, chat.id)
 
 
-async def register_handlers():
+async def register_handlers(dp):
     """
-    Function-container with registering external (non-decorated) handlers
+    Function-container with registering handlers
     Don't forget about order of registered handlers! It really matters!
+
+    :param dp: dispatcher
     :return: None
     """
+    moder = engine.moder
+
+    dp.register_errors_handler(errors_handler)
+
+    dp.register_message_handler(start_private, custom_filters=[types.ChatType.is_private],
+                                commands=['start', 'help'])
+
+    dp.register_message_handler(delete_media, custom_filters=[types.ChatType.is_super_group],
+                                content_types=list(MEDIA_TYPES))
+
     # bot join chat handlers
     dp.register_message_handler(help.welcome, custom_filters=[types.ChatType.is_super_group],
                                 content_types=types.ContentType.NEW_CHAT_MEMBERS)
@@ -104,15 +124,52 @@ async def register_handlers():
     dp.register_message_handler(help.group_migrates_to_supergroup,
                                 content_types=types.ContentType.MIGRATE_FROM_CHAT_ID)
 
-    # moderator commands
-    # dp.register_message_handler(moder.ban, regexp=r'^!.*бан.*', content_types=types.ContentType.TEXT)
-    # dp.register_message_handler(moder.mute, regexp=r'^!.*мол[ч,к].*', content_types=types.ContentType.TEXT)
-
-    # text filter
+    # text filter, moderator commands like "!бан 2 дня -" are routed by it too
     dp.register_message_handler(moder.check_text, custom_filters=[types.ChatType.is_super_group],
                                 content_types=types.ContentType.TEXT)
 
 
+async def setup(dispatcher):
+    """
+    Register handlers, middlewares and open storage
+
+    :param dispatcher: dispatcher
+    :return: None
+    """
+    app = engine.get_app()
+
+    await register_handlers(dispatcher)
+    await app.db.open()
+    await app.analytics.open()
+    for chat_id, settings in config.CHAT_POLICIES.items():
+        await app.moder.policies.set(chat_id, settings)
+    dispatcher.middleware.setup(AdminCacheMiddleware(app.moder.admins))
+    dispatcher.middleware.setup(FloodMiddleware(app.moder))
+    if config.PREFILTER:
+        dispatcher.middleware.setup(PrefilterMiddleware(app.moder))
+
+    if config.EXPLICIT_WORKERS:
+        explicit.setup_executor(config.EXPLICIT_WORKERS, config.EXPLICIT_WORKERS_THRESHOLD, config.EXPLICIT_STRICT)
+
+    metrics.QUEUE_DEPTH.track(lambda: len(app.moder.scheduler), 'scheduler')
+    metrics.QUEUE_DEPTH.track(lambda: app.moder.deletions.depth, 'deletions')
+    metrics.QUEUE_DEPTH.track(lambda: len(app.analytics), 'analytics')
+    metrics.QUEUE_DEPTH.track(lambda: explicit.executor.pending if explicit.executor else 0, 'explicit_executor')
+
+    # admins are fetched on miss, so fetches are their misses
+    caches = {
+        'mentions': (app.moder.mentions, 'misses'),
+        'admins': (app.moder.admins, 'fetches'),
+        'policies': (app.moder.policies, 'misses'),
+        'explicit_verdicts': (explicit.matcher.cache, 'misses'),
+    }
+    for name, (cache, misses) in caches.items():
+        metrics.CACHE_HIT_RATE.track(lambda cache=cache: cache.hit_rate, name)
+        metrics.CACHE_LOOKUPS.track(lambda cache=cache: cache.hits, name, 'hit')
+        metrics.CACHE_LOOKUPS.track(lambda cache=cache, misses=misses: getattr(cache, misses), name, 'miss')
+    metrics.CACHE_LOOKUPS.track(lambda: app.moder.mentions.coalesced, 'mentions', 'coalesced')
+
+
 async def on_startup(dispatcher):
     """
     Auto exec function on startup of your app
@@ -120,11 +177,12 @@ async def on_startup(dispatcher):
     :param dispatcher: dispatcher
     :return: None
     """
-    await register_handlers()
-    dispatcher.middleware.setup(ThrottlingMiddleware(limit=0))
+    await setup(dispatcher)
 
     if config.WEBHOOK:
-        await bot.set_webhook(config.WEBHOOK_URL)
+        await engine.bot.set_webhook(config.WEBHOOK_URL)
+    elif config.METRICS_DUMP_INTERVAL:
+        metrics.setup_dump(config.METRICS_DUMP_INTERVAL)
 
 
 async def on_shutdown(_):
@@ -134,14 +192,82 @@ async def on_shutdown(_):
     :param _: dispatcher
     :return: None
     """
-    await bot.close()
-    await cb.close()
+    app = engine.get_app()
+
+    metrics.shutdown_dump()
+    await app.moder.deletions.close()
+    await app.moder.scheduler.close()
+    await app.bot.close()
+    await app.analytics.close()
+    await app.db.close()
+    explicit.shutdown_executor()
     await asyncio.sleep(0.250)
 
 
-if __name__ == '__main__':
+def webhook_worker(socket_path):
+    """
+    Worker process of multiprocess webhook mode: handles updates forwarded by master
+
+    :param socket_path: unix socket of worker
+    :return: None
+    """
+    from aiogram.utils import context
+
+    setup_logger()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    dp = engine.get_app(loop).dp
+
+    async def process(body):
+        context.set_value('dispatcher', dp)
+        context.set_value('bot', dp.bot)
+        await dp.process_update(types.Update(**json.loads(body)))
+
+    async def startup():
+        await setup(dp)
+        if config.METRICS_DUMP_INTERVAL:
+            metrics.setup_dump(config.METRICS_DUMP_INTERVAL)
+
+    cluster.run_worker(socket_path, process, on_startup=startup, on_shutdown=lambda: on_shutdown(dp), loop=loop)
+
+
+async def set_webhook():
+    """ Set webhook from master process of multiprocess webhook mode, without creating the whole app """
+    from aiogram import Bot
+
+    url, auth = engine.get_proxy_data()
+    bot = Bot(token=config.TELEGRAM_TOKEN, proxy=url, proxy_auth=auth)
+    try:
+        await bot.set_webhook(config.WEBHOOK_URL)
+    finally:
+        await bot.close()
+
+
+def main():
+    setup_logger()
+
+    if config.WEBHOOK and config.WEBHOOK_WORKERS > 1:
+        cluster.run(config.WEBHOOK_WORKERS, webhook_worker, host=config.WEBAPP_HOST, port=config.WEBAPP_PORT,
+                    path=config.WEBHOOK_PATH, metrics_path=config.METRICS_PATH, on_startup=set_webhook)
+        return
+
+    app = engine.get_app()
+
     if config.WEBHOOK:
-        start_webhook(dp, webhook_path=config.WEBHOOK_PATH, loop=loop, skip_updates=True, on_startup=on_startup,
-                      on_shutdown=on_shutdown, host=config.WEBAPP_HOST, port=config.WEBAPP_PORT)
+        from aiohttp import web
+
+        web_app = web.Application()
+        if config.METRICS_PATH:
+            web_app.router.add_get(config.METRICS_PATH, metrics.handle)
+
+        executor = Executor(app.dp, skip_updates=True, loop=app.loop)
+        executor.set_web_app(web_app)
+        executor.on_startup(on_startup)
+        executor.on_shutdown(on_shutdown)
+        executor.start_webhook(config.WEBHOOK_PATH, host=config.WEBAPP_HOST, port=config.WEBAPP_PORT)
     else:
-        start_polling(dp, loop=loop, skip_updates=True, on_startup=on_startup, on_shutdown=on_shutdown)
+        start_polling(app.dp, loop=app.loop, skip_updates=True, on_startup=on_startup, on_shutdown=on_shutdown)
+
+
+if __name__ == '__main__':
+    main()
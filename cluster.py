@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import re
+import signal
+import struct
+import tempfile
+
+import metrics
+
+logger = logging.getLogger(f'TrueModer.{__name__}')
+
+FRAME_HEADER = struct.Struct('>I')  # length of update body
+STOP_TIMEOUT = 10  # seconds to wait for worker to finish on shutdown
+
+# chat of message, edited message, channel post or callback query message; sender otherwise
+_CHAT_ID = re.compile(rb'"chat"\s*:\s*\{\s*"id"\s*:\s*(-?\d+)')
+_FROM_ID = re.compile(rb'"from"\s*:\s*\{\s*"id"\s*:\s*(-?\d+)')
+
+
+def route(body: bytes, workers: int):
+    """
+    Choose worker of update by its chat, so updates of one chat are always handled by one worker
+
+    :param body: raw update json
+    :param workers: count of workers
+    :return: index of worker
+    :rtype: int
+    """
+    match = _CHAT_ID.search(body) or _FROM_ID.search(body)
+    if not match:
+        return 0
+    return int(match.group(1)) % workers
+
+
+async def read_frames(reader: asyncio.StreamReader):
+    """ Yield update bodies from stream """
+    while True:
+        try:
+            header = await reader.readexactly(FRAME_HEADER.size)
+        except asyncio.IncompleteReadError:
+            return
+        length, = FRAME_HEADER.unpack(header)
+        yield await reader.readexactly(length)
+
+
+class Master:
+    """
+    Receives updates by webhook and forwards them to workers over unix sockets
+    """
+
+    def __init__(self, sockets):
+        self.sockets = sockets
+        self._writers = [None] * len(sockets)
+        self._locks = [asyncio.Lock() for _ in sockets]
+
+        self.forwarded = [0] * len(sockets)
+        self.failed = 0
+
+    async def _writer(self, index):
+        writer = self._writers[index]
+        if writer is None or writer.is_closing():
+            async with self._locks[index]:
+                writer = self._writers[index]
+                if writer is None or writer.is_closing():
+                    _, writer = await asyncio.open_unix_connection(self.sockets[index])
+                    self._writers[index] = writer
+        return writer
+
+    async def forward(self, body: bytes):
+        """
+        Forward update to its worker
+
+        :param body: raw update json
+        :return: True if update is forwarded
+        :rtype: bool
+        """
+        index = route(body, len(self.sockets))
+        try:
+            writer = await self._writer(index)
+            writer.write(FRAME_HEADER.pack(len(body)) + body)
+            await writer.drain()
+
+        except (ConnectionError, FileNotFoundError) as e:
+            logger.error('Worker %d is not available: %s', index, e)
+            self._writers[index] = None
+            self.failed += 1
+            metrics.FORWARDED.inc(index, 'failed')
+            return False
+
+        self.forwarded[index] += 1
+        metrics.FORWARDED.inc(index, 'ok')
+        return True
+
+    async def handle(self, request):
+        """ Webhook handler. Update not forwarded is answered with 503, so Telegram delivers it again """
+        from aiohttp import web
+
+        if not await self.forward(await request.read()):
+            return web.Response(status=503, text='worker is not available')
+        return web.Response(text='ok')
+
+    async def close(self):
+        for writer in self._writers:
+            if writer is not None:
+                writer.close()
+
+    def make_app(self, path, metrics_path=None):
+        """
+        Web application receiving webhook updates on path
+
+        :param path: webhook path
+        :param metrics_path: path of master metrics, disabled by default
+        :rtype: aiohttp.web.Application
+        """
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_post(path, self.handle)
+        if metrics_path:
+            app.router.add_get(metrics_path, metrics.handle)
+        return app
+
+
+async def serve(socket_path, process, loop=None):
+    """
+    Serve worker socket: every received update body is processed by `process` in its own task
+
+    :param socket_path: unix socket path
+    :param process: coroutine function of update body
+    :param loop:
+    :return: server
+    """
+    loop = loop or asyncio.get_event_loop()
+
+    async def handle(reader, writer):
+        async for body in read_frames(reader):
+            loop.create_task(process(body))
+        writer.close()
+
+    return await asyncio.start_unix_server(handle, socket_path)
+
+
+def run_worker(socket_path, process, on_startup=None, on_shutdown=None, loop=None):
+    """
+    Run worker until SIGTERM or SIGINT
+
+    :param socket_path: unix socket path
+    :param process: coroutine function of update body
+    :param on_startup: coroutine function called before serving
+    :param on_shutdown: coroutine function called after serving
+    :param loop:
+    """
+    loop = loop or asyncio.get_event_loop()
+    stop = asyncio.Event()
+    for signum in signal.SIGTERM, signal.SIGINT:
+        loop.add_signal_handler(signum, stop.set)
+
+    async def main():
+        if on_startup is not None:
+            await on_startup()
+
+        server = await serve(socket_path, process, loop)
+        logger.info('Worker %d is serving %s', os.getpid(), socket_path)
+        await stop.wait()
+
+        server.close()
+        await server.wait_closed()
+        if on_shutdown is not None:
+            await on_shutdown()
+
+    loop.run_until_complete(main())
+
+
+def start_workers(count, target, args=(), socket_dir=None):
+    """
+    Start worker processes, every one of them gets own socket path as the first argument
+
+    :param count: count of workers
+    :param target: worker function, it must serve socket
+    :param args: other arguments of target
+    :param socket_dir: directory of sockets, temporary by default
+    :return: worker processes and their socket paths
+    :rtype: tuple
+    """
+    socket_dir = socket_dir or tempfile.mkdtemp(prefix='truemoder-')
+    sockets = [os.path.join(socket_dir, f'worker-{index}.sock') for index in range(count)]
+
+    processes = []
+    for index, socket_path in enumerate(sockets):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        process = multiprocessing.Process(target=target, args=(socket_path,) + tuple(args), name=f'worker-{index}')
+        process.start()
+        processes.append(process)
+
+    return processes, sockets
+
+
+async def wait_sockets(sockets, timeout=STOP_TIMEOUT):
+    """ Wait for workers to start serving """
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + timeout
+    while not all(os.path.exists(socket_path) for socket_path in sockets):
+        if loop.time() > deadline:
+            raise TimeoutError('Workers are not started')
+        await asyncio.sleep(0.05)
+
+
+def stop_workers(processes, timeout=STOP_TIMEOUT):
+    """ Stop workers gracefully, kill them after timeout """
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+    for process in processes:
+        process.join(timeout)
+        if process.is_alive():
+            logger.warning('%s is not stopped in %s seconds, killing', process.name, timeout)
+            process.kill()
+            process.join()
+
+
+def run(workers, target, host, port, path, args=(), metrics_path=None, on_startup=None, on_shutdown=None):
+    """
+    Run master on host:port and workers until SIGTERM or SIGINT
+
+    :param workers: count of workers
+    :param target: worker function, see start_workers
+    :param host:
+    :param port:
+    :param path: webhook path
+    :param args: other arguments of target
+    :param metrics_path: path of master metrics, workers dump their metrics to log
+    :param on_startup: coroutine function of master called on start
+    :param on_shutdown: coroutine function of master called on stop
+    """
+    from aiohttp import web
+
+    processes, sockets = start_workers(workers, target, args)
+    master = Master(sockets)
+    app = master.make_app(path, metrics_path)
+
+    async def startup(_):
+        await wait_sockets(sockets)
+        logger.info('Master is routing updates to %d workers', workers)
+        if on_startup is not None:
+            await on_startup()
+
+    async def cleanup(_):
+        await master.close()
+        stop_workers(processes)
+        logger.info('Forwarded updates: %s, failed: %d', master.forwarded, master.failed)
+        if on_shutdown is not None:
+            await on_shutdown()
+
+    app.on_startup.append(startup)
+    app.on_cleanup.append(cleanup)
+    web.run_app(app, host=host, port=port)
@@ -0,0 +1,107 @@
+import logging
+import re
+from typing import NamedTuple
+
+import duration
+
+logger = logging.getLogger(f'TrueModer.{__name__}')
+
+PREFIX = '!'
+
+# command words after prefix by command, only whole words are commands
+COMMANDS = {
+    'ban': ('бан', 'забанить', 'забань', 'ban'),
+    'unban': ('разбан', 'разбанить', 'разбань', 'unban'),
+    'mute': ('мут', 'замутить', 'замуть', 'молчи', 'помолчи', 'молчать', 'умолкни', 'mute'),
+    'warn': ('пред', 'предупреждение', 'варн', 'warn'),
+    'delete': ('удали', 'удалить', 'del', 'delete'),
+}
+
+# "-" as separate word deletes the message, which command replies to
+_DELETE_FLAG = re.compile(r'(?:^|\s)-(?:\s|$)')
+
+
+class Command(NamedTuple):
+    """
+    Moderator command: name, text after command word and delete flag
+    """
+    name: str
+    args: str = ''
+    delete: bool = False
+
+    @property
+    def duration(self):
+        return duration.parse(self.args)
+
+
+class CommandRouter:
+    """
+    Routes text messages starting with prefix to command handlers by one compiled pattern of all command words.
+    Messages without prefix cost one character check
+    """
+
+    def __init__(self, prefix=PREFIX, commands=None):
+        """
+        :param prefix: first character of commands
+        :param commands: dict of command words by command name, COMMANDS by default
+        """
+        self.prefix = prefix
+        self.handlers = {}
+
+        self._names = {}
+        for name, words in (commands or COMMANDS).items():
+            for word in words:
+                self._names[word] = name
+
+        # command word may be followed by bot username, but not by other letters: "!банально" is not a command
+        words = '|'.join(map(re.escape, sorted(self._names, key=len, reverse=True)))
+        self._pattern = re.compile(rf'{re.escape(prefix)}\s*({words})(?:@\w+)?(?!\w)(.*)', re.IGNORECASE | re.DOTALL)
+
+    def register(self, name, callback):
+        """
+        Register handler of command
+
+        :param name: command name
+        :param callback: coroutine function of message and Command
+        """
+        if name not in self._names.values():
+            raise ValueError(f'Unknown command {name!r}')
+        self.handlers[name] = callback
+
+    def parse(self, text):
+        """
+        :param text: text of message
+        :return: command or None if text is not a command
+        :rtype: Command or None
+        """
+        if not text or text[0] != self.prefix:
+            return None
+
+        match = self._pattern.match(text)
+        if match is None:
+            return None
+
+        word, args = match.groups()
+        args = args.strip()
+        return Command(self._names[word.lower()], args, bool(_DELETE_FLAG.search(args)))
+
+    async def dispatch(self, message):
+        """
+        Call handler of command in message
+
+        :param message:
+        :type message: aiogram.types.Message
+        :return: True if message is a command with handler
+        :rtype: bool
+        """
+        command = self.parse(message.text)
+        if command is None:
+            return False
+
+        handler = self.handlers.get(command.name)
+        if handler is None:
+            return False
+
+        logger.debug('Command %s in message %s of chat %s', command.name, message.message_id, message.chat.id)
+        await handler(message, command)
+        return True
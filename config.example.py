@@ -12,6 +12,11 @@ WEBHOOK_URL = f'{WEBHOOK_HOST}{WEBHOOK_PATH}'
 # webserver settings
 WEBAPP_HOST = 'localhost'
 WEBAPP_PORT = 3111
+WEBHOOK_WORKERS = 1  # processes handling updates, updates of one chat are always handled by one of them
+
+# metrics
+METRICS_PATH = '/metrics'  # Prometheus endpoint of webhook app, False to disable
+METRICS_DUMP_INTERVAL = 60  # seconds between dumps of metrics to log in polling mode and by webhook workers
 
 # proxy settings
 PROXY_URL = 'socks5://8.8.8.8:1080'  # or '' to disable
@@ -19,8 +24,12 @@ PROXY_LOGIN = 'proxy_login'  # or '' to disable
 PROXY_PASSWORD = 'proxy_password'  # or '' to disable
 
 # analytics
+ANALYTICS = 'chatbase'  # 'jsonl' to write events to ANALYTICS_PATH, False to discard them
 CHATBASE_KEY = 'agGNsfuREYdagrCPkgLvda1C_5frsZsBYrv'
-CHATBASE_POOL_SIZE = 20
+ANALYTICS_PATH = 'analytics.jsonl'
+ANALYTICS_BUFFER_SIZE = 10000  # events kept at most, sampled above half of that and dropped above all
+ANALYTICS_BATCH_SIZE = 100
+ANALYTICS_FLUSH_INTERVAL = 5  # seconds
 
 # vars
 super_admins = [12345678, ]
@@ -29,8 +38,30 @@ super_admins = [12345678, ]
 BOT_NAME = '@TrueModerBot'
 FAQ_LINK = 'http://telegra.ph/True-Moder-07-31'
 
+# explicit filter
+EXPLICIT_STRICT = False  # also search obfuscated words with external_patterns
+EXPLICIT_BUDGET = 0.005  # seconds of CPU per message for strict search
+EXPLICIT_WORKERS = 0  # processes scanning long texts, 0 to scan everything inline
+EXPLICIT_WORKERS_THRESHOLD = 1024  # texts longer than that (chars) are scanned by workers
+PREFILTER = True  # skip handlers for clean text messages without entities in one cheap pass
+
+# @mentions cache
+MENTIONS_CACHE_SIZE = 10000
+MENTIONS_TTL = 24 * 60 * 60  # seconds to trust resolved mention
+MENTIONS_NEGATIVE_TTL = 60 * 60  # seconds to trust not found mention
+
+# moderation policies of chats
+POLICY_CACHE_SIZE = 10000  # compiled policies of active chats kept in memory, others are loaded from db
+CHAT_POLICIES = {}  # settings of chats by chat id, like policy.DEFAULT_SETTINGS, saved to db on startup
+
 # db mode
-DB_MODE = False
+DB_MODE = False  # 'sqlite' to keep moderation state in DB_PATH, False to keep it in memory only
+DB_PATH = 'truemoder.db'
+DB_FLUSH_INTERVAL = 0.5  # seconds between batched writes
 
 # logging
 LOGGING_LEVEL = logging.INFO
+LOGGING_FORMAT = 'text'  # or 'json', one object per line
+LOGGING_QUEUE = True  # write records to stdout from background thread, not from event loop
+LOGGING_SAMPLE = 0  # info and debug records of one line of code logged per interval, 0 to log all
+LOGGING_SAMPLE_INTERVAL = 60  # seconds
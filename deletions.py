@@ -0,0 +1,167 @@
+import asyncio
+import json
+import logging
+import time
+
+from aiogram.utils.exceptions import MessageError, NotFound, TelegramAPIError
+
+from scheduler import ENFORCE
+
+logger = logging.getLogger(f'TrueModer.{__name__}')
+
+BATCH_SIZE = 100  # message ids per deleteMessages call, limit of Bot API
+BATCH_DELAY = 0.2  # seconds to collect batch of chat
+FANOUT_CONCURRENCY = 8  # single deletions at once when bulk deletion is not available
+
+
+class DeletionQueue:
+    """
+    Collects messages to delete per chat and deletes them in batches
+
+    Batch of chat is flushed `delay` seconds after its first message or when it is full.
+    Batches are deleted by bulk deleteMessages, or by concurrency limited single deletions
+    if Bot API doesn't know that method.
+    """
+
+    def __init__(self, bot, scheduler=None, batch_size=BATCH_SIZE, delay=BATCH_DELAY,
+                 concurrency=FANOUT_CONCURRENCY, loop=None):
+        self._bot = bot
+        self.scheduler = scheduler
+        self.batch_size = batch_size
+        self.delay = delay
+        self.loop = loop
+
+        self.bulk = True
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._batches = {}
+        self._timers = {}
+        self._flushing = set()
+
+        self.deleted = 0
+        self.failed = 0
+        self.flushes = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @property
+    def depth(self):
+        """ Messages waiting for deletion """
+        return sum(len(batch) for batch in self._batches.values())
+
+    @property
+    def latency_avg(self):
+        done = self.deleted + self.failed
+        return self.latency_total / done if done else 0.0
+
+    def delete(self, chat_id, message_id):
+        """
+        Queue message for deletion
+
+        :param chat_id:
+        :param message_id:
+        :return: future resolved with True if message is deleted
+        :rtype: asyncio.Future
+        """
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+
+        future = self.loop.create_future()
+        batch = self._batches.setdefault(chat_id, [])
+        batch.append((message_id, future, time.monotonic()))
+
+        if len(batch) >= self.batch_size:
+            self._flush_later(chat_id, 0)
+        elif chat_id not in self._timers:
+            self._flush_later(chat_id, self.delay)
+
+        return future
+
+    def _flush_later(self, chat_id, delay):
+        timer = self._timers.pop(chat_id, None)
+        if timer is not None:
+            timer.cancel()
+        self._timers[chat_id] = self.loop.call_later(delay, self._flush, chat_id)
+
+    def _flush(self, chat_id):
+        del self._timers[chat_id]
+        batch = self._batches.pop(chat_id, None)
+        if not batch:
+            return
+
+        # messages over batch size wait for the next flush
+        batch, rest = batch[:self.batch_size], batch[self.batch_size:]
+        if rest:
+            self._batches[chat_id] = rest
+            self._flush_later(chat_id, 0)
+
+        self.flushes += 1
+        task = self.loop.create_task(self._delete_batch(chat_id, batch))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _call(self, chat_id, func, *args):
+        if self.scheduler is None:
+            return await func(*args)
+        return await self.scheduler.run(ENFORCE, chat_id, func, *args)
+
+    async def _delete_batch(self, chat_id, batch):
+        if self.bulk and len(batch) > 1:
+            message_ids = [message_id for message_id, _, _ in batch]
+            try:
+                await self._call(chat_id, self._bot.request, 'deleteMessages',
+                                 {'chat_id': chat_id, 'message_ids': json.dumps(message_ids)})
+
+            except NotFound:
+                logger.warning('Bulk deletion is not available, messages are deleted one by one')
+                self.bulk = False
+
+            except TelegramAPIError as e:
+                # one bad message fails the whole batch, the rest may still be deleted one by one
+                logger.info("Can't delete %d messages in chat %s at once, cause: %s", len(batch), chat_id, e)
+
+            else:
+                for item in batch:
+                    self._done(item, True)
+                return
+
+        await asyncio.gather(*(self._delete_one(chat_id, item) for item in batch))
+
+    async def _delete_one(self, chat_id, item):
+        message_id = item[0]
+        async with self._semaphore:
+            try:
+                await self._call(chat_id, self._bot.delete_message, chat_id, message_id)
+
+            except MessageError as e:
+                logger.info("Can't delete message in chat %s, cause: %s", chat_id, e)
+                self._done(item, False)
+
+            except TelegramAPIError as e:
+                logger.error('TelegramAPIError: %s', e)
+                self._done(item, False)
+
+            else:
+                self._done(item, True)
+
+    def _done(self, item, deleted):
+        _, future, queued = item
+
+        latency = time.monotonic() - queued
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+        if deleted:
+            self.deleted += 1
+        else:
+            self.failed += 1
+
+        if not future.done():
+            future.set_result(deleted)
+
+    async def close(self):
+        """ Flush all queued messages and wait for deletion """
+        while self._timers or self._flushing:
+            for chat_id in list(self._timers):
+                self._timers[chat_id].cancel()
+                self._flush(chat_id)
+            await asyncio.gather(*self._flushing)
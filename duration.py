@@ -0,0 +1,93 @@
+import random
+import re
+from datetime import timedelta
+from typing import NamedTuple
+
+DEFAULT_UNIT = 'hours'
+DEFAULT_UNIT_TEXT = 'час.'
+PAIR = 2
+SEVERAL = 3, 9  # bounds of random amount of "несколько"
+MAX_SECONDS = 367 * 24 * 60 * 60  # Telegram restricts forever for longer time, so longer one is cut
+
+UNIT_SECONDS = {
+    'minutes': 60,
+    'hours': 60 * 60,
+    'days': 24 * 60 * 60,
+    'weeks': 7 * 24 * 60 * 60,
+}
+
+# every token of duration in one alternation, text is scanned once;
+# unit may follow number or "пол" in one word: "30минут", "полчаса"
+_TOKENS = re.compile(r'''
+    (?P<number>\d{1,9})
+    | (?:\b|(?<=\d)|(?<=пол))(?:
+        (?P<half>пол(?=\s|$|мин|час|дн|день|сут|недел|год|месяц))
+        | (?P<pair>пару)
+        | (?P<several>несколько)
+        | (?P<minutes>мин\w*)
+        | (?P<hours>час\w*)
+        | (?P<days>дн\w*|день|сут\w*)
+        | (?P<weeks>недел\w*)
+    )
+''', re.IGNORECASE | re.VERBOSE)
+
+
+class Duration(NamedTuple):
+    """
+    Duration of restriction: amount of unit and its text for logs and answers
+    """
+    amount: float
+    unit: str = DEFAULT_UNIT
+    text: str = f'1 {DEFAULT_UNIT_TEXT}'
+
+    @property
+    def seconds(self):
+        return min(int(self.amount * UNIT_SECONDS[self.unit]), MAX_SECONDS)
+
+    @property
+    def delta(self):
+        return timedelta(seconds=self.seconds)
+
+
+def parse(text: str):
+    """
+    Parse duration like "5 минут", "пару часов", "полдня" or "несколько недель".
+    The first number is taken, "пару" is 2 and "несколько" is random from 3 to 9 without number, 1 without both;
+    "пол" halves the amount. The first unit is taken, hours by default
+
+    :param text: text of command
+    :rtype: Duration
+    """
+    number = unit = unit_text = None
+    fuzzy = None
+    half = False
+
+    for match in _TOKENS.finditer(text):
+        kind = match.lastgroup
+        if kind == 'number':
+            if number is None:
+                number = int(match.group())
+        elif kind == 'half':
+            half = True
+        elif kind == 'pair' or kind == 'several':
+            if fuzzy is None:
+                fuzzy = kind
+        elif unit is None:
+            unit, unit_text = kind, match.group()
+
+    if number is not None:
+        amount = number
+    elif fuzzy == 'pair':
+        amount = PAIR
+    elif fuzzy == 'several':
+        amount = random.randint(*SEVERAL)
+    else:
+        amount = 1
+
+    if half:
+        amount = amount / 2 if amount % 2 else amount // 2
+
+    if unit is None:
+        unit, unit_text = DEFAULT_UNIT, DEFAULT_UNIT_TEXT
+
+    return Duration(amount, unit, f'{amount} {unit_text}')
@@ -1,15 +1,12 @@
-import logging
 import asyncio
+import logging
+
 import config
-from aiogram import Bot, Dispatcher, types
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
-from aiogram.utils import context
-from aiochatbase import Chatbase
-from moderator import Moderator
 
 logger = logging.getLogger(f'TrueModer.{__name__}')
-loop = asyncio.get_event_loop()
-loop.set_task_factory(context.task_factory)
+
+# attributes of module served by application
+APP_ATTRIBUTES = 'loop', 'bot', 'dp', 'analytics', 'db', 'moder'
 
 
 def get_proxy_data():
@@ -31,10 +28,62 @@ def get_proxy_data():
     return proxy, proxy_auth
 
 
-# vars and instances
-url, auth = get_proxy_data()
-bot = Bot(token=config.TELEGRAM_TOKEN, loop=loop, proxy=url, proxy_auth=auth, parse_mode=types.ParseMode.HTML)
-dp = Dispatcher(bot, storage=MemoryStorage(), run_tasks_by_default=True)
-cb = Chatbase(api_key=config.CHATBASE_KEY, loop=loop, platform='Telegram', task_mode=True,
-              pool_size=config.CHATBASE_POOL_SIZE)
-moder = Moderator(bot, cb)
+class Application:
+    """
+    Bot, dispatcher, analytics sink, storage and moderator, created together
+    """
+
+    def __init__(self, loop=None):
+        from aiogram import Bot, Dispatcher, types
+        from aiogram.contrib.fsm_storage.memory import MemoryStorage
+        from aiogram.utils import context
+        from analytics import get_sink
+        from metrics import measure_bot
+        from moderator import Moderator
+        from offenders import STRIKE_DECAY
+        from storage import get_storage
+
+        self.loop = loop or asyncio.get_event_loop()
+        self.loop.set_task_factory(context.task_factory)
+
+        url, auth = get_proxy_data()
+        self.bot = measure_bot(Bot(token=config.TELEGRAM_TOKEN, loop=self.loop, proxy=url, proxy_auth=auth,
+                                   parse_mode=types.ParseMode.HTML))
+        self.dp = Dispatcher(self.bot, storage=MemoryStorage(), run_tasks_by_default=True)
+
+        cb = None
+        if config.ANALYTICS == 'chatbase':
+            from aiochatbase import Chatbase
+            cb = Chatbase(api_key=config.CHATBASE_KEY, loop=self.loop, platform='Telegram')
+        self.analytics = get_sink(config.ANALYTICS, cb=cb, path=config.ANALYTICS_PATH,
+                                  buffer_size=config.ANALYTICS_BUFFER_SIZE, batch_size=config.ANALYTICS_BATCH_SIZE,
+                                  flush_interval=config.ANALYTICS_FLUSH_INTERVAL, loop=self.loop)
+
+        self.db = get_storage(config.DB_MODE, path=config.DB_PATH, flush_interval=config.DB_FLUSH_INTERVAL,
+                              decay=STRIKE_DECAY, loop=self.loop)
+        self.moder = Moderator(self.bot, self.analytics, self.db)
+
+
+_app = None
+
+
+def get_app(loop=None):
+    """
+    Get application, it is created on the first call
+
+    :param loop: event loop of application
+    :return: application
+    :rtype: Application
+    """
+    global _app
+
+    if _app is None:
+        _app = Application(loop)
+    return _app
+
+
+def __getattr__(name):
+    """ Create application on first access to `engine.bot`, `engine.moder` and others """
+    if name in APP_ATTRIBUTES:
+        return getattr(get_app(), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -1,5 +1,22 @@
 import logging
+import argparse
+import asyncio
+import hashlib
+import json
+import os
 import re
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # python < 3.11
+    import sre_parse
+    import sre_constants
 
 logger = logging.getLogger(f'TrueModer.{__name__}')
 
@@ -118,68 +135,64 @@ external_patterns = (
 
 explicit_list = (
     "нехуй", "мудило",
-    "6ля", "6лядь", "6лять", "b3ъeб", "cock", "cunt", "e6aль", "ebal", "eblan", "eбaл", "eбaть", "eбyч", "eбать",
-    "eбёт", "eблантий", "fuck", "fucker", "fucking", "xyёв", "xyй", "xyя", "xуе", "xуй", "xую", "zaeb", "zaebal",
+    "b3ъeб", "cock", "cunt", "e6aль", "ebal", "eblan",
+    "eблантий", "fuck", "fucker", "fucking", "xyёв", "zaeb", "zaebal",
     "zaebali", "zaebat", "архипиздрит", "ахуел", "ахуеть", "бздение", "бздеть", "бздех", "бздецы", "бздит",
     "бздицы",
     "бздло", "бзднуть", "бздун", "бздунья", "бздюха", "бздюшка", "бздюшко", r"бля", "блябу", "блябуду", "бляд",
     "бляди",
     "блядина", "блядище", "блядки", "блядовать", "блядство", "блядун", "блядуны", "блядунья", "блядь", "блядюга",
-    "блять", "бляtь", "вафел", "вафлёр", "взъебка", "взьебка", "взьебывать", "въеб", "въебался", "въебенн", "въебусь",
+    "блять", "вафел", "вафлёр", "взъебка", "взьебка", "взьебывать", "въеб", "въебался", "въебенн", "въебусь",
     "въебывать", "выблядок", "выблядыш", "выеб", "выебать", "выебен", "выебнулся", "выебон", "выебываться",
     "выпердеть",
     "высраться", "выссаться", "вьебен", "гавно", "гавнюк", "гавнючка", "гамно", "гандон", "гнид", "гнида", "гниды",
     "говенка", "говенный", "говешка", "говназия", "говнецо", "говнище", "говно", "говноед", "говнолинк",
     "говночист",
     "говнюк", "говнюха", "говнядина", "говняк", "говняный", "говнять", "гондон", "доебываться", "долбоеб",
-    "долбоёб",
     "долбоящер", "дрисня", "дрист", "дристануть", "дристать", "дристун", "дристуха", "дрочелло", "дрочена",
     "дрочила",
-    "дрочилка", "дрочистый", "дрочить", "дрочка", "дрочун", "е6ал", "е6ут", "еб твою мать", "ёб твою мать", "ёбaн",
-    "ебaть", "ебyч", "ебал", "ебало", "ебальник", "ебан", "ебанамать", "ебанат", "ебаная", "ёбаная", "ебанический",
-    "ебанный", "ебанныйврот", "ебаное", "ебануть", "ебануться", "ёбаную", "ебаный", "ебанько", "ебарь", "ебат",
-    "ёбат",
-    "ебатория", "ебать", "ебать-копать", "ебаться", "ебашить", "ебёна", "ебет", "ебёт", "ебец", "ебик", "ебин",
+    "дрочилка", "дрочистый", "дрочить", "дрочка", "дрочун", "еб твою мать",
+    "ебал", "ебало", "ебальник", "ебан", "ебанамать", "ебанат", "ебаная", "ебанический",
+    "ебанныйврот", "ебаное", "ебануть", "ебануться", "ёбаную", "ебаный", "ебанько", "ебарь", "ебат",
+    "ебатория", "ебать", "ебать-копать", "ебаться", "ебашить", "ебёна", "ебет", "ебец", "ебик", "ебин",
     "ебись",
     "ебическая", "ебки", "ебла", "еблан", "ебливый", "еблище", "ебло", "еблыст", "ебля", "ёбн", "ебнуть",
     "ебнуться",
-    "ебня", "ебошить", "ебская", "ебский", "ебтвоюмать", "ебун", "ебут", "ебуч", "ебуче", "ебучее", "ебучий",
+    "ебня", "ебошить", "ебская", "ебский", "ебтвоюмать", "ебун", "ебут", "ебуч", "ебуче", "ебучий",
     "ебучим",
     "ебущ", "ебырь", "елда", "елдак", "елдачить", "жопа", "жопу", "заговнять", "задрачивать", "задристать",
     "задрота",
-    "зае6", "заё6", "заеб", "заёб", "заеба", "заебал", "заебанец", "заебастая", "заебастый", "заебать", "заебаться",
-    "заебашить", "заебистое", "заёбистое", "заебистые", "заёбистые", "заебистый", "заёбистый", "заебись",
+    "заеб", "заеба", "заебал", "заебанец", "заебастая", "заебастый", "заебать", "заебаться",
+    "заебашить", "заебистое", "заебистые", "заебистый", "заебись",
     "заебошить",
     "заебываться", "залуп", "залупа", "залупаться", "залупить", "залупиться", "замудохаться", "запиздячить",
     "засерать",
     "засерун", "засеря", "засирать", "засрун", "захуячить", "заябестая", "злоеб", "злоебучая", "злоебучее",
     "злоебучий",
     "ибанамат", "ибонех", "изговнять", "изговняться", "изъебнуться", "ипать", "ипаться", "ипаццо",
-    "Какдвапальцаобоссать", "конча", "курва", "курвятник", "лох", "лошарa", "лошара", "лошары", "лошок", "лярва",
+    "Какдвапальцаобоссать", "конча", "курва", "курвятник", "лох", "лошара", "лошары", "лошок", "лярва",
     "малафья", "манда", "мандавошек", "мандавошка", "мандавошки", "мандей", "мандень", "мандеть", "мандища",
     "мандой",
-    "манду", "мандюк", "минет", "минетчик", "минетчица", "млять", "мокрощелка", "мокрощёлка", "мразь", "мудak",
-    "мудaк",
+    "манду", "мандюк", "минет", "минетчик", "минетчица", "млять", "мокрощелка", "мразь",
     "мудаг", "мудак", "муде", "мудель", "мудеть", "муди", "мудил", "мудила", "мудистый", "мудня", "мудоеб",
     "мудозвон",
     "мудоклюй", "на хер", "на хуй", "набздел", "набздеть", "наговнять", "надристать", "надрочить", "наебать",
     "наебет",
     "наебнуть", "наебнуться", "наебывать", "напиздел", "напиздели", "напиздело", "напиздили", "насрать",
     "настопиздить",
-    "нахер", "нахрен", "нахуй", "haxуй", "нахуйник", "не ебет", "не ебёт", "невротебучий", "невъебенно", "нехира", "нехрен",
-    "Нехуй", "нехуйственно", "ниибацо", "ниипацца", "ниипаццо", "ниипет", "никуя", "нихера", "нихуя",
+    "нахер", "нахрен", "нахуй", "haxуй", "нахуйник", "не ебет", "невротебучий", "невъебенно", "нехира", "нехрен",
+    "нехуйственно", "ниибацо", "ниипацца", "ниипаццо", "ниипет", "никуя", "нихера", "нихуя",
     "обдристаться",
     "обосранец", "обосрать", "обосцать", "обосцаться", "обсирать", "объебос", "обьебать", "обьебос", "однохуйственно",
     "опездал", "опизде", "опизденивающе", "остоебенить", "остопиздеть", "отмудохать", "отпиздить", "отпиздячить",
     "отпороть", "отъебись", "охуевательский", "охуевать", "охуевающий", "охуел", "охуенно", "охуеньчик", "охуеть",
     "охуительно", "охуительный", "охуяньчик", "охуячивать", "охуячить", "очкун", "падла", "падонки", "падонок",
-    "паскуда", "педерас", "педик", "педрик", "педрила", "педрилло", "педрило", "педрилы", "пездень", "пездит",
+    "паскуда", "педерас", "педик", "педрик", "педрила", "педрило", "педрилы", "пездень", "пездит",
     "пездишь", "пездо", "пездят", "пердануть", "пердеж", "пердение", "пердеть", "пердильник", "перднуть",
-    "пёрднуть",
-    "пердун", "пердунец", "пердунина", "пердунья", "пердуха", "пердь", "переёбок", "пернуть", "пёрнуть", "пи3д",
-    "пи3де", "пи3ду", "пиzдец", "пидар", "пидарaс", "пидарас", "пидарасы", "пидары", "пидор", "пидорасы", "пидорка",
+    "пердун", "пердунец", "пердунина", "пердунья", "пердуха", "пердь", "переёбок", "пернуть", "пи3д",
+    "пи3де", "пиzдец", "пидар", "пидарас", "пидарасы", "пидары", "пидор", "пидорасы", "пидорка",
     "пидорок", "пидоры", "пидрас", "пизда", "пиздануть", "пиздануться", "пиздарваньчик", "пиздато", "пиздатое",
-    "пиздатый", "пизденка", "пизденыш", "пиздёныш", "пиздеть", "пиздец", "пиздит", "пиздить", "пиздиться",
+    "пиздатый", "пизденка", "пизденыш", "пиздеть", "пиздец", "пиздит", "пиздить", "пиздиться",
     "пиздишь", "пидр",
     "пиздища", "пиздище", "пиздобол", "пиздоболы", "пиздобратия", "пиздоватая", "пиздоватый", "пиздолиз",
     "пиздонутые",
@@ -198,11 +211,11 @@ explicit_list = (
     "сранье", "срать", "срун", "ссака", "ссышь", "стерва", "страхопиздище", "сука", "суки", "суходрочка", "сучара",
     "сучий", "сучка", "сучко", "сучонок", "сучье", "сцание", "сцать", "сцука", "сцуки", "сцуконах", "сцуль",
     "сцыха",
-    "сцышь", "съебаться", "сыкун", "трахае6", "трахаеб", "трахаёб", "трахатель", "ублюдок", "уебать", "уёбища",
-    "уебище", "уёбище", "уебищное", "уёбищное", "уебк", "уебки", "уёбки", "уебок", "уёбок", "урюк", "усраться",
-    "ушлепок", "х_у_я_р_а", "хyё", "хyй", "хyйня", "хамло", "хер", "херня", "херовато", "херовина", "херовый",
-    "хитровыебанный", "хитрожопый", "хуeм", "хуе", "хуё", "хуевато", "хуёвенький", "хуевина", "хуево", "хуевый",
-    "хуёвый", "хуек", "хуёк", "хуел", "хуем", "хуенч", "хуеныш", "хуенький", "хуеплет", "хуеплёт",
+    "сцышь", "съебаться", "сыкун", "трахаеб", "трахатель", "ублюдок", "уебать", "уёбища",
+    "уебище", "уебищное", "уебк", "уебки", "уебок", "урюк", "усраться",
+    "ушлепок", "хамло", "хер", "херня", "херовато", "херовина", "херовый",
+    "хитровыебанный", "хитрожопый", "хуе", "хуевато", "хуёвенький", "хуевина", "хуево", "хуевый",
+    "хуек", "хуел", "хуем", "хуенч", "хуеныш", "хуенький", "хуеплет",
     "хуепромышленник",
     "хуерик", "хуерыло", "хуесос", "хуесоска", "хуета", "хуетень", "хуею", "хуи", "хуй", "хуйком", "хуйло", "хуйня",
     "хуйрик", "хуище", "хуля", "хую", "хуюл", "хуя", "хуяк", "хуякать", "хуякнуть", "хуяра", "хуясе", "хуячить",
@@ -215,30 +228,790 @@ exclude_list = (
 )
 
 
-async def find_explicit(text: str):
-    patterns = my_patterns
+# lookalike latin letters are folded to cyrillic ones inside words mixing both scripts: "xyйня", but not "XEP"
+_LATIN = {
+    'a': 'а', 'c': 'с', 'e': 'е', 'k': 'к', 'm': 'м', 'o': 'о', 'p': 'р', 't': 'т', 'x': 'х', 'y': 'у',
+}
+
+# ё is folded to е, underscore is folded to separator
+_FOLD = {'ё': 'е', '_': '-'}
+
+# digits are folded only when they stick to letters
+_DIGITS = {'0': 'о', '3': 'з', '6': 'б'}
+
+_LATIN_TABLE = str.maketrans(_LATIN)
+_FOLD_TABLE = str.maketrans(_FOLD)
+_FOLDABLE = re.compile(f'[{"".join(_FOLD)}]')
+_LATIN_LETTER = re.compile(f'[{"".join(_LATIN)}]')
+_CYRILLIC_LETTER = re.compile(r'[а-я]')
+_TOKEN = re.compile(r'\S+')
+_DIGIT = re.compile(r'[036]')
+_LETTER_DIGIT = re.compile(r'(?<=[^\W\d_])[036]|[036](?=[^\W\d_])')
+_SEPARATOR = re.compile(r'\b[-.*\'"`~+=|/\\#@$%^&]+\b')
+# conjunction before spaced letters stays a word: "и с у к а"
+_SPACED = re.compile(r'\b(?![иа] [^\W_](?: [^\W_]){2,}\b)[^\W_](?: [^\W_]){2,}\b')
+_REPEAT = re.compile(r'(.)\1+')
+_WORD = re.compile(r'\w+')
+
+
+class Normalized:
+    """
+    Normalized text. Offset map to source text is built on first access:
+    offsets[i] is the index in source text of char text[i]
+    """
+    __slots__ = 'text', 'source', '_offsets'
+
+    def __init__(self, text: str, source: str):
+        self.text = text
+        self.source = source
+        self._offsets = None
+
+    @property
+    def offsets(self):
+        if self._offsets is None:
+            _, self._offsets = _normalize_with_offsets(self.source)
+        return self._offsets
+
+    def source_span(self, start: int, end: int):
+        """
+        Map span of normalized text to span of source text
+
+        :return: (start, end) in source text
+        :rtype: tuple
+        """
+        if start >= end:
+            return self.offsets[start], self.offsets[start]
+        return self.offsets[start], self.offsets[end - 1] + 1
+
+
+def _fold_mixed(result):
+    """ Fold lookalike latin letters of a word if it has cyrillic ones """
+    word = result.group()
+    if _LATIN_LETTER.search(word) and _CYRILLIC_LETTER.search(word):
+        return word.translate(_LATIN_TABLE)
+    return word
+
 
-    for pattern in patterns:
-        to_find = re.compile(pattern, flags=re.IGNORECASE)
-        result = re.match(to_find, text)
+def _fold(text: str):
+    """ Lowercase text and fold lookalikes. Length of text is kept """
+    folded = text.lower()
+    if len(folded) != len(text):
+        folded = ''.join(char.lower()[:1] for char in text)
 
-        if result:
-            word = result.group()
+    if _FOLDABLE.search(folded):
+        folded = folded.translate(_FOLD_TABLE)
 
-            if word.lower() in exclude_list:
-                logger.info(f'{word} in exclude list')
+    if not folded.isascii() and _LATIN_LETTER.search(folded):
+        folded = _TOKEN.sub(_fold_mixed, folded)
+
+    if _DIGIT.search(folded):
+        folded = _LETTER_DIGIT.sub(lambda result: _DIGITS[result.group()], folded)
+
+    return folded
+
+
+def _squeeze(pattern, text: str, offsets: list, keep):
+    """
+    Replace every match of pattern with its chars chosen by keep(match), carrying offsets along
+
+    :return: text and offsets
+    :rtype: tuple
+    """
+    parts, kept, last = [], [], 0
+
+    for result in pattern.finditer(text):
+        start = result.start()
+        parts.append(text[last:start])
+        kept.extend(offsets[last:start])
+
+        for index in keep(result):
+            parts.append(text[index])
+            kept.append(offsets[index])
+
+        last = result.end()
+
+    if not last:
+        return text, offsets
+
+    parts.append(text[last:])
+    kept.extend(offsets[last:])
+    return ''.join(parts), kept
+
+
+def _normalize_with_offsets(text: str):
+    """ Same as normalize(), but tracks where every char came from """
+    offsets = list(range(len(text)))
+    text, offsets = _squeeze(_SEPARATOR, _fold(text), offsets, lambda result: ())
+    text, offsets = _squeeze(_SPACED, text, offsets, lambda result: range(*result.span())[::2])
+    text, offsets = _squeeze(_REPEAT, text, offsets, lambda result: (result.start(),))
+    return text, offsets
+
+
+def normalize(text: str):
+    """
+    Fold homoglyphs and case, strip separators inside words (х.у.й, х у й) and collapse repeated letters
+
+    :param text:
+    :return: normalized text
+    :rtype: Normalized
+    """
+    folded = _SEPARATOR.sub('', _fold(text))
+    folded = _SPACED.sub(lambda result: result.group()[::2], folded)
+    folded = _REPEAT.sub(r'\1', folded)
+    return Normalized(folded, text)
+
+
+def _fold_pattern(pattern: str):
+    """
+    Make pattern written for raw text match normalized text: separators between letters are gone,
+    lookalike latin letters can't occur in it and ё is е
+
+    :param pattern:
+    :return: pattern
+    :rtype: str
+    """
+
+    def fold_class(result):
+        chars = re.findall(r'\\.|.', result.group(1))
+        chars = [
+            'е' if char == 'ё' else char for char in chars
+            if char == 'ё' or char not in _LATIN and char not in _FOLD
+        ]
+        return f'[{"".join(chars)}]'
+
+    pattern = pattern.replace(r'[\W_]*', '')
+    return re.sub(r'\[((?:\\.|[^\]\\])+)\]', fold_class, pattern)
+
+
+# strict mode: max length of text window scanned by one regex call
+STRICT_WINDOW = 256
+
+# verdicts of that many recent texts are cached
+VERDICT_CACHE_SIZE = 4096
+
+# texts longer than that are scanned in process pool, if it is set up
+EXECUTOR_THRESHOLD = 1024
+
+# texts per task of batch search
+BATCH_CHUNK = 256
+
+
+def _pattern_items(pattern: str):
+    """
+    Split pattern into top-level (atom, quantifier) items
+
+    :param pattern:
+    :return: list of items or None if pattern has top-level alternation
+    :rtype: list or None
+    """
+    items, i, n = [], 0, len(pattern)
+
+    def skip_class(pos):
+        pos += 1
+        if pattern[pos] == '^':
+            pos += 1
+        if pattern[pos] == ']':
+            pos += 1
+        while pattern[pos] != ']':
+            pos += 2 if pattern[pos] == '\\' else 1
+        return pos + 1
+
+    while i < n:
+        start, char = i, pattern[i]
+
+        if char == '(':
+            depth = 0
+            while True:
+                char = pattern[i]
+                if char == '\\':
+                    i += 2
+                    continue
+                if char == '[':
+                    i = skip_class(i)
+                    continue
+                if char == '(':
+                    depth += 1
+                elif char == ')':
+                    depth -= 1
+                    if not depth:
+                        i += 1
+                        break
+                i += 1
+        elif char == '[':
+            i = skip_class(i)
+        elif char == '\\':
+            i += 2
+        elif char == '|':
+            return None
+        else:
+            i += 1
+
+        atom, quantifier = pattern[start:i], ''
+        if i < n and pattern[i] in '?*+':
+            quantifier = pattern[i]
+            i += 1
+            if i < n and pattern[i] == '?':
+                quantifier += '?'
+                i += 1
+
+        items.append((atom, quantifier))
+
+    return items
+
+
+def _word_pattern(pattern: str):
+    """
+    Make pattern match whole words only, so "манда" isn't found in "мандарин" and "хули" in "хулиганы".
+    Leading \\w* is dropped too: any prefix before "бля" matches "гребля" and "употребляя"
+
+    :param pattern:
+    :return: pattern
+    :rtype: str
+    """
+    items = _pattern_items(pattern)
+
+    # unwrap a group spanning the whole pattern
+    if items and len(items) == 1 and items[0][0].startswith('(') and not items[0][1]:
+        inner = items[0][0][1:-1]
+        inner = inner[2:] if inner.startswith('?:') else inner
+        if _pattern_items(inner):
+            return _word_pattern(inner)
+
+    if items and items[0] == (r'\w', '*'):
+        pattern = ''.join(atom + quantifier for atom, quantifier in items[1:])
+
+    return rf'\b(?:{pattern})\b'
+
+
+def _first_chars(pattern: str):
+    """
+    Collect lowercase chars which could start a match of pattern
+
+    :param pattern:
+    :return: set of chars or None if any char could start a match
+    :rtype: frozenset or None
+    """
+
+    def walk(items):
+        chars = set()
+        for op, av in items:
+            found, nullable = item(op, av)
+            if found is None:
+                return None, False
+            chars |= found
+            if not nullable:
+                return chars, False
+        return chars, True
+
+    def item(op, av):
+        if op is sre_constants.LITERAL:
+            return {chr(av).lower()}, False
+
+        if op is sre_constants.IN:
+            chars = set()
+            for in_op, in_av in av:
+                if in_op is sre_constants.LITERAL:
+                    chars.add(chr(in_av).lower())
+                elif in_op is sre_constants.RANGE:
+                    chars.update(chr(code).lower() for code in range(in_av[0], in_av[1] + 1))
+                else:
+                    return None, False
+            return chars, False
+
+        if op is sre_constants.SUBPATTERN:
+            return walk(av[-1])
+
+        if op is sre_constants.BRANCH:
+            chars, nullable = set(), False
+            for branch in av[1]:
+                found, branch_nullable = walk(branch)
+                if found is None:
+                    return None, False
+                chars |= found
+                nullable = nullable or branch_nullable
+            return chars, nullable
+
+        if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            found, nullable = walk(av[2])
+            return found, nullable or av[0] == 0
+
+        return None, False
+
+    chars, nullable = walk(sre_parse.parse(pattern))
+    if chars is None or nullable:
+        return None
+
+    return frozenset(chars)
+
+
+class OutOfBudget(Exception):
+    pass
+
+
+class StrictMatcher:
+    """
+    Obfuscation-aware matcher over external_patterns. Works with normalized text.
+
+    Every pattern is folded like normalized text is, matches whole words only and is keyed by the chars its match
+    could start with, so a text window is only scanned by patterns whose first letter class occurs in it.
+    Text is scanned in windows of bounded length, so cost per message is linear in its length,
+    and the CPU budget is checked between regex calls.
+    """
+
+    def __init__(self, patterns=external_patterns, exclude=exclude_list, window=STRICT_WINDOW):
+        self.window = window
+        self.exclude = frozenset(normalize(word).text for word in exclude)
+        self.patterns = []
+
+        for pattern in patterns:
+            pattern = _fold_pattern(pattern)
+            self.patterns.append((re.compile(_word_pattern(pattern)), _first_chars(pattern)))
+
+    def windows(self, text: str):
+        """
+        Split text into windows up to self.window chars on whitespace. Neighbour windows share one word.
+
+        :param text:
+        :return: generator of (offset, window)
+        """
+        if len(text) <= self.window:
+            yield 0, text
+            return
+
+        start = 0
+        while start < len(text):
+            end = start + self.window
+            if end >= len(text):
+                yield start, text[start:]
+                return
+
+            cut = text.rfind(' ', start + 1, end)
+            if cut == -1:
+                yield start, text[start:end]
+                start = end
                 continue
 
-            logger.info(f'{word} - {pattern}')
-            return True
+            yield start, text[start:cut]
+            overlap = text.rfind(' ', start + 1, cut)
+            start = overlap + 1 if overlap != -1 else cut + 1
+
+    @staticmethod
+    def word_span(text: str, start: int, end: int):
+        """ Widen span to the whole word(s) around it """
+        while start > 0 and text[start - 1].isalnum():
+            start -= 1
+        while end < len(text) and text[end].isalnum():
+            end += 1
+        return start, end
+
+    def search(self, text: str, budget=None):
+        """
+        Find obfuscated explicit in normalized text
+
+        :param text: normalized text
+        :param budget: CPU time limit in seconds, None for unlimited
+        :return: span of explicit word in text or None
+        :rtype: tuple or None
+        :raise: OutOfBudget
+        """
+        deadline = time.perf_counter() + budget if budget else None
+
+        for offset, window in self.windows(text):
+            chars = set(window)
+
+            for pattern, first in self.patterns:
+                if first is not None and first.isdisjoint(chars):
+                    continue
+
+                result = pattern.search(window)
+                while result:
+                    start, end = self.word_span(window, *result.span())
+                    if window[start:end] not in self.exclude:
+                        return offset + start, offset + end
+                    result = pattern.search(window, max(result.end(), result.start() + 1))
+
+                if deadline and time.perf_counter() > deadline:
+                    raise OutOfBudget(f'Strict explicit check is out of budget on {len(text)} chars')
+
+        return None
+
+
+class VerdictCache:
+    """
+    Bounded LRU of explicit search results keyed by hash of normalized text
+    """
+
+    def __init__(self, size=VERDICT_CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @staticmethod
+    def key(text: str, strict: bool):
+        return hashlib.blake2b(text.encode(), digest_size=16, person=b'strict' if strict else b'').digest()
+
+    def get(self, key):
+        """
+        Get cached result
+
+        :param key:
+        :return: (True, span) if cached, else (False, None)
+        :rtype: tuple
+        """
+        try:
+            span = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return False, None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return True, span
+
+    def set(self, key, span):
+        self._data[key] = span
+        self._data.move_to_end(key)
+        if len(self._data) > self.size:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+
+class ExplicitMatcher:
+    """
+    Explicit matcher compiled once: patterns are precompiled, words are normalized and kept in hashed sets.
+    All checks are done over normalized text, verdicts are cached by it.
+    """
+
+    def __init__(self, patterns=my_patterns, words=explicit_list, exclude=exclude_list):
+        self.cache = VerdictCache()
+        self.update(patterns, words, exclude)
+
+    def update(self, patterns=None, words=None, exclude=None):
+        """
+        Replace patterns or word lists. Cached verdicts are dropped
+
+        :param patterns: my_patterns-like tuple
+        :param words: explicit_list-like tuple
+        :param exclude: exclude_list-like tuple
+        """
+        if patterns is not None:
+            self.patterns = tuple(re.compile(pattern, flags=re.IGNORECASE) for pattern in patterns)
+
+        if words is not None:
+            self._words = words
+
+        if exclude is not None:
+            self._exclude = exclude
+            self._strict = None
+
+        self.exclude = frozenset(normalize(word).text for word in self._exclude)
+        self.words = frozenset(normalize(word).text for word in self._words) - self.exclude
+        self.cache.clear()
+
+    @property
+    def strict(self):
+        """ Strict matcher is compiled on first use """
+        if self._strict is None:
+            self._strict = StrictMatcher(exclude=self._exclude)
+        return self._strict
+
+    def search(self, text: str, strict=False, budget=None):
+        """
+        Find explicit in text
+
+        :param text:
+        :param strict: also run obfuscation-aware external_patterns
+        :param budget: CPU time limit of strict check in seconds
+        :return: span of explicit in source text or None
+        :rtype: tuple or None
+        """
+        normalized = normalize(text)
+
+        key = self.cache.key(normalized.text, strict)
+        cached, span = self.cache.get(key)
+        if not cached:
+            try:
+                span = self.search_normalized(normalized.text, strict, budget)
+            except OutOfBudget as e:
+                logger.warning(e)
+                return None
+            self.cache.set(key, span)
+
+        return self.source_span(normalized, span)
+
+    @staticmethod
+    def source_span(normalized, span):
+        """
+        Map found span to source text
+
+        :param normalized: normalized text
+        :type normalized: Normalized
+        :param span: span in normalized text or None
+        :return: span in source text or None
+        :rtype: tuple or None
+        """
+        if span is None:
+            return None
+
+        span = normalized.source_span(*span)
+        logger.debug('Found explicit: %s', normalized.source[span[0]:span[1]])
+        return span
+
+    def search_normalized(self, text: str, strict=False, budget=None):
+        """
+        Find explicit in normalized text
+
+        :return: span of explicit in normalized text or None
+        :rtype: tuple or None
+        """
+        for pattern in self.patterns:
+            result = pattern.match(text)
+
+            if result and result.group().lower() not in self.exclude:
+                return result.span()
+
+        if not self.words.isdisjoint(_WORD.findall(text)):
+            return next(word.span() for word in _WORD.finditer(text) if word.group() in self.words)
+
+        if strict:
+            return self.strict.search(text, budget)
+
+        return None
+
+    def match(self, text: str, strict=False, budget=None):
+        """
+        Check text for explicit
+
+        :return: True if explicit found, else False
+        :rtype: bool
+        """
+        return self.search(text, strict, budget) is not None
+
+
+matcher = ExplicitMatcher()
+
+
+def _init_worker(strict):
+    """ Compile patterns once on worker process start """
+    if strict:
+        _ = matcher.strict
+
+
+def _search_in_worker(text: str, strict: bool, budget):
+    return matcher.search_normalized(text, strict, budget)
+
+
+def _match_chunk(texts, strict: bool, budget):
+    return [matcher.match(text, strict, budget) for text in texts]
 
-    for word in text.lower().split():
-        if word in exclude_list:
-            logger.info(f'{word} in exclude list')
+
+class ExplicitExecutor:
+    """
+    Scans long texts in process pool, so they don't block event loop.
+    Verdict cache is kept in the main process.
+    """
+
+    def __init__(self, workers=None, threshold=EXECUTOR_THRESHOLD, strict=False):
+        self.threshold = threshold
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(strict,))
+
+        # stats
+        self.pending = 0
+        self.calls = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @property
+    def latency_avg(self):
+        return self.latency_total / self.calls if self.calls else 0.0
+
+    async def search(self, text: str, strict=False, budget=None):
+        """
+        Same as ExplicitMatcher.search, but scanning is done by worker process
+
+        :return: span of explicit in source text or None
+        :rtype: tuple or None
+        """
+        normalized = normalize(text)
+
+        key = matcher.cache.key(normalized.text, strict)
+        cached, span = matcher.cache.get(key)
+        if not cached:
+            loop = asyncio.get_event_loop()
+            start = time.perf_counter()
+            self.pending += 1
+
+            try:
+                span = await loop.run_in_executor(self.pool, _search_in_worker, normalized.text, strict, budget)
+            except OutOfBudget as e:
+                logger.warning(e)
+                return None
+            finally:
+                self.pending -= 1
+                latency = time.perf_counter() - start
+                self.calls += 1
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+
+            logger.debug('Scanned %d chars in worker for %.1f ms, %d pending', len(text), latency * 1000, self.pending)
+            matcher.cache.set(key, span)
+
+        return matcher.source_span(normalized, span)
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+
+executor = None
+
+
+def setup_executor(workers=None, threshold=EXECUTOR_THRESHOLD, strict=False):
+    """
+    Scan texts longer than threshold in process pool of workers
+
+    :param workers: number of processes, CPU count by default
+    :param threshold: text length in chars
+    :param strict: compile strict patterns on worker start
+    :return: executor
+    :rtype: ExplicitExecutor
+    """
+    global executor
+
+    shutdown_executor()
+    executor = ExplicitExecutor(workers, threshold, strict)
+    return executor
+
+
+def shutdown_executor():
+    global executor
+
+    if executor is not None:
+        executor.shutdown()
+        executor = None
+
+
+async def find_explicit(text: str, strict=False, budget=None):
+    start = time.perf_counter()
+    if executor is not None and len(text) > executor.threshold:
+        found = await executor.search(text, strict, budget) is not None
+    else:
+        found = matcher.match(text, strict, budget)
+
+    metrics.EXPLICIT_LATENCY.observe(time.perf_counter() - start, 'explicit' if found else 'clean')
+    return found
+
+
+async def find_explicit_batch(texts, strict=False, budget=None, pool=None, chunk_size=BATCH_CHUNK):
+    """
+    Check many texts at once. Chunks of texts are checked in parallel by pool workers
+
+    :param texts: list of texts
+    :param strict: also run obfuscation-aware external_patterns
+    :param budget: CPU time limit of strict check per text in seconds
+    :param pool: process pool, pool of explicit executor by default. Without pool texts are checked inline
+    :param chunk_size: texts per task
+    :return: list of results in order of texts
+    :rtype: list
+    """
+    if pool is None and executor is not None:
+        pool = executor.pool
+
+    if pool is None:
+        return _match_chunk(texts, strict, budget)
+
+    loop = asyncio.get_event_loop()
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    results = await asyncio.gather(*[loop.run_in_executor(pool, _match_chunk, chunk, strict, budget)
+                                     for chunk in chunks])
+    return [result for chunk in results for result in chunk]
+
+
+def _read_messages(lines, jsonl: bool, field: str):
+    """
+    Parse input lines into (text, record) pairs, one pair per line.
+    Text of line which can't be used is None, and its record tells why
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip('\n')
+
+        if not jsonl:
+            yield line, {'text': line}
             continue
 
-        if word in explicit_list:
-            logger.info(f'{word}')
-            return True
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield None, {'line': number, 'error': f'invalid JSON: {e}'}
+            continue
 
-    return False
+        if isinstance(record, str):
+            yield record, {'text': record}
+        elif isinstance(record, dict) and isinstance(record.get(field), str):
+            yield record[field], record
+        else:
+            yield None, {'line': number, 'error': f'no text in field {field!r}'}
+
+
+def main(argv=None):
+    """
+    Classify file of messages: one message per line, or JSONL with text field.
+    Writes JSONL with 'explicit' field to stdout, a line per input line, and summary to stderr.
+    Lines without text are written with null 'explicit' and 'error'
+    """
+    parser = argparse.ArgumentParser(description='Find explicit messages in chat export')
+    parser.add_argument('file', help='newline-delimited text or JSONL file, - for stdin')
+    parser.add_argument('--jsonl', action='store_true', help='input is JSONL')
+    parser.add_argument('--field', default='text', help='text field of JSONL records')
+    parser.add_argument('--strict', action='store_true', help='also run obfuscation-aware patterns')
+    parser.add_argument('--budget', type=float, default=None, help='CPU seconds per message of strict check')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--only-explicit', action='store_true', help='write only explicit messages')
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.file == '-' else open(args.file, encoding='utf-8')
+    messages = list(_read_messages(source, args.jsonl, args.field))
+    if source is not sys.stdin:
+        source.close()
+
+    loop = asyncio.new_event_loop()
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(args.strict,)) as pool:
+        texts = [text for text, _ in messages if text is not None]
+        try:
+            results = iter(loop.run_until_complete(find_explicit_batch(texts, args.strict, args.budget, pool)))
+        finally:
+            loop.close()
+
+    spent = time.perf_counter() - start
+    found = skipped = 0
+
+    for text, record in messages:
+        if text is None:
+            skipped += 1
+            result = None
+        else:
+            result = next(results)
+            found += result
+
+        if result or not args.only_explicit:
+            record['explicit'] = result
+            print(json.dumps(record, ensure_ascii=False))
+
+    print(f'{len(texts)} messages, {found} explicit, {skipped} skipped, {len(texts) / spent:.0f} msg/s',
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,14 @@
 from aiogram import types
 from languages import underscore as _
-from engine import moder
+import engine
 import config
 import logging
+import metrics
 
 logger = logging.getLogger(f'TrueModer.{__name__}')
 
 
+@metrics.handler('welcome')
 async def welcome(message: types.Message):
     """
     Welcomes self and say HELP
@@ -16,12 +18,16 @@ async def welcome(message: types.Message):
     chat = message.chat
     new_users = message.new_chat_members
 
+    # new members make similar messages look like raid
+    for user in new_users:
+        engine.moder.raids.joined(chat.id, user.id)
+
     # a little delay before welcome
     await types.ChatActions.typing(sleep=2)
 
     # say help when bot added to new chat
-    if await moder.me in new_users:
-        logger.info(f'TrueModer added to chat {chat.full_name} ({chat.id})')
+    if await engine.moder.me in new_users:
+        logger.info('TrueModer added to chat %s (%s)', chat.full_name, chat.id)
         markup = types.InlineKeyboardMarkup()
         markup.add(types.InlineKeyboardButton(text=f'ℹ️ Описание', url=config.FAQ_LINK))
         text = _(f"<b>Привет! Я бот-модератор!</b> \n\n"
@@ -30,7 +36,7 @@ async def welcome(message: types.Message):
                  f"- блокировать пользователей; \n"
                  f"- закреплять сообщения. \n\n"
                  f"Подробности в описании:")
-        await moder.say(chat.id, text, reply_markup=markup)
+        await engine.moder.say(chat.id, text, reply_markup=markup)
 
 
 async def welcome_group(message: types.Message):
@@ -42,19 +48,19 @@ async def welcome_group(message: types.Message):
     # a little delay before welcome
     await types.ChatActions.typing(sleep=2)
 
-    if await moder.me in new_users:
-        logger.info(f'Bot added to group chat {chat.full_name} ({chat.id})')
+    if await engine.moder.me in new_users:
+        logger.info('Bot added to group chat %s (%s)', chat.full_name, chat.id)
 
         text = (f"<b>Привет! Я бот-модератор!</b> \n\n"
                 f"Я умею работать только в <i>супергруппах</i> \n"
                 f"Преобразовать эту группу в супергруппу можно в настройках группы.")
-        await moder.say(chat.id, text)
+        await engine.moder.say(chat.id, text)
 
 
 async def group_migrates_to_supergroup(message: types.Message):
     chat = message.chat
 
-    logger.info(f'Group {message.migrate_from_chat_id} migrated to supergroup {chat.id}')
+    logger.info('Group %s migrated to supergroup %s', message.migrate_from_chat_id, chat.id)
 
     markup = types.InlineKeyboardMarkup()
     markup.add(types.InlineKeyboardButton(text=f'ℹ️ Инструкция', url=config.FAQ_LINK))
@@ -64,4 +70,4 @@ async def group_migrates_to_supergroup(message: types.Message):
              f"- блокировать пользователей \n"
              f"- закреплять сообщения. \n\n"
              f"Подробности в разделе Установка:")
-    await moder.say(chat.id, text, reply_markup=markup)
+    await engine.moder.say(chat.id, text, reply_markup=markup)
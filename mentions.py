@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from aiogram import types
+from aiogram.utils.exceptions import ChatNotFound, Unauthorized
+
+logger = logging.getLogger(f'TrueModer.{__name__}')
+
+USER = 'user'
+GROUP = 'group'
+CHANNEL = 'channel'
+UNKNOWN = 'unknown'
+
+MENTIONS_CACHE_SIZE = 10000
+MENTIONS_TTL = 24 * 60 * 60  # seconds to trust resolved mention
+MENTIONS_NEGATIVE_TTL = 60 * 60  # seconds to trust not found mention, the name may be taken later
+
+
+class MentionCache:
+    """
+    Bounded LRU of @mention kinds: user, group, channel or unknown
+
+    Resolved kinds and not found names are kept with different TTL.
+    Concurrent lookups of one name share one getChat call.
+    """
+
+    def __init__(self, bot, size=MENTIONS_CACHE_SIZE, ttl=MENTIONS_TTL, negative_ttl=MENTIONS_NEGATIVE_TTL,
+                 clock=time.monotonic):
+        self._bot = bot
+        self.size = size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self._data = OrderedDict()
+        self._resolving = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @staticmethod
+    def key(name: str):
+        return name.lstrip('@').lower()
+
+    async def _get_chat(self, name):
+        try:
+            chat = await self._bot.get_chat(f'@{name}')
+
+        except Unauthorized:
+            # bot can't see chats it is not member of
+            return GROUP
+
+        except ChatNotFound:
+            return UNKNOWN
+
+        if types.ChatType.is_group_or_super_group(chat):
+            return GROUP
+
+        if types.ChatType.is_channel(chat):
+            return CHANNEL
+
+        return USER
+
+    async def _resolve(self, name):
+        try:
+            kind = await self._get_chat(name)
+        finally:
+            del self._resolving[name]
+
+        self._data[name] = kind, self.clock() + (self.negative_ttl if kind == UNKNOWN else self.ttl)
+        self._data.move_to_end(name)
+        if len(self._data) > self.size:
+            self._data.popitem(last=False)
+
+        logger.debug('Resolved mention @%s: %s', name, kind)
+        return kind
+
+    async def resolve(self, name):
+        """
+        Get kind of mentioned chat
+
+        :param name: username with or without @
+        :return: USER, GROUP, CHANNEL or UNKNOWN
+        :rtype: str
+        """
+        name = self.key(name)
+
+        entry = self._data.get(name)
+        if entry is not None:
+            kind, expires = entry
+            if expires > self.clock():
+                self._data.move_to_end(name)
+                self.hits += 1
+                return kind
+            del self._data[name]
+
+        resolving = self._resolving.get(name)
+        if resolving is None:
+            self.misses += 1
+            resolving = self._resolving[name] = asyncio.ensure_future(self._resolve(name))
+        else:
+            self.coalesced += 1
+
+        return await asyncio.shield(resolving)
+
+    def clear(self):
+        self._data.clear()
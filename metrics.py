@@ -0,0 +1,297 @@
+import asyncio
+import bisect
+import functools
+import logging
+import time
+
+logger = logging.getLogger(f'TrueModer.{__name__}')
+
+BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)  # seconds
+DUMP_INTERVAL = 60  # seconds between dumps of metrics to log
+
+_metrics = []
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    """
+    Named metric with values by label values, registered for rendering on creation
+    """
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _metrics.append(self)
+
+    def clear(self):
+        self._values.clear()
+
+    def samples(self):
+        """
+        Samples of metric
+
+        :return: list of (name suffix, label values, extra label, value)
+        """
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for suffix, labels, extra, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_labels(self.labelnames, labels, extra)} {value:g}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        return [('_total', labels, '', value) for labels, value in sorted(self._values.items())]
+
+
+class Gauge(Metric):
+    """
+    Gauge is set directly or tracks function, which is called on rendering
+    """
+    type = 'gauge'
+
+    def set(self, value, *labels):
+        self._values[labels] = value
+
+    def track(self, func, *labels):
+        """
+        Read value of gauge from func on every rendering
+
+        :param func: function without arguments returning number
+        :param labels: label values
+        """
+        self._values[labels] = func
+
+    def get(self, *labels):
+        value = self._values.get(labels, 0)
+        return value() if callable(value) else value
+
+    def samples(self):
+        return [('', labels, '', self.get(*labels)) for labels in sorted(self._values)]
+
+
+class _Timer:
+    __slots__ = 'histogram', 'labels', 'start'
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Histogram(Metric):
+    """
+    Histogram of seconds with fixed buckets, observing is one bisect
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        state = self._values.get(labels)
+        if state is None:
+            # counts by bucket with +Inf at the end, sum
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def time(self, *labels):
+        """ Context manager observing time of its block """
+        return _Timer(self, labels)
+
+    def count(self, *labels):
+        state = self._values.get(labels)
+        return sum(state[0]) if state else 0
+
+    def quantile(self, q, *labels):
+        """
+        Upper bound of bucket holding quantile q
+
+        :param q: quantile from 0 to 1
+        :return: seconds, inf if quantile is above the last bucket, 0 without observations
+        :rtype: float
+        """
+        state = self._values.get(labels)
+        if not state:
+            return 0.0
+
+        rank = q * sum(state[0])
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), state[0]):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float('inf')
+
+    def samples(self):
+        samples = []
+        for labels, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append(('_bucket', labels, f'le="{bound:g}"', cumulative))
+            cumulative += counts[-1]
+            samples.append(('_bucket', labels, 'le="+Inf"', cumulative))
+            samples.append(('_sum', labels, '', total))
+            samples.append(('_count', labels, '', cumulative))
+        return samples
+
+
+HANDLER_LATENCY = Histogram('truemoder_handler_seconds', 'Time of message handlers', ('handler',))
+HANDLER_ERRORS = Counter('truemoder_handler_errors', 'Exceptions raised by message handlers', ('handler',))
+EXPLICIT_LATENCY = Histogram('truemoder_find_explicit_seconds', 'Time of explicit search by result', ('result',))
+API_LATENCY = Histogram('truemoder_api_request_seconds', 'Time of Bot API requests', ('method',))
+API_ERRORS = Counter('truemoder_api_errors', 'Failed Bot API requests', ('method', 'error'))
+THROTTLED = Counter('truemoder_throttled', 'Throttled users and postponed actions by reason', ('reason',))
+QUEUE_DEPTH = Gauge('truemoder_queue_depth', 'Items waiting in queues', ('queue',))
+PREFILTER = Counter('truemoder_prefilter', 'Supergroup text messages by verdict of pre-dispatch filter', ('verdict',))
+FORWARDED = Counter('truemoder_forwarded_updates', 'Updates forwarded by master to workers', ('worker', 'result'))
+RAIDS = Counter('truemoder_raids', 'Messages of similar clusters by whether raid is confirmed', ('verdict',))
+CACHE_HIT_RATE = Gauge('truemoder_cache_hit_rate', 'Share of lookups served from cache', ('cache',))
+CACHE_LOOKUPS = Gauge('truemoder_cache_lookups', 'Cache lookups by result', ('cache', 'result'))
+
+
+def handler(name):
+    """
+    Decorator of handler coroutine, observes its time and counts its exceptions
+
+    :param name: handler label
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(name)
+                raise
+            finally:
+                HANDLER_LATENCY.observe(time.perf_counter() - start, name)
+
+        return wrapper
+
+    return decorator
+
+
+def measure_bot(bot):
+    """
+    Observe latency and errors of every Bot API request of bot by method
+
+    :param bot: aiogram bot
+    :return: the same bot
+    """
+    request = bot.request
+
+    async def measured_request(method, data=None, files=None):
+        start = time.perf_counter()
+        try:
+            return await request(method, data, files)
+        except Exception as e:
+            API_ERRORS.inc(method, type(e).__name__)
+            raise
+        finally:
+            API_LATENCY.observe(time.perf_counter() - start, method)
+
+    bot.request = measured_request
+    return bot
+
+
+def render():
+    """
+    All metrics in Prometheus text format
+
+    :rtype: str
+    """
+    return '\n'.join(metric.render() for metric in _metrics) + '\n'
+
+
+def summary():
+    """
+    Short human readable lines of non-empty metrics, for log
+
+    :rtype: list
+    """
+    lines = []
+    for metric in _metrics:
+        for labels in sorted(metric._values):
+            name = f'{metric.name}{_labels(metric.labelnames, labels)}'
+            if isinstance(metric, Histogram):
+                counts, total = metric._values[labels]
+                count = sum(counts)
+                lines.append(f'{name} count={count} avg={total / count * 1000:.2f}ms '
+                             f'p99<={metric.quantile(0.99, *labels) * 1000:g}ms')
+            else:
+                lines.append(f'{name} {metric.get(*labels):g}')
+    return lines
+
+
+async def handle(request):
+    """ Prometheus endpoint of aiohttp application """
+    from aiohttp import web
+
+    return web.Response(body=render().encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+
+async def _dump_periodically(interval):
+    while True:
+        await asyncio.sleep(interval)
+        lines = summary()
+        if lines:
+            logger.info('Metrics:\n' + '\n'.join(lines))
+
+
+_dumper = None
+
+
+def setup_dump(interval=DUMP_INTERVAL, loop=None):
+    """
+    Dump metrics to log every interval seconds, for polling mode without metrics endpoint
+
+    :param interval: seconds
+    :param loop:
+    """
+    global _dumper
+
+    shutdown_dump()
+    _dumper = (loop or asyncio.get_event_loop()).create_task(_dump_periodically(interval))
+
+
+def shutdown_dump():
+    global _dumper
+
+    if _dumper is not None:
+        _dumper.cancel()
+        _dumper = None
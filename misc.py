@@ -1,14 +1,127 @@
+import atexit
+import copy
+import json
 import logging
-import config
+import logging.handlers
+import queue
 import sys
+import time
+
 from aiogram.types import Chat, User
 
 logger = logging.getLogger(f'TrueModer.{__name__}')
 
+TEXT_FORMAT = '%(asctime)s | %(name)s:%(lineno)d | %(levelname)s | %(message)s'
+SAMPLE_LIMIT = 0  # records of one line of code logged per interval, 0 to log all
+SAMPLE_INTERVAL = 60  # seconds
+MAX_SAMPLED_LINES = 10000  # lines of code tracked by sampling filter at most
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    One json object per record, for log collectors
+    """
+
+    def format(self, record):
+        data = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'line': record.lineno,
+            'message': record.getMessage(),
+        }
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            data['suppressed'] = suppressed
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Passes at most `limit` records of one line of code per interval, records below `level` only.
+    The first record passed after suppression carries count of suppressed ones in `suppressed` attribute
+    """
+
+    def __init__(self, limit=SAMPLE_LIMIT, interval=SAMPLE_INTERVAL, level=logging.WARNING, clock=time.monotonic):
+        super(SamplingFilter, self).__init__()
+        self.limit = limit
+        self.interval = interval
+        self.level = level
+        self.clock = clock
+        self._windows = {}  # (pathname, lineno): [window start, passed, suppressed]
+
+    def filter(self, record):
+        if not self.limit or record.levelno >= self.level:
+            return True
+
+        now = self.clock()
+        key = record.pathname, record.lineno
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            if window is None and len(self._windows) >= MAX_SAMPLED_LINES:
+                self._windows.clear()
+            suppressed = window[2] if window is not None else 0
+            window = self._windows[key] = [now, 0, 0]
+            if suppressed:
+                record.suppressed = suppressed
+                record.msg = f'{record.msg} (+{suppressed} similar suppressed)'
+
+        if window[1] >= self.limit:
+            window[2] += 1
+            return False
+
+        window[1] += 1
+        return True
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    Queues records of this process without formatting them: only arguments are merged into message,
+    exception is formatted by handler of listener
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener = None
+
 
 def setup_logger():
-    logging.basicConfig(format='%(asctime)s | %(name)s:%(lineno)d | %(levelname)s | %(message)s',
-                        level=config.LOGGING_LEVEL, stream=sys.stdout)
+    """
+    Configure root logger by LOGGING_* settings: text or json format, sampling of repeated records
+    and writing to stdout from background thread
+
+    :return: bot logger
+    """
+    global _listener
+
+    import config
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JSONFormatter() if config.LOGGING_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    handler = stream
+    if config.LOGGING_QUEUE:
+        shutdown_logger()
+        handler = QueueHandler(queue.SimpleQueue())
+        _listener = logging.handlers.QueueListener(handler.queue, stream)
+        _listener.start()
+        atexit.register(shutdown_logger)
+
+    if config.LOGGING_SAMPLE:
+        handler.addFilter(SamplingFilter(config.LOGGING_SAMPLE, config.LOGGING_SAMPLE_INTERVAL))
+
+    root = logging.getLogger()
+    root.setLevel(config.LOGGING_LEVEL)
+    root.handlers = [handler]
 
     logging.getLogger('aiohttp').setLevel(logging.WARNING)
     logging.getLogger('chatbase').setLevel(logging.INFO)
@@ -16,6 +129,15 @@ def setup_logger():
     return logging.getLogger('TrueModer')
 
 
+def shutdown_logger():
+    """ Write queued records and stop background thread """
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 def log_repr(o):
     """
     Represents object to log view
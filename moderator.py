@@ -1,6 +1,5 @@
 import asyncio as aio
 import logging
-import random
 import re
 from datetime import datetime, timedelta
 
@@ -8,43 +7,69 @@ from aiogram import types, Bot
 from aiogram.utils import markdown as md
 from aiogram.utils.exceptions import *
 
-from aiochatbase import Chatbase
-from antiflood import rate_limit
+from admins import AdminCache
+from analytics import BaseSink
+from commands import PREFIX, CommandRouter
+from deletions import DeletionQueue
+import duration
 from languages import underscore as _
+from mentions import MentionCache, GROUP
+import metrics
 from misc import log_repr
+from offenders import OffenderStore
+from policy import BAN, ENTITY_RULES, GROUP_MENTION, LINK, MUTE, WARN, PolicyCache, Verdict, strongest
+from raid import RaidDetector
+from scheduler import ActionScheduler, CHATTER, ENFORCE
 
 logger = logging.getLogger(f'TrueModer.{__name__}')
 
-TEXT = 'text'
 ANSWER = 'answer'
-TIME = 'time'
 
-jail = {}
+RAID_MUTE_TIME = 24 * 60 * 60  # seconds, authors of confirmed raid are muted
 
 
 class Moderator:
-    def __init__(self, bot, cb):
+    def __init__(self, bot, analytics, storage=None):
         self._bot: Bot = bot
-        self.cb: Chatbase = cb
+        self.analytics: BaseSink = analytics
+        self.jail = OffenderStore(storage=storage)
+        self.admins = AdminCache(bot)
+        self.scheduler = ActionScheduler()
+        self.deletions = DeletionQueue(bot, self.scheduler)
+        self.raids = RaidDetector()
+
+        from config import MENTIONS_CACHE_SIZE, MENTIONS_TTL, MENTIONS_NEGATIVE_TTL, POLICY_CACHE_SIZE
+        self.mentions = MentionCache(bot, MENTIONS_CACHE_SIZE, MENTIONS_TTL, MENTIONS_NEGATIVE_TTL)
+        self.policies = PolicyCache(storage, POLICY_CACHE_SIZE)
+
+        self.commands = CommandRouter()
+        self.commands.register('ban', self.ban)
+        self.commands.register('unban', self.unban)
+        self.commands.register('mute', self.mute)
+        self.commands.register('warn', self.warn)
+        self.commands.register('delete', self.delete_reply)
 
     @property
     async def me(self):
         return await self._bot.me
 
-    async def say(self, chat_id, text, reply_markup=None, disable_web_page_preview=None):
+    async def say(self, chat_id, text, reply_markup=None, disable_web_page_preview=None, reply_to_message_id=None):
         """
-        Overrides bot.send_message and catches exceptions
+        Overrides bot.send_message, schedules it with low priority and catches exceptions
 
         :param chat_id:
         :param text:
         :param reply_markup:
         :param disable_web_page_preview:
+        :param reply_to_message_id:
         :return: message
         :rtype: Message or None
         """
         try:
-            msg = await self._bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup,
-                                               disable_web_page_preview=disable_web_page_preview)
+            msg = await self.scheduler.run(CHATTER, chat_id, self._bot.send_message, chat_id, text,
+                                           reply_markup=reply_markup,
+                                           disable_web_page_preview=disable_web_page_preview,
+                                           reply_to_message_id=reply_to_message_id)
 
         except BadRequest:
             pass
@@ -55,10 +80,10 @@ class Moderator:
         else:
             return msg
 
-    @staticmethod
-    async def check_admin(user, chat):
+    async def check_admin(self, user, chat):
         """
-        Check user is admin of chat
+        Check user is admin of chat. Cached administrators are trusted, user not found among them is rechecked
+        by fetching administrators again, so new admin is not refused
 
         :param user: administrator's user object
         :type user: types.User
@@ -82,14 +107,7 @@ class Moderator:
             logger.error("There's no Chat to check rights")
             return False
 
-        member = await chat.get_member(user.id)
-        if not isinstance(member, types.ChatMember):
-            return False
-
-        if member.is_admin():
-            return True
-
-        return False
+        return await self.admins.is_admin(chat.id, user.id, recheck=True)
 
     @staticmethod
     async def get_time(message):
@@ -98,54 +116,9 @@ class Moderator:
 
         :param message:
         :type message: types.Message
-        :return: dict with keys: 'time' and 'text'
-        :rtype: dict
+        :rtype: duration.Duration
         """
-        from datetime import timedelta
-
-        result = {}
-        time = re.search(r'(\d+)', message.text)  # в сообщении есть числа
-        time = time.group() if time else None
-
-        minutes = re.search(r'^мин|мин[^ ]+', message.text)
-        hours = re.search(r'^час|час[^ ]+', message.text)
-        days = re.search(r'дн[^ ]|день|сутки|суток', message.text)
-        weeks = re.search(r'недел', message.text)
-
-        if not time:
-            if re.search(r'пару', message.text):
-                time = 2
-            elif re.search(r'несколько', message.text):
-                time = random.randint(3, 9)
-            else:
-                time = 1
-
-        half = re.search(r'\s?пол.*', message.text)
-        time = int(time) / 2 if half else int(time)
-
-        if time and minutes:
-            result[TEXT] = f'{str(time)} {minutes.group()}'
-        elif time and hours:
-            result[TEXT] = f'{str(time)} {hours.group()}'
-        elif time and days:
-            result[TEXT] = f'{str(time)} {days.group()}'
-        elif time and weeks:
-            result[TEXT] = f'{str(time)} {weeks.group()}'
-        else:
-            result[TEXT] = f'{str(time)} час.'
-
-        if minutes:
-            result[TIME] = timedelta(minutes=float(time))
-        elif hours:
-            result[TIME] = timedelta(hours=float(time))
-        elif days:
-            result[TIME] = timedelta(days=float(time))
-        elif weeks:
-            result[TIME] = timedelta(weeks=float(time))
-        else:
-            result[TIME] = timedelta(hours=float(time))
-
-        return result
+        return duration.parse(message.text)
 
     @staticmethod
     async def check_delete(message):
@@ -164,7 +137,8 @@ class Moderator:
         until = int((datetime.now() + timedelta(seconds=seconds)).timestamp())
 
         try:
-            await self._bot.kick_chat_member(chat_id, user_id, until)
+            await self.scheduler.run(ENFORCE, chat_id, self._bot.kick_chat_member, chat_id, user_id,
+                                     until_date=until, merge_key=('kick', chat_id, user_id))
 
         except BadRequest as error:
 
@@ -174,142 +148,165 @@ class Moderator:
                 await self.say(chat_id, text)
 
             elif 'an administrator of the chat' in str(error):
-                logger.debug(f'Зачем-то пытается ограничить админа :)')
+                logger.debug('Зачем-то пытается ограничить админа :)')
+                self.admins.invalidate(chat_id)
                 text = _('Я не могу заблокировать админа')
                 await self.say(chat_id, text)
 
             else:
-                logger.exception(f'BadRequest: {error}', exc_info=True)
+                logger.exception('BadRequest: %s', error)
                 text = _('Не шмогла :(')
                 await self.say(chat_id, text)
 
-    async def ban(self, message):
+        except TelegramAPIError as e:
+            logger.error('Error: %s', e)
+
+        else:
+            return True
+
+    async def ban(self, message, command=None):
         """
         Executing ban
 
         :param message:
         :type message: types.Message
+        :param command: parsed command, parsed from message if not passed
+        :type command: commands.Command
         :return: None
         """
-        if not isinstance(message, types.Message):
-            logger.error("There's no Message with ban request ")
+        abuser = await self.command_target(message, 'ban', seconds=30 * 60)
+        if abuser is None:
             return
 
-        admin = message.from_user
         chat = message.chat
+        how_long = command.duration if command else await self.get_time(message)
+        need_delete = command.delete if command else await self.check_delete(message)
 
-        logger.info(f'moderator.ban received from {log_repr(admin)} in {log_repr(chat)}')
+        if await self.kick(chat.id, abuser.id, how_long.seconds):
+            await self.say(chat.id, 'Готово! :)')
+            logger.info('%s ban %s in %s for %s', log_repr(message.from_user), log_repr(abuser), log_repr(chat),
+                        how_long.text)
 
-        # check admin rights
-        if not await self.check_admin(admin, chat):
-            await message.delete()
-            await self.restrict_user(chat_id=chat.id, user_id=admin.id, seconds=30 * 60)
-            return
+        if need_delete:
+            await self.delete_message(message.reply_to_message)
 
-        # check reply to forward
-        if not message.reply_to_message:
-            await message.reply(f'Эту команду нужно использовать в ответ на чьё-то сообщение')
-            return
+    async def mute(self, message, command=None):
+        """
+        Executing mute command
 
-        abuser = message.reply_to_message.from_user
-        if chat and abuser:
-            how_long = await self.get_time(message)
-            ban_before = int((datetime.now() + how_long.get(TIME)).timestamp())
-            need_delete = await self.check_delete(message)
+        :param message:
+        :type message: types.Message
+        :param command: parsed command, parsed from message if not passed
+        :type command: commands.Command
+        :return: None
+        """
+        abuser = await self.command_target(message, 'mute')
+        if abuser is None:
+            return
 
-            try:
-                await self._bot.kick_chat_member(chat.id, abuser.id, ban_before)
+        chat = message.chat
+        how_long = command.duration if command else await self.get_time(message)
+        need_delete = command.delete if command else await self.check_delete(message)
 
-            except BadRequest as error:
+        if await self.restrict_user(chat.id, abuser.id, how_long.seconds):
+            await self.say(chat.id, 'Готово! :)')
+            logger.info('%s mute %s in %s for %s', log_repr(message.from_user), log_repr(abuser), log_repr(chat),
+                        how_long.text)
 
-                if 'not enough rights' in str(error):
-                    logger.debug('Не хватает прав на совершение действия')
-                    text = _('Я бы с удовольствием произвёл блокировку, но мне не хватает администраторских прав')
-                    await self.say(chat.id, text)
+        if need_delete:
+            await self.delete_message(message.reply_to_message)
 
-                elif 'an administrator of the chat' in str(error):
-                    logger.debug(f'Зачем-то пытается ограничить админа :)')
-                    text = _('Я не могу заблокировать админа')
-                    await self.say(chat.id, text)
+    async def command_target(self, message, name, seconds=61):
+        """
+        Check rights of command author and reply of command, author without rights is restricted
 
-                else:
-                    logger.exception(f'BadRequest: {error}', exc_info=True)
-                    text = _('Я не могу заблокировать админа')
-                    await self.say(chat.id, text)
+        :param message: message with command
+        :param name: command name for log
+        :param seconds: restriction of author without rights
+        :return: user, whose message command replies to, or None
+        :rtype: types.User or None
+        """
+        admin = message.from_user
+        chat = message.chat
+        logger.info('moderator.%s received from %s in %s', name, log_repr(admin), log_repr(chat))
 
-            else:
-                await self._bot.send_message(chat.id, 'Готово! :)')
-                logger.info(f"{admin.full_name} ({admin.id}) "
-                            f"ban {abuser.full_name} ({abuser.id}) "
-                            f"in {chat.full_name} ({chat.id}) for {how_long.get(TEXT)}")
+        if not await self.check_admin(admin, chat):
+            await self.delete_message(message)
+            await self.restrict_user(chat.id, admin.id, seconds=seconds)
+            return None
 
-            if need_delete:
-                await self._bot.delete_message(chat.id, message.reply_to_message.message_id)
+        if not message.reply_to_message or not message.reply_to_message.from_user:
+            await self.say(chat.id, 'Эту команду нужно использовать в ответ на чьё-то сообщение',
+                           reply_to_message_id=message.message_id)
+            return None
 
-        else:
-            logger.info(f"{admin.first_name} ({admin.id}) "
-                        f"хотел кого-то забанить, но не получилось :(")
+        return message.reply_to_message.from_user
 
-    async def mute(self, message):
+    async def unban(self, message, command=None):
         """
-        Executing mute command
+        Lift ban or restrictions of user and forgive their strikes
 
         :param message:
         :type message: types.Message
-        :return: None
+        :param command: parsed command
+        :type command: commands.Command
         """
-        if not isinstance(message, types.Message):
-            logger.error("There's no Message with mute request ")
+        abuser = await self.command_target(message, 'unban')
+        if abuser is None:
             return
 
-        admin = message.from_user
         chat = message.chat
-        logger.info(f'moderator.mute received from {log_repr(admin)} in {log_repr(chat)}')
-
-        # check admin rights
-        if not await self.check_admin(admin, chat):
-            await message.delete()
-            await self.restrict_user(chat.id, admin.id, seconds=61)
+        try:
+            member = await self.scheduler.run(ENFORCE, chat.id, self._bot.get_chat_member, chat.id, abuser.id)
+            if member.status == types.ChatMemberStatus.KICKED:
+                await self.scheduler.run(ENFORCE, chat.id, self._bot.unban_chat_member, chat.id, abuser.id)
+            else:
+                await self.scheduler.run(ENFORCE, chat.id, self._bot.restrict_chat_member, chat.id, abuser.id,
+                                         can_send_messages=True,
+                                         can_send_media_messages=True,
+                                         can_send_other_messages=True,
+                                         can_add_web_page_previews=True)
+
+        except TelegramAPIError as error:
+            logger.debug('Unban of %s in %s failed: %s', abuser.id, chat.id, error)
+            await self.say(chat.id, _('Не шмогла :('))
             return
 
-        # check reply to forward
-        if not message.reply_to_message:
-            return await message.reply(f'Эту команду нужно использовать в ответ на чьё-то сообщение')
-
-        abuser = message.reply_to_message.from_user
-        if chat and abuser:
-            how_long = await self.get_time(message)
-            restrict_before = int((datetime.now() + how_long.get(TIME)).timestamp())
-            need_delete = await self.check_delete(message)
+        self.jail.forgive(chat.id, abuser.id)
+        await self.say(chat.id, 'Готово! :)')
+        logger.info('%s unban %s in %s', log_repr(message.from_user), log_repr(abuser), log_repr(chat))
 
-            try:
-                await self._bot.restrict_chat_member(chat_id=chat.id,
-                                                     user_id=abuser.id,
-                                                     until_date=restrict_before,
-                                                     can_send_messages=False)
-
-            except BadRequest as error:
-                if 'not enough rights' in str(error):
-                    logger.debug(f'Не хватает прав на совершение действия: {error}')
+    async def warn(self, message, command=None):
+        """
+        Strike user by admin, escalation step of chat policy is applied as for explicit.
+        The message, which command replies to, is deleted with "-" flag
 
-                elif 'an administrator of the chat' in str(error):
-                    logger.debug(f'Зачем-то пытается ограничить админа. {error}')
+        :param message:
+        :type message: types.Message
+        :param command: parsed command
+        :type command: commands.Command
+        """
+        abuser = await self.command_target(message, 'warn')
+        if abuser is None:
+            return
 
-                else:
-                    logger.exception(f'BadRequest: {error}', exc_info=True)
+        policy = await self.policies.get(message.chat.id)
+        verdict = await self.escalate(message.chat.id, abuser, policy, 'warn')
+        await self.enforce(message.reply_to_message, [verdict], delete=bool(command and command.delete))
 
-            else:
-                await self._bot.send_message(chat.id, 'Готово! :)')
-                logger.info(f"{admin.full_name} ({admin.id}) "
-                            f"mute {abuser.full_name} ({abuser.id}) "
-                            f"in {chat.title} ({chat.id}) at {how_long.get(TEXT)}")
+    async def delete_reply(self, message, command=None):
+        """
+        Delete message, which command replies to, and command itself
 
-            if need_delete:
-                await self._bot.delete_message(chat.id, message.reply_to_message.message_id)
+        :param message:
+        :type message: types.Message
+        :param command: parsed command
+        :type command: commands.Command
+        """
+        if await self.command_target(message, 'delete') is None:
+            return
 
-        else:
-            logger.info(f"{admin.first_name} ({admin.id}) "
-                        f"хотел кого-то заткнуть, но не получилось :(")
+        await aio.gather(self.delete_message(message.reply_to_message), self.delete_message(message))
 
     async def restrict_user(self, chat_id, user_id, seconds=61):
         """
@@ -324,70 +321,174 @@ class Moderator:
         until = int((datetime.now() + timedelta(seconds=seconds)).timestamp())
 
         try:
-            await self._bot.restrict_chat_member(chat_id, user_id,
-                                                 can_send_messages=False,
-                                                 can_send_other_messages=False,
-                                                 can_add_web_page_previews=False,
-                                                 can_send_media_messages=False,
-                                                 until_date=until)
+            await self.scheduler.run(ENFORCE, chat_id, self._bot.restrict_chat_member, chat_id, user_id,
+                                     can_send_messages=False,
+                                     can_send_other_messages=False,
+                                     can_add_web_page_previews=False,
+                                     can_send_media_messages=False,
+                                     until_date=until,
+                                     merge_key=('restrict', chat_id, user_id))
 
         except BadRequest as e:
             if "Can't demote chat creator" in str(e) or "can't demote chat creator" in str(e):
-                logger.debug(f"Restriction: can't demote chat creator at {chat_id}")
+                logger.debug("Restriction: can't demote chat creator at %s", chat_id)
                 text = _('Не могу я создателя блочить!')
                 await self.say(chat_id, text)
 
             elif "is an administrator of the chat" in str(e):
-                logger.debug(f"Restriction: can't demote chat admin at {chat_id}")
+                logger.debug("Restriction: can't demote chat admin at %s", chat_id)
+                self.admins.invalidate(chat_id)
                 text = _('Не могу я админа блочить!')
                 await self.say(chat_id, text)
 
             elif "Not enough rights to restrict/unrestrict chat member" in str(e):
-                logger.warning(f"Not enough rights to restrict/unrestrict chat member at {chat_id}")
+                logger.warning('Not enough rights to restrict/unrestrict chat member at %s', chat_id)
                 text = _('Я бы с удовольствием произвёл блокировку, но мне не хватает администраторских прав')
                 await self.say(chat_id, text)
 
             else:
-                logger.exception(f'Error: \n{e}', exc_info=True)
+                logger.exception('Error: %s', e)
                 text = _('Не шмогла :(')
                 await self.say(chat_id, text)
 
-        except RetryAfter:
-            logging.error(f'Message limit reached! {RetryAfter}')
+        except RetryAfter as e:
+            logger.error('Message limit reached! %s', e)
 
         except Unauthorized as e:
-            logger.exception(f'Error: \n{e}', exc_info=True)
+            logger.exception('Error: %s', e)
 
         except TelegramAPIError as e:
-            logger.error(f'Error: \n{e}')
+            logger.error('Error: %s', e)
 
         else:
             return True
 
-    @staticmethod
-    async def delete_message(message: types.Message):
+    async def delete_message(self, message: types.Message):
+        """
+        Delete message with the next batch of its chat
+
+        :param message:
+        :return: True if message is deleted
+        :rtype: bool
+        """
+        return await self.deletions.delete(message.chat.id, message.message_id)
+
+    @metrics.handler('check_text')
+    async def check_text(self, message: types.Message):
+        logger.debug('Checking received text: %s', message.text)
+        if message.text[0] == PREFIX and await self.commands.dispatch(message):
+            return
+
+        policy = await self.policies.get(message.chat.id)
+        if message.from_user.id in policy.exempt:
+            return
+
+        if await self.check_raid(message):
+            return
+
+        # link check starts first, so its mention lookups are in flight while explicit is searched;
+        # failure of one detector doesn't drop verdict of the other
+        results = await aio.gather(self.check_link(message, policy), self.check_explicit(message, policy),
+                                   return_exceptions=True)
+        verdicts = []
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error('Detector failed on message %s in chat %s', message.message_id, message.chat.id,
+                             exc_info=result)
+            elif isinstance(result, BaseException):
+                raise result
+            elif result is not None:
+                verdicts.append(result)
+
+        await self.enforce(message, verdicts)
+
+    async def enforce(self, message: types.Message, verdicts, delete=True):
+        """
+        Apply verdicts of detectors to message: delete it once, say notices
+        and restrict its author once by the strongest verdict
+
+        :param message:
+        :param verdicts: list of Verdict
+        :param delete: delete message
+        """
+        if not verdicts:
+            return
+
         chat = message.chat
+        user = message.from_user
+        logger.info('Verdicts on message %s of user %s in chat %s: %s', message.message_id, user.id, chat.id,
+                    verdicts)
 
-        try:
-            await message.delete()
+        if delete:
+            await self.delete_message(message)
 
-        except MessageError as e:
-            logger.info(f"Can't delete message in {chat.full_name} ({chat.id}), cause: {e}")
+        notices = [verdict.notice for verdict in verdicts if verdict.notice]
+        for notice in notices:
+            await self.say(chat.id, notice)
 
-        except TelegramAPIError as e:
-            logger.error(f'TelegramAPIError: {e}')
+        verdict = strongest(verdicts)
+        if verdict.action not in (MUTE, BAN):
+            return
+
+        if notices:
+            await aio.sleep(1)
 
+        if verdict.action == MUTE:
+            await self.restrict_user(chat.id, user.id, verdict.seconds)
         else:
-            return True
+            await self.kick(chat.id, user.id, verdict.seconds)
 
-    @rate_limit(0.5, 'text')
-    async def check_text(self, message: types.Message):
-        logger.debug(f'Checking received text: {message.text}')
-        await self.check_explicit(message)
-        await self.check_link(message)
+    async def check_raid(self, message: types.Message):
+        """
+        Find similar messages of different users and handle them at once: messages are deleted and their authors
+        are muted. Raid must be confirmed by links, mentions, new members or its size, similar messages alone
+        are only counted: they may be a wave of greetings
+
+        :param message:
+        :return: True if message is part of raid
+        :rtype: bool
+        """
+        from config import super_admins
+
+        chat = message.chat
+        user = message.from_user
+
+        signal = any(entity.type in ENTITY_RULES for entity in message.entities or ())
+        raid, confirmed = self.raids.check(chat.id, user.id, message.message_id, message.text, signal)
+        if not raid:
+            return False
+
+        if not confirmed:
+            metrics.RAIDS.inc('unconfirmed')
+            logger.info('Unconfirmed raid of %d messages in chat %s is left alone', len(raid), chat.id)
+            return False
+
+        admins = await self.admins.get(chat.id)
+        raid = [(user_id, message_id) for user_id, message_id in raid
+                if user_id not in admins and user_id not in super_admins]
+        if not raid:
+            return False
+
+        metrics.RAIDS.inc('confirmed')
+        if len(raid) > 1:
+            await self.say(chat.id, _('Похоже на рейд. Убираю спам.'))
+
+        users = {user_id for user_id, message_id in raid}
+        await aio.gather(*(self.deletions.delete(chat.id, message_id) for user_id, message_id in raid),
+                         *(self.restrict_user(chat.id, user_id, RAID_MUTE_TIME) for user_id in users))
+        return True
+
+    @metrics.handler('check_explicit')
+    async def check_explicit(self, message: types.Message, policy=None):
+        """
+        Find explicit and count strike of its author, escalation step of chat policy is the verdict
 
-    @rate_limit(0.5, 'text')
-    async def check_explicit(self, message: types.Message):
+        :param message:
+        :param policy: policy of chat, loaded if not passed
+        :return: verdict if explicit is found
+        :rtype: Verdict or None
+        """
+        from config import EXPLICIT_STRICT, EXPLICIT_BUDGET
         from explicit import find_explicit
 
         text = message.text
@@ -398,82 +499,91 @@ class Moderator:
         if not text:
             return
 
+        if policy is None:
+            policy = await self.policies.get(chat.id)
+
         # is explicit found?
-        result = await find_explicit(text)
+        result = await find_explicit(text, EXPLICIT_STRICT, EXPLICIT_BUDGET)
         if not result:
-            await self.cb.register_message(user_id=user.id, intent='normal message')
+            self.analytics.register_message(user.id, 'normal message')
             return
-        logger.info(f'Found explicit in message: {text}')
-        await self.cb.register_message(user_id=user.id, intent='explicit message')
+        logger.info('Found explicit in message %s of user %s in chat %s', message.message_id, user.id, chat.id)
+        logger.debug('Explicit message text: %s', text)
+        self.analytics.register_message(user.id, 'explicit message')
 
-        # let's delete bad message
-        await self.delete_message(message)
+        return await self.escalate(chat.id, user, policy, 'explicit')
 
-        # notify user
-        try:
-            jail[user.id] += 1
-        except KeyError:
-            jail[user.id] = 1
+    async def escalate(self, chat_id, user, policy, reason):
+        """
+        Count strike of user, escalation step of chat policy is the verdict
+
+        :param chat_id:
+        :param user:
+        :type user: types.User
+        :param policy: policy of chat
+        :param reason: name of verdict
+        :rtype: Verdict
+        """
+        await self.jail.load(chat_id)
+        strikes = self.jail.strike(chat_id, user.id)
+
+        action, seconds, reset = policy.escalate(strikes)
+        if reset is not None:
+            self.jail.set(chat_id, user.id, reset)
 
         user_link = md.hlink(user.full_name, f'tg://user?id={user.id}')
 
-        if jail.get(user.id) <= 2:
-            text = _('Ай-ай-ай, {user_link}!', user_link=user_link)
-            await self.say(chat.id, text)
-            return
+        if action == WARN:
+            notice = _('Ай-ай-ай, {user_link}!', user_link=user_link)
+        elif action == MUTE:
+            notice = _('{user_link}, я же тебя предупреждал... Иди молчать.', user_link=user_link)
+        elif action == BAN:
+            notice = _('{user_link}, я же тебя предупреждал... Иди в бан.', user_link=user_link)
+        else:
+            notice = None
 
-        if 2 < jail.get(user.id) < 5:
-            text = _('{user_link}, я же тебя предупреждал... Иди молчать.', user_link=user_link)
-            await self.say(chat.id, text)
-            await aio.sleep(1)
-            await self.restrict_user(chat.id, user.id, 5 * 60 * jail.get(user.id))
-            return
+        return Verdict(reason, action, seconds, notice)
 
-        if jail.get(user.id) >= 5:
-            text = _('{user_link}, я же тебя предупреждал... Иди в бан.', user_link=user_link)
-            await self.say(chat.id, text)
-            await aio.sleep(1)
-            await self.kick(chat.id, user.id, 24 * 60 * 60)
-            jail[user.id] = 3
-            return
+    @metrics.handler('check_link')
+    async def check_link(self, message: types.Message, policy=None):
+        """
+        Find links and @group mentions by entity rules of chat policy, mentions are resolved concurrently
 
-    @rate_limit(0.5, 'link')
-    async def check_link(self, message: types.Message):
-        """ Find links and @group mentions """
+        :param message:
+        :param policy: policy of chat, loaded if not passed
+        :return: verdict if link or group mention is found
+        :rtype: Verdict or None
+        """
 
         entities = message.entities
         text = message.text
         chat = message.chat
-        user = message.from_user
-        bot = message.bot
 
+        if not entities:
+            return
+
+        if policy is None:
+            policy = await self.policies.get(chat.id)
+
+        names = []
         for entity in entities:
-            logger.debug(f'Checking entity with {entity.type}')
-            if entity.type == types.MessageEntityType.URL:
-                logger.info('Url found. Deleting. Restricting.')
-                await message.delete()
-                await self.restrict_user(chat_id=chat.id, user_id=user.id, seconds=65)
-                return
-
-            if entity.type == types.MessageEntityType.MENTION:
-                name = entity.get_text(text)
-                logger.debug(f'Received mention: {name}. Checking...')
-
-                try:
-                    mentioned_chat = await bot.get_chat(name)
-
-                except Unauthorized as e:
-                    logger.info('@-mention of group found. Deleting. Restricting.')
-                    await message.delete()
-                    await self.restrict_user(chat_id=chat.id, user_id=user.id, seconds=65)
-                    return
-
-                except ChatNotFound:
-                    logger.debug('@-mention is user. Nothing to do.')
-
-                else:
-                    logger.info('@-mention of group found. Deleting. Restricting.')
-                    if types.ChatType.is_group_or_super_group(mentioned_chat):
-                        await message.delete()
-                        await self.restrict_user(chat_id=chat.id, user_id=user.id, seconds=65)
-                        return
+            rule = policy.entities.get(entity.type)
+            if rule is None:
+                continue
+
+            logger.debug('Checking entity with %s', entity.type)
+            if rule == LINK:
+                logger.info('Url found in message %s in chat %s', message.message_id, chat.id)
+                return Verdict('link', MUTE, policy.entity_mute)
+
+            if rule == GROUP_MENTION:
+                names.append(entity.get_text(text))
+
+        if not names:
+            return
+
+        logger.debug('Received mentions: %s. Checking...', names)
+        kinds = await aio.gather(*(self.mentions.resolve(name) for name in names))
+        if GROUP in kinds:
+            logger.info('@-mention of group found in message %s in chat %s', message.message_id, chat.id)
+            return Verdict('group_mention', MUTE, policy.entity_mute)
@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(f'TrueModer.{__name__}')
+
+STRIKE_DECAY = 24 * 60 * 60  # one strike is forgiven after that many seconds
+MAX_OFFENDERS = 100000  # records kept at most, the longest untouched are dropped first
+SWEEP_EVERY = 1000  # updates between lazy sweeps
+SWEEP_LIMIT = 100  # records checked by one sweep
+
+
+class Offender:
+    """
+    Strikes of user in chat. Time of last update is kept to decay strikes lazily
+    """
+    __slots__ = 'strikes', 'updated'
+
+    def __init__(self, strikes=0, updated=0.0):
+        self.strikes = strikes
+        self.updated = updated
+
+
+class OffenderStore:
+    """
+    Strikes of users keyed by (chat_id, user_id)
+
+    Strikes decay over time: one strike is forgiven every `decay` seconds.
+    Records are kept in order of update, so store is capped by dropping the longest untouched ones,
+    and expired records are swept lazily from that end.
+
+    With storage every update is reported to it, and strikes of chat are loaded from it on first access.
+    If storage keeps offenders, store is capped by dropping whole chats, they are loaded again on next access.
+    """
+
+    def __init__(self, decay=STRIKE_DECAY, max_size=MAX_OFFENDERS, clock=time.time, storage=None):
+        self.decay = decay
+        self.max_size = max_size
+        self.clock = clock
+        self.storage = storage
+        self._records = OrderedDict()
+        self._users = {}  # user ids of records of every chat
+        self._updates = 0
+        self._loaded = {}
+
+    def __len__(self):
+        return len(self._records)
+
+    def _add(self, key, record):
+        self._records[key] = record
+        self._users.setdefault(key[0], set()).add(key[1])
+
+    def _remove(self, key):
+        if self._records.pop(key, None) is None:
+            return
+
+        chat_id, user_id = key
+        users = self._users[chat_id]
+        users.discard(user_id)
+        if not users:
+            del self._users[chat_id]
+
+    def _actual(self, record, now):
+        """ Apply decay to record """
+        if self.decay and record.strikes:
+            forgiven = int((now - record.updated) // self.decay)
+            if forgiven > 0:
+                record.strikes = max(record.strikes - forgiven, 0)
+                record.updated += forgiven * self.decay
+        return record.strikes
+
+    async def load(self, chat_id):
+        """
+        Warm up strikes of chat from storage, once per chat
+
+        :param chat_id:
+        """
+        if self.storage is None:
+            return
+
+        loading = self._loaded.get(chat_id)
+        if loading is True:
+            return
+
+        if loading is None:
+            loading = self._loaded[chat_id] = asyncio.ensure_future(self._load(chat_id))
+        await asyncio.shield(loading)
+
+    async def _load(self, chat_id):
+        try:
+            rows = await self.storage.load_offenders(chat_id)
+        except Exception:
+            self._loaded.pop(chat_id, None)
+            raise
+
+        now = self.clock()
+        for user_id, strikes, updated in rows:
+            key = chat_id, user_id
+            if key in self._records:
+                continue
+
+            # chat is in use, so its records are the last to drop
+            record = Offender(strikes, updated)
+            if self._actual(record, now):
+                self._add(key, record)
+
+        self._loaded[chat_id] = True
+        self._trim()
+
+    def _save(self, key, strikes, updated):
+        if self.storage is not None:
+            self.storage.save_offender(*key, strikes, updated)
+
+    def get(self, chat_id, user_id):
+        """
+        Get strikes of user in chat
+
+        :param chat_id:
+        :param user_id:
+        :return: strikes
+        :rtype: int
+        """
+        record = self._records.get((chat_id, user_id))
+        if record is None:
+            return 0
+        return self._actual(record, self.clock())
+
+    def strike(self, chat_id, user_id, count=1):
+        """
+        Add strikes to user in chat
+
+        :param chat_id:
+        :param user_id:
+        :param count: strikes to add
+        :return: strikes after update
+        :rtype: int
+        """
+        now = self.clock()
+        key = chat_id, user_id
+
+        record = self._records.get(key)
+        if record is None:
+            record = Offender(0, now)
+            self._add(key, record)
+        else:
+            self._actual(record, now)
+            self._records.move_to_end(key)
+
+        record.strikes += count
+        record.updated = now
+
+        self._save(key, record.strikes, now)
+        self._updated()
+        return record.strikes
+
+    def set(self, chat_id, user_id, strikes):
+        """
+        Set strikes of user in chat
+
+        :param chat_id:
+        :param user_id:
+        :param strikes:
+        """
+        key = chat_id, user_id
+
+        if strikes <= 0:
+            self.forgive(chat_id, user_id)
+            return
+
+        record = self._records.get(key)
+        if record is None:
+            record = Offender()
+            self._add(key, record)
+        else:
+            self._records.move_to_end(key)
+
+        record.strikes = strikes
+        record.updated = self.clock()
+
+        self._save(key, strikes, record.updated)
+        self._updated()
+
+    def forgive(self, chat_id, user_id):
+        """ Drop all strikes of user in chat """
+        key = chat_id, user_id
+        self._remove(key)
+        self._save(key, 0, self.clock())
+
+    def _trim(self):
+        while len(self._records) > self.max_size:
+            key = next(iter(self._records))
+            chat_id = key[0]
+            if self.storage is None or not self.storage.keeps_offenders or len(self._users) == 1:
+                self._remove(key)
+                continue
+
+            # records are still in storage, so chat is loaded again on next access;
+            # dropping one record only would make chat be loaded and trimmed over and over
+            for user_id in self._users.pop(chat_id):
+                del self._records[chat_id, user_id]
+            if self._loaded.get(chat_id) is True:
+                del self._loaded[chat_id]
+
+    def _updated(self):
+        self._trim()
+
+        self._updates += 1
+        if self._updates >= SWEEP_EVERY:
+            self._updates = 0
+            self.sweep()
+
+    def sweep(self, limit=SWEEP_LIMIT):
+        """
+        Drop expired records among the longest untouched ones
+
+        :param limit: records to check
+        :return: dropped records count
+        :rtype: int
+        """
+        now = self.clock()
+        expired = []
+
+        for index, (key, record) in enumerate(self._records.items()):
+            if index >= limit:
+                break
+            if not self._actual(record, now):
+                expired.append(key)
+
+        for key in expired:
+            self._remove(key)
+
+        if expired:
+            logger.debug('Swept %d expired offenders, %d left', len(expired), len(self._records))
+
+        return len(expired)
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+from bisect import bisect_right
+from collections import OrderedDict
+
+logger = logging.getLogger(f'TrueModer.{__name__}')
+
+POLICY_CACHE_SIZE = 10000  # compiled policies of active chats kept in memory
+
+# actions of escalation steps
+WARN = 'warn'
+MUTE = 'mute'
+BAN = 'ban'
+
+# strength of actions, the strongest restriction found in message is applied
+_ACTION_RANKS = {None: 0, WARN: 1, MUTE: 2, BAN: 3}
+
+# rules of message entities
+LINK = 'link'  # message with entity is deleted and its author is restricted
+GROUP_MENTION = 'group_mention'  # the same, if mentioned username belongs to group or channel
+
+# content types, which can be deleted by policy, bit of every type is its index
+MEDIA_TYPES = ('sticker', 'video_note', 'video', 'document', 'contact', 'photo', 'game', 'animation',
+               'audio', 'voice', 'location', 'venue')
+_MEDIA_BITS = {content_type: 1 << index for index, content_type in enumerate(MEDIA_TYPES)}
+
+# entity types with their rules
+ENTITY_RULES = {'url': LINK, 'text_link': LINK, 'mention': GROUP_MENTION}
+
+DEFAULT_SETTINGS = {
+    'delete_types': ['sticker', 'video_note', 'video', 'document', 'contact', 'photo', 'game', 'animation'],
+    # steps by count of strikes for explicit messages, seconds of mute are multiplied by strikes if `scale`,
+    # strikes are set to `reset` after step
+    'escalation': [
+        {'strikes': 1, 'action': WARN},
+        {'strikes': 3, 'action': MUTE, 'seconds': 5 * 60, 'scale': True},
+        {'strikes': 5, 'action': BAN, 'seconds': 24 * 60 * 60, 'reset': 3},
+    ],
+    'entities': ['url', 'mention'],
+    'entity_mute': 65,  # seconds
+    'exempt': [],  # user ids
+}
+
+
+class Policy:
+    """
+    Moderation policy of chat compiled to lookups: bitmask of deleted content types,
+    escalation steps searched by strikes, rules by entity type and set of exempt users
+    """
+    __slots__ = 'settings', 'delete_mask', 'thresholds', 'steps', 'entities', 'entity_mute', 'exempt'
+
+    def __init__(self, settings=None):
+        """
+        :param settings: dict like DEFAULT_SETTINGS, missing keys are taken from it
+        :raise ValueError: if settings are invalid
+        """
+        self.settings = settings = {**DEFAULT_SETTINGS, **(settings or {})}
+
+        unknown = set(settings) - set(DEFAULT_SETTINGS)
+        if unknown:
+            raise ValueError(f'Unknown policy settings: {sorted(unknown)}')
+
+        self.delete_mask = 0
+        for content_type in settings['delete_types']:
+            if content_type not in _MEDIA_BITS:
+                raise ValueError(f'Content type {content_type!r} can not be deleted by policy')
+            self.delete_mask |= _MEDIA_BITS[content_type]
+
+        self.thresholds, self.steps = self._compile_steps(settings['escalation'])
+
+        self.entities = {}
+        for entity_type in settings['entities']:
+            if entity_type not in ENTITY_RULES:
+                raise ValueError(f'Unknown entity type {entity_type!r}')
+            self.entities[entity_type] = ENTITY_RULES[entity_type]
+
+        self.entity_mute = int(settings['entity_mute'])
+        self.exempt = frozenset(settings['exempt'])
+
+    @staticmethod
+    def _compile_steps(escalation):
+        """
+        Escalation steps sorted by strikes: tuple of strikes of every step
+        and tuple of (action, seconds, scale, reset) of steps
+        """
+        for step in escalation:
+            if not isinstance(step.get('strikes'), int) or step['strikes'] < 0:
+                raise ValueError(f'Escalation step {step!r} has no count of strikes')
+            if step.get('action') not in (WARN, MUTE, BAN):
+                raise ValueError(f'Unknown escalation action {step.get("action")!r}')
+
+        escalation = sorted(escalation, key=lambda step: step['strikes'])
+        thresholds = tuple(step['strikes'] for step in escalation)
+        steps = tuple((step['action'], step.get('seconds', 0), step.get('scale', False), step.get('reset'))
+                      for step in escalation)
+        return thresholds, steps
+
+    def deletes(self, content_type):
+        """
+        :param content_type: content type of message
+        :return: True if messages of this type are deleted
+        :rtype: bool
+        """
+        return bool(self.delete_mask & _MEDIA_BITS.get(content_type, 0))
+
+    def escalate(self, strikes):
+        """
+        Step of escalation by strikes of user
+
+        :param strikes:
+        :return: action or None, seconds of restriction, strikes to set after action or None
+        :rtype: tuple
+        """
+        # the last step reached with that strikes
+        index = bisect_right(self.thresholds, strikes) - 1
+        if index < 0:
+            return None, 0, None
+
+        action, seconds, scale, reset = self.steps[index]
+        return action, seconds * strikes if scale else seconds, reset
+
+
+DEFAULT_POLICY = Policy()
+
+
+class Verdict:
+    """
+    Finding of one detector about message: the message is deleted, its author gets restriction
+    of `action` for `seconds` and `notice` is said to chat
+    """
+    __slots__ = 'reason', 'action', 'seconds', 'notice'
+
+    def __init__(self, reason, action=None, seconds=0, notice=None):
+        """
+        :param reason: name of detector
+        :param action: WARN, MUTE, BAN or None
+        :param seconds: seconds of restriction
+        :param notice: text to say
+        """
+        self.reason = reason
+        self.action = action
+        self.seconds = seconds
+        self.notice = notice
+
+    def __repr__(self):
+        return f'<Verdict {self.reason}: {self.action} {self.seconds}s>'
+
+    @property
+    def strength(self):
+        return _ACTION_RANKS[self.action], self.seconds
+
+
+def strongest(verdicts):
+    """
+    :param verdicts: verdicts of one message
+    :return: verdict with the strongest restriction, longer one of the same action, or None if there are no verdicts
+    :rtype: Verdict or None
+    """
+    return max(verdicts, key=lambda verdict: verdict.strength, default=None)
+
+
+class PolicyCache:
+    """
+    Compiled policies of chats, the least recently used are dropped above `size`.
+    Policies are loaded from storage on first use, concurrent loads of one chat share one query
+    """
+
+    def __init__(self, storage=None, size=POLICY_CACHE_SIZE):
+        self.storage = storage
+        self.size = size
+        self._policies = OrderedDict()
+        self._loading = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._policies)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _put(self, chat_id, policy):
+        self._policies[chat_id] = policy
+        self._policies.move_to_end(chat_id)
+        if len(self._policies) > self.size:
+            self._policies.popitem(last=False)
+
+    async def _load(self, chat_id):
+        try:
+            settings = await self.storage.get_chat_settings(chat_id)
+            try:
+                policy = Policy(settings) if settings else DEFAULT_POLICY
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error('Invalid policy of chat %s, default one is used: %s', chat_id, e)
+                policy = DEFAULT_POLICY
+            self._put(chat_id, policy)
+            return policy
+        finally:
+            del self._loading[chat_id]
+
+    async def get(self, chat_id):
+        """
+        Get policy of chat
+
+        :param chat_id:
+        :rtype: Policy
+        """
+        policy = self._policies.get(chat_id)
+        if policy is not None:
+            self._policies.move_to_end(chat_id)
+            self.hits += 1
+            return policy
+
+        self.misses += 1
+        if self.storage is None:
+            return DEFAULT_POLICY
+
+        loading = self._loading.get(chat_id)
+        if loading is None:
+            loading = self._loading[chat_id] = asyncio.ensure_future(self._load(chat_id))
+        return await asyncio.shield(loading)
+
+    async def set(self, chat_id, settings):
+        """
+        Compile, save and apply new settings of chat
+
+        :param chat_id:
+        :param settings: dict like DEFAULT_SETTINGS, missing keys are taken from it
+        :return: compiled policy
+        :rtype: Policy
+        :raise ValueError: if settings are invalid
+        """
+        policy = Policy(settings)
+        if self.storage is not None:
+            await self.storage.set_chat_settings(chat_id, settings)
+        self._put(chat_id, policy)
+        return policy
+
+    def invalidate(self, chat_id):
+        self._policies.pop(chat_id, None)
@@ -0,0 +1,83 @@
+import logging
+
+from aiogram import types
+from aiogram.dispatcher import CancelHandler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from commands import PREFIX
+import metrics
+
+logger = logging.getLogger(f'TrueModer.{__name__}')
+
+
+class PrefilterMiddleware(BaseMiddleware):
+    """
+    Fast path of supergroup text messages with nothing to do.
+
+    Message of user, who has no strikes, without entities checked by chat policy and without explicit is only
+    registered by raid detector and analytics, then handling is cancelled before filters of handlers are resolved.
+    Any other message and moderator commands go through the full handler chain.
+    Runs after flood middleware, so flood is still counted.
+    """
+
+    def __init__(self, moder):
+        """
+        :param moder: moderator
+        :type moder: moderator.Moderator
+        """
+        self.moder = moder
+        super(PrefilterMiddleware, self).__init__()
+
+        self.skipped = 0
+        self.passed = 0
+
+    async def is_trivial(self, message: types.Message, policy):
+        """
+        Decide in one pass that check_text would do nothing but raid check
+
+        :param message: supergroup text message
+        :param policy: policy of chat
+        :rtype: bool
+        """
+        from config import EXPLICIT_STRICT, EXPLICIT_BUDGET
+        import explicit
+
+        text = message.text
+
+        # long texts are scanned by workers of full handler
+        if explicit.executor is not None and len(text) > explicit.executor.threshold:
+            return False
+
+        if message.entities and any(entity.type in policy.entities for entity in message.entities):
+            return False
+
+        if self.moder.jail.get(message.chat.id, message.from_user.id):
+            return False
+
+        # verdict is cached, so explicit message is not scanned again by full handler
+        return not await explicit.find_explicit(text, EXPLICIT_STRICT, EXPLICIT_BUDGET)
+
+    async def on_pre_process_message(self, message: types.Message):
+        chat = message.chat
+        user = message.from_user
+
+        if chat.type != types.ChatType.SUPER_GROUP or not user or not message.text:
+            return
+
+        # moderator commands are routed by full handler, exempt admins too
+        if message.text[0] == PREFIX:
+            return
+
+        policy = await self.moder.policies.get(chat.id)
+        if user.id not in policy.exempt:
+            if not await self.is_trivial(message, policy):
+                self.passed += 1
+                metrics.PREFILTER.inc('passed')
+                return
+
+            if not await self.moder.check_raid(message):
+                self.moder.analytics.register_message(user.id, 'normal message')
+
+        self.skipped += 1
+        metrics.PREFILTER.inc('skipped')
+        raise CancelHandler()
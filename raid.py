@@ -0,0 +1,248 @@
+import logging
+import re
+import time
+from collections import OrderedDict, deque
+from typing import NamedTuple
+
+logger = logging.getLogger(f'TrueModer.{__name__}')
+
+RAID_SIZE = 5  # similar messages from different users...
+RAID_WINDOW = 60  # ...in that many seconds are raid
+LARGE_RAID_SIZE = 20  # raid of that many users is confirmed without other signals
+NEW_MEMBER_TIME = 60 * 60  # users joined that many seconds ago are new members...
+NEW_MEMBER_SHARE = 0.5  # ...and raid is confirmed when they are that share of its users
+MAX_JOINS = 100000  # joins kept at most, the oldest are dropped first
+MIN_WORDS = 3  # shorter messages are too common to be compared
+MAX_ENTRIES = 1000  # sketches kept per chat
+MAX_CHATS = 10000  # chats tracked at most, the longest idle are dropped first
+
+SKETCH_SIZE = 8  # smallest word hashes kept of every message
+SIMILARITY = 0.5  # estimated jaccard similarity of word sets of similar messages
+MIN_WORD = 3  # shorter words are too common to be features
+MAX_CANDIDATES = 100  # last messages compared from one bucket
+
+_WORD = re.compile(r'\w+')
+
+
+def sketch(text):
+    """
+    Bottom-k MinHash sketch of text words or None if text is too short
+
+    :param text:
+    :return: sorted smallest hashes of words
+    :rtype: tuple or None
+    """
+    words = {word for word in _WORD.findall(text.lower()) if len(word) >= MIN_WORD}
+    if len(words) < MIN_WORDS:
+        return None
+    return tuple(sorted([hash(word) for word in words])[:SKETCH_SIZE])
+
+
+def similarity(a, b, shared=None):
+    """
+    Estimate jaccard similarity of word sets by jaccard similarity of their sketches
+
+    :param a: sketch
+    :param b: sketch
+    :param shared: count of hashes in both sketches, if known
+    :rtype: float
+    """
+    if shared is None:
+        shared = len(set(a).intersection(b))
+    return shared / (len(a) + len(b) - shared)
+
+
+class Raid(NamedTuple):
+    """
+    Messages of raid to handle and whether raid is confirmed by a signal besides similarity:
+    links or mentions, new members or size of raid
+    """
+    messages: tuple = ()
+    confirmed: bool = False
+
+
+class Entry:
+    __slots__ = 'sketch', 'time', 'message_id', 'user_id', 'signal', 'flagged', 'confirmed'
+
+    def __init__(self, sketch, time, message_id, user_id, signal):
+        self.sketch = sketch
+        self.time = time
+        self.message_id = message_id
+        self.user_id = user_id
+        self.signal = signal
+        self.flagged = False
+        self.confirmed = False
+
+
+class ChatIndex:
+    """
+    Sketches of the last messages of chat, bucketed by every hash of sketch
+    """
+    __slots__ = 'entries', 'buckets', 'last'
+
+    def __init__(self):
+        self.entries = deque()
+        self.buckets = {}
+        self.last = 0.0
+
+    def add(self, entry):
+        self.entries.append(entry)
+        for value in entry.sketch:
+            self.buckets.setdefault(value, []).append(entry)
+
+    def pop(self):
+        entry = self.entries.popleft()
+        for value in entry.sketch:
+            bucket = self.buckets[value]
+            # the oldest entry is the first one
+            del bucket[0]
+            if not bucket:
+                del self.buckets[value]
+
+    def expire(self, before, size):
+        entries = self.entries
+        while entries and (entries[0].time < before or len(entries) > size):
+            self.pop()
+
+    def similar(self, sketch, threshold):
+        shared = {}
+        for value in sketch:
+            bucket = self.buckets.get(value)
+            if bucket:
+                for entry in bucket[-MAX_CANDIDATES:]:
+                    shared[entry] = shared.get(entry, 0) + 1
+
+        return [entry for entry, count in shared.items() if similarity(sketch, entry.sketch, count) >= threshold]
+
+
+class RaidDetector:
+    """
+    Streaming near-duplicate detector
+
+    Words of messages are sketched by bottom-k MinHash, sketches are indexed per chat by their hashes
+    for `window` seconds, so only messages sharing some of the smallest hashes are compared.
+    When similar messages of `size` different users are found, the whole cluster is reported,
+    and then every similar message is reported while the cluster is in window.
+
+    Similar messages alone may be a wave of greetings, so raid is only confirmed by a second signal:
+    links or mentions in its messages, new members among its users or `large_size` users at least.
+    """
+
+    def __init__(self, size=RAID_SIZE, window=RAID_WINDOW, threshold=SIMILARITY, max_entries=MAX_ENTRIES,
+                 max_chats=MAX_CHATS, large_size=LARGE_RAID_SIZE, new_member_time=NEW_MEMBER_TIME,
+                 max_joins=MAX_JOINS, clock=time.monotonic):
+        self.size = size
+        self.window = window
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_chats = max_chats
+        self.large_size = large_size
+        self.new_member_time = new_member_time
+        self.max_joins = max_joins
+        self.clock = clock
+        self._chats = OrderedDict()
+        self._joins = OrderedDict()
+
+        self.raids = 0
+
+    def __len__(self):
+        return len(self._chats)
+
+    def _evict(self, now):
+        chats = self._chats
+        while chats:
+            index = next(iter(chats.values()))
+            if now - index.last <= self.window and len(chats) <= self.max_chats:
+                break
+            chats.popitem(last=False)
+
+    def joined(self, chat_id, user_id):
+        """
+        Register new member of chat
+
+        :param chat_id:
+        :param user_id:
+        """
+        now = self.clock()
+        key = chat_id, user_id
+        self._joins.pop(key, None)
+        self._joins[key] = now
+
+        joins = self._joins
+        while joins and (len(joins) > self.max_joins or next(iter(joins.values())) < now - self.new_member_time):
+            joins.popitem(last=False)
+
+    def is_new(self, chat_id, user_id, now):
+        """ Check that user joined chat recently """
+        joined = self._joins.get((chat_id, user_id))
+        return joined is not None and now - joined <= self.new_member_time
+
+    def confirms(self, chat_id, cluster, now):
+        """
+        Check that similar messages are raid, not a wave of greetings
+
+        :param chat_id:
+        :param cluster: list of Entry
+        :param now: time
+        :rtype: bool
+        """
+        if any(entry.signal or entry.confirmed for entry in cluster):
+            return True
+
+        users = {entry.user_id for entry in cluster}
+        if len(users) >= self.large_size:
+            return True
+
+        new = sum(1 for user_id in users if self.is_new(chat_id, user_id, now))
+        return new >= len(users) * NEW_MEMBER_SHARE
+
+    def check(self, chat_id, user_id, message_id, text, signal=False):
+        """
+        Register message and find raid it is part of
+
+        :param chat_id:
+        :param user_id:
+        :param message_id:
+        :param text:
+        :param signal: message has links or mentions
+        :return: raid messages to handle as (user_id, message_id), empty if there's no raid
+        :rtype: Raid
+        """
+        value = sketch(text)
+        if value is None:
+            return Raid()
+
+        now = self.clock()
+        index = self._chats.get(chat_id)
+        if index is None:
+            index = self._chats[chat_id] = ChatIndex()
+        else:
+            self._chats.move_to_end(chat_id)
+        index.last = now
+        self._evict(now)
+
+        index.expire(now - self.window, self.max_entries - 1)
+        similar = index.similar(value, self.threshold)
+
+        entry = Entry(value, now, message_id, user_id, signal)
+        index.add(entry)
+
+        # raid is already found, the message is its part
+        flagged = [other for other in similar if other.flagged]
+        if flagged:
+            flagged.append(entry)
+            entry.flagged = True
+            entry.confirmed = self.confirms(chat_id, flagged, now)
+            return Raid([(user_id, message_id)], entry.confirmed)
+
+        similar.append(entry)
+        if len({other.user_id for other in similar}) < self.size:
+            return Raid()
+
+        self.raids += 1
+        confirmed = self.confirms(chat_id, similar, now)
+        for other in similar:
+            other.flagged = True
+            other.confirmed = confirmed
+        logger.info('Raid of %d messages found in chat %s, confirmed: %s', len(similar), chat_id, confirmed)
+        return Raid([(other.user_id, other.message_id) for other in similar], confirmed)
@@ -0,0 +1,239 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from aiogram.utils.exceptions import RetryAfter
+
+import metrics
+
+logger = logging.getLogger(f'TrueModer.{__name__}')
+
+# priorities, lower goes first
+ENFORCE = 0  # restrict, kick, delete
+CHATTER = 1  # notifications
+
+GLOBAL_RATE = 30  # actions per second for whole bot
+GLOBAL_BURST = 30
+CHAT_RATE = 1  # notifications per second in one chat
+CHAT_BURST = 10
+ENFORCE_CHAT_RATE = 20  # restricts, kicks and deletes per second in one chat, they are not limited as messages
+ENFORCE_CHAT_BURST = 50
+RETRIES = 3  # retries of action after RetryAfter
+MAX_BUCKETS = 10000  # idle chat buckets are dropped above that
+
+
+class TokenBucket:
+    __slots__ = 'rate', 'capacity', 'tokens', 'updated', 'blocked_until'
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def delay(self, now):
+        """
+        Seconds till token is available
+
+        :param now:
+        :rtype: float
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, until):
+        self.blocked_until = max(self.blocked_until, until)
+
+    def idle(self, now):
+        return self.delay(now) == 0.0 and self.tokens >= self.capacity
+
+
+class Action:
+    __slots__ = 'priority', 'seq', 'chat_id', 'func', 'args', 'kwargs', 'merge_key', 'future', 'retries'
+
+    def __init__(self, priority, seq, chat_id, func, args, kwargs, merge_key, future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.merge_key = merge_key
+        self.future = future
+        self.retries = 0
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class ActionScheduler:
+    """
+    Outbound Bot API calls limited by token buckets: one per chat and one global
+
+    Actions go by priority, then in order of submit. Action of chat without tokens is postponed
+    without holding back other chats, ENFORCE and CHATTER actions of chat have separate buckets.
+    After RetryAfter action is retried and its chat waits.
+    Queued actions with the same merge key are merged into one with the latest `until_date`.
+    """
+
+    def __init__(self, rate=GLOBAL_RATE, burst=GLOBAL_BURST, chat_rate=CHAT_RATE, chat_burst=CHAT_BURST,
+                 enforce_chat_rate=ENFORCE_CHAT_RATE, enforce_chat_burst=ENFORCE_CHAT_BURST,
+                 retries=RETRIES, clock=time.monotonic, loop=None):
+        # rate and burst of chat buckets by priority
+        self.chat_limits = {ENFORCE: (enforce_chat_rate, enforce_chat_burst), CHATTER: (chat_rate, chat_burst)}
+        self.retries = retries
+        self.clock = clock
+        self.loop = loop
+
+        self.bucket = TokenBucket(rate, burst, clock())
+        self._buckets = {}
+        self._queue = []
+        self._queued = {}
+        self._postponed = {}  # action: timer handle of actions waiting for chat token
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._worker = None
+
+        self.executed = 0
+        self.merged = 0
+        self.retried = 0
+
+    def __len__(self):
+        return len(self._queue)
+
+    def _chat_bucket(self, chat_id, priority):
+        key = chat_id, priority
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            now = self.clock()
+            if len(self._buckets) >= MAX_BUCKETS:
+                self._buckets = {key: value for key, value in self._buckets.items() if not value.idle(now)}
+            bucket = self._buckets[key] = TokenBucket(*self.chat_limits[priority], now)
+        return bucket
+
+    def _push(self, action):
+        # postponed or retried action after close
+        if self._worker is None:
+            action.future.cancel()
+            return
+
+        heapq.heappush(self._queue, action)
+        self._wakeup.set()
+
+    def _resume(self, action):
+        del self._postponed[action]
+        self._push(action)
+
+    async def run(self, priority, chat_id, func, *args, merge_key=None, **kwargs):
+        """
+        Schedule API call and wait for its result
+
+        :param priority: ENFORCE or CHATTER
+        :param chat_id: chat to limit call by
+        :param func: coroutine function
+        :param args:
+        :param merge_key: key of actions to merge, they must have `until_date` keyword argument
+        :param kwargs:
+        :return: result of call
+        """
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+
+        if self._worker is None or self._worker.done():
+            self._worker = self.loop.create_task(self._work())
+
+        if merge_key is not None:
+            queued = self._queued.get(merge_key)
+            if queued is not None:
+                queued.kwargs['until_date'] = max(queued.kwargs['until_date'], kwargs['until_date'])
+                self.merged += 1
+                return await asyncio.shield(queued.future)
+
+        action = Action(priority, next(self._seq), chat_id, func, args, kwargs, merge_key, self.loop.create_future())
+        if merge_key is not None:
+            self._queued[merge_key] = action
+
+        self._push(action)
+        return await asyncio.shield(action.future)
+
+    async def _work(self):
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = self.clock()
+            delay = self.bucket.delay(now)
+            if delay:
+                metrics.THROTTLED.inc('global_rate')
+                await asyncio.sleep(delay)
+                continue
+
+            action = heapq.heappop(self._queue)
+            chat_bucket = self._chat_bucket(action.chat_id, action.priority)
+            delay = chat_bucket.delay(now)
+            if delay:
+                metrics.THROTTLED.inc('chat_rate')
+                self._postponed[action] = self.loop.call_later(delay, self._resume, action)
+                continue
+
+            self.bucket.take()
+            chat_bucket.take()
+            if action.merge_key is not None and self._queued.get(action.merge_key) is action:
+                del self._queued[action.merge_key]
+
+            self.loop.create_task(self._execute(action))
+
+    async def _execute(self, action):
+        try:
+            result = await action.func(*action.args, **action.kwargs)
+
+        except RetryAfter as e:
+            if action.retries < self.retries:
+                action.retries += 1
+                self.retried += 1
+                metrics.THROTTLED.inc('retry_after')
+                logger.warning('Flood control in chat %s, retry in %s seconds', action.chat_id, e.timeout)
+                # flood control of chat holds back all its actions
+                until = self.clock() + e.timeout
+                for priority in self.chat_limits:
+                    self._chat_bucket(action.chat_id, priority).block(until)
+                self._push(action)
+            elif not action.future.done():
+                action.future.set_exception(e)
+
+        except Exception as e:
+            if not action.future.done():
+                action.future.set_exception(e)
+
+        else:
+            self.executed += 1
+            if not action.future.done():
+                action.future.set_result(result)
+
+    async def close(self):
+        """ Stop worker, waiters of queued actions get CancelledError """
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+        for handle in self._postponed.values():
+            handle.cancel()
+        for action in self._queue + list(self._postponed):
+            action.future.cancel()
+        self._queue.clear()
+        self._queued.clear()
+        self._postponed.clear()
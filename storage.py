@@ -0,0 +1,253 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(f'TrueModer.{__name__}')
+
+FLUSH_INTERVAL = 0.5  # seconds between write-behind flushes
+
+
+class BaseStorage:
+    """
+    Storage of moderation state: offender strikes and per-chat settings
+
+    Offender updates are reported synchronously and may be buffered,
+    everything else is async.
+    """
+    keeps_offenders = True  # offenders dropped from memory can be loaded again
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def flush(self):
+        pass
+
+    async def load_offenders(self, chat_id):
+        """
+        Load strikes of users in chat
+
+        :param chat_id:
+        :return: (user_id, strikes, updated) rows
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def save_offender(self, chat_id, user_id, strikes, updated):
+        """
+        Save strikes of user in chat. Zero strikes drops the record
+
+        :param chat_id:
+        :param user_id:
+        :param strikes:
+        :param updated: timestamp of last update
+        """
+        raise NotImplementedError
+
+    async def get_chat_settings(self, chat_id):
+        """
+        :param chat_id:
+        :return: settings of chat or None
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    async def set_chat_settings(self, chat_id, settings):
+        """
+        :param chat_id:
+        :param settings: json serializable dict
+        """
+        raise NotImplementedError
+
+
+class MemoryStorage(BaseStorage):
+    """
+    Keeps nothing but chat settings: offender strikes already live in memory of OffenderStore
+    """
+    keeps_offenders = False
+
+    def __init__(self):
+        self._settings = {}
+
+    async def load_offenders(self, chat_id):
+        return []
+
+    def save_offender(self, chat_id, user_id, strikes, updated):
+        pass
+
+    async def get_chat_settings(self, chat_id):
+        return self._settings.get(chat_id)
+
+    async def set_chat_settings(self, chat_id, settings):
+        self._settings[chat_id] = settings
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    SQLite storage with write-behind of offender updates
+
+    Updates are coalesced by (chat_id, user_id) and written every `flush_interval` seconds in one transaction.
+    Queries run in a single dedicated thread, so the event loop is never blocked by disk.
+    """
+
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL, decay=None, loop=None):
+        """
+        :param path: database file
+        :param flush_interval: seconds between flushes
+        :param decay: seconds to forgive one strike, used to prune expired offenders on open
+        :param loop:
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.decay = decay
+        self.loop = loop
+
+        self._conn = None
+        self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='storage')
+        self._pending = {}
+        self._flusher = None
+        self._flush_lock = asyncio.Lock()
+
+        self.flushes = 0
+        self.written = 0
+
+    async def _run(self, func, *args):
+        return await self.loop.run_in_executor(self._thread, func, *args)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS offenders ('
+                         'chat_id INTEGER NOT NULL, user_id INTEGER NOT NULL, '
+                         'strikes INTEGER NOT NULL, updated REAL NOT NULL, '
+                         'PRIMARY KEY (chat_id, user_id))')
+            conn.execute('CREATE TABLE IF NOT EXISTS chats ('
+                         'chat_id INTEGER PRIMARY KEY, settings TEXT NOT NULL)')
+            if self.decay:
+                cursor = conn.execute('DELETE FROM offenders WHERE updated + strikes * ? < ?',
+                                      (self.decay, time.time()))
+                logger.info('Pruned %d expired offenders', cursor.rowcount)
+        return conn
+
+    async def open(self):
+        if self._conn is not None:
+            return
+
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+
+        self._conn = await self._run(self._connect)
+        self._flusher = self.loop.create_task(self._flush_periodically())
+        logger.info('SQLite storage opened: %s', self.path)
+
+    async def close(self):
+        if self._conn is None:
+            return
+
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+
+        await self.flush()
+        await self._run(self._conn.close)
+        self._conn = None
+        self._thread.shutdown()
+        logger.info('SQLite storage closed, %d offender updates in %d flushes', self.written, self.flushes)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception('Storage flush failed')
+
+    def _write(self, rows):
+        saved = [row for row in rows if row[2] > 0]
+        dropped = [row[:2] for row in rows if row[2] <= 0]
+
+        with self._conn:
+            if saved:
+                self._conn.executemany('INSERT OR REPLACE INTO offenders (chat_id, user_id, strikes, updated) '
+                                       'VALUES (?, ?, ?, ?)', saved)
+            if dropped:
+                self._conn.executemany('DELETE FROM offenders WHERE chat_id = ? AND user_id = ?', dropped)
+
+    async def flush(self):
+        """ Write all pending offender updates in one transaction """
+        async with self._flush_lock:
+            if not self._pending or self._conn is None:
+                return
+
+            pending, self._pending = self._pending, {}
+            rows = [(chat_id, user_id, strikes, updated)
+                    for (chat_id, user_id), (strikes, updated) in pending.items()]
+            try:
+                await self._run(self._write, rows)
+            except Exception:
+                # put rows back unless they were updated meanwhile
+                for key, value in pending.items():
+                    self._pending.setdefault(key, value)
+                raise
+
+            self.flushes += 1
+            self.written += len(rows)
+            logger.debug('Flushed %d offender updates', len(rows))
+
+    def save_offender(self, chat_id, user_id, strikes, updated):
+        self._pending[chat_id, user_id] = strikes, updated
+
+    def _select_offenders(self, chat_id):
+        cursor = self._conn.execute('SELECT user_id, strikes, updated FROM offenders WHERE chat_id = ?', (chat_id,))
+        return cursor.fetchall()
+
+    async def load_offenders(self, chat_id):
+        rows = {user_id: (strikes, updated) for user_id, strikes, updated in
+                await self._run(self._select_offenders, chat_id)}
+
+        # not flushed yet updates are newer
+        for (pending_chat_id, user_id), value in list(self._pending.items()):
+            if pending_chat_id == chat_id:
+                rows[user_id] = value
+
+        return [(user_id, strikes, updated) for user_id, (strikes, updated) in rows.items() if strikes > 0]
+
+    def _select_settings(self, chat_id):
+        row = self._conn.execute('SELECT settings FROM chats WHERE chat_id = ?', (chat_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def get_chat_settings(self, chat_id):
+        return await self._run(self._select_settings, chat_id)
+
+    def _replace_settings(self, chat_id, settings):
+        with self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO chats (chat_id, settings) VALUES (?, ?)',
+                               (chat_id, json.dumps(settings)))
+
+    async def set_chat_settings(self, chat_id, settings):
+        await self._run(self._replace_settings, chat_id, settings)
+
+
+def get_storage(mode, **kwargs):
+    """
+    Get storage by DB_MODE
+
+    :param mode: False for memory only state or 'sqlite'
+    :param kwargs: storage arguments
+    :return: storage
+    :rtype: BaseStorage
+    """
+    if not mode:
+        return MemoryStorage()
+
+    if mode == 'sqlite':
+        return SQLiteStorage(**kwargs)
+
+    raise ValueError(f'Unknown DB_MODE: {mode!r}')
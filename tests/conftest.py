@@ -0,0 +1,101 @@
+import asyncio
+import importlib.util
+import os
+import sys
+
+import pytest
+from aiogram import types
+from aiogram.utils.exceptions import NetworkError
+
+# modules import settings from config inside functions, tests run with example settings if there's no config
+try:
+    import config  # noqa: F401
+except ImportError:
+    spec = importlib.util.spec_from_file_location(
+        'config', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.example.py'))
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    sys.modules['config'] = config
+
+CHAT = {'id': -100, 'type': 'supergroup', 'title': 'Chat'}
+USER = {'id': 10, 'is_bot': False, 'first_name': 'User'}
+ADMIN = {'id': 20, 'is_bot': False, 'first_name': 'Admin'}
+
+
+class Clock:
+    """ Fake time for caches and limiters, moved by hand """
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeBot:
+    """
+    Fake Bot, which records calls of API methods, like send_message
+
+    Every method returns True, unless its result is given by name: value, exception to raise
+    or function of call arguments returning one of them. Methods of `fail` raise NetworkError.
+    """
+
+    def __init__(self, fail=(), **results):
+        self.calls = []
+        self.fail = fail
+        self.results = {
+            'get_chat': types.Chat(id=-200, type='supergroup'),
+            'get_chat_member': types.ChatMember(user=USER, status='member'),
+            'get_chat_administrators': [types.ChatMember(user=ADMIN, status='administrator')],
+        }
+        self.results.update(results)
+
+    def __getattr__(self, method):
+        if method.startswith('_'):
+            raise AttributeError(method)
+
+        async def call(*args, **kwargs):
+            self.calls.append((method, args, kwargs))
+            await asyncio.sleep(0)
+            if method in self.fail:
+                raise NetworkError('Telegram is down')
+
+            result = self.results.get(method, True)
+            if callable(result):
+                result = result(*args, **kwargs)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        return call
+
+    def methods(self):
+        """ Called methods except admins lookups, which are done by most of checks """
+        return [method for method, args, kwargs in self.calls if method != 'get_chat_administrators']
+
+    def call(self, method):
+        """ Arguments of the first call of method """
+        return next((args, kwargs) for name, args, kwargs in self.calls if name == method)
+
+    def count(self, method):
+        return sum(name == method for name, args, kwargs in self.calls)
+
+
+def message(text, message_id=1, user=USER, entities=None, reply_to=None):
+    return types.Message(message_id=message_id, date=1530000000, chat=CHAT, text=text, entities=entities or [],
+                         reply_to_message=reply_to and reply_to.to_python(), **{'from': user})
+
+
+def url_entities(text):
+    start = text.index('http')
+    return [{'type': 'url', 'offset': start, 'length': len(text) - start}]
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def bot():
+    return FakeBot()
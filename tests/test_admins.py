@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from aiogram import types
+
+from admins import AdminCache
+
+pytestmark = pytest.mark.asyncio
+
+
+def administrators(bot, *admins):
+    """ Make bot answer with list of admins, which can be changed later """
+    admins = list(admins)
+    bot.results['get_chat_administrators'] = lambda chat_id: [
+        types.ChatMember(user={'id': user_id, 'is_bot': False, 'first_name': 'Admin'}, status='administrator')
+        for user_id in admins]
+    return admins
+
+
+async def test_admins_cached(bot):
+    administrators(bot, 1, 2)
+    cache = AdminCache(bot)
+
+    results = await asyncio.gather(*(cache.is_admin(100, user_id) for user_id in (1, 2, 3)))
+    assert results == [True, True, False]
+    assert await cache.is_admin(100, 1)
+    assert bot.count('get_chat_administrators') == 1
+    assert cache.hits == 1
+    assert cache.hit_rate == 0.5
+
+
+async def test_admins_refresh(bot, clock):
+    admins = administrators(bot, 1)
+    cache = AdminCache(bot, ttl=100, clock=clock)
+    await cache.get(100)
+
+    # served from cache and refreshed in background
+    admins.append(2)
+    clock.now += 90
+    assert not await cache.is_admin(100, 2)
+    await asyncio.sleep(0.01)
+    assert await cache.is_admin(100, 2)
+    assert bot.count('get_chat_administrators') == 2
+
+    # expired
+    admins.remove(1)
+    clock.now += 100
+    assert not await cache.is_admin(100, 1)
+    assert bot.count('get_chat_administrators') == 3
+
+
+async def test_admins_invalidate(bot):
+    admins = administrators(bot, 1)
+    cache = AdminCache(bot)
+    assert not await cache.is_admin(100, 2)
+
+    admins.append(2)
+    cache.invalidate(100)
+    assert await cache.is_admin(100, 2)
+    assert bot.count('get_chat_administrators') == 2
+
+
+async def test_admins_recheck(bot, clock):
+    admins = administrators(bot, 1)
+    cache = AdminCache(bot, clock=clock)
+
+    # admins are served from cache
+    for _ in range(5):
+        assert await cache.is_admin(100, 1, recheck=True)
+    assert bot.count('get_chat_administrators') == 1
+
+    # promoted admin is found by recheck, but not right after fetch
+    admins.append(2)
+    assert not await cache.is_admin(100, 2, recheck=True)
+    clock.now += 10
+    assert not await cache.is_admin(100, 2)
+    assert await cache.is_admin(100, 2, recheck=True)
+    assert bot.count('get_chat_administrators') == 2
@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+import pytest
+
+from analytics import BaseSink, JSONLSink, NullSink, get_sink
+
+
+class ListSink(BaseSink):
+    def __init__(self, **kwargs):
+        super(ListSink, self).__init__(**kwargs)
+        self.batches = []
+
+    async def send(self, events):
+        self.batches.append(events)
+
+
+@pytest.mark.asyncio
+async def test_flush_by_size():
+    sink = ListSink(batch_size=3, flush_interval=60)
+    await sink.open()
+
+    for user_id in range(7):
+        assert sink.register_message(user_id, 'normal message')
+    await asyncio.sleep(0.01)
+
+    assert [len(batch) for batch in sink.batches] == [3, 3, 1]
+    await sink.close()
+    assert sink.sent == 7
+    assert len(sink) == 0
+
+
+@pytest.mark.asyncio
+async def test_flush_by_time():
+    sink = ListSink(batch_size=100, flush_interval=0.05)
+    await sink.open()
+
+    sink.register_message(1, 'explicit message')
+    assert sink.batches == []
+    await asyncio.sleep(0.1)
+
+    assert len(sink.batches) == 1
+    assert sink.batches[0][0]['intent'] == 'explicit message'
+    await sink.close()
+
+
+@pytest.mark.asyncio
+async def test_sampling_and_drops():
+    sink = ListSink(buffer_size=100, batch_size=1000, watermark=0.5)
+
+    kept = sum(sink.register_message(user_id, 'normal message') for user_id in range(1000))
+
+    assert 50 < kept <= 100
+    assert len(sink) == kept
+    assert sink.dropped['normal message'] + sink.sampled_out['normal message'] == 1000 - kept
+    assert sink.sampled_out['normal message'] > 0
+
+    weights = [event['weight'] for event in sink._buffer]
+    assert weights[:51] == [1.0] * 51
+    assert all(weight > 1 for weight in weights[51:])
+
+
+@pytest.mark.asyncio
+async def test_send_failure_is_counted():
+    class FailingSink(BaseSink):
+        async def send(self, events):
+            raise ConnectionError('Chatbase is down')
+
+    sink = FailingSink(batch_size=2)
+    for user_id in range(3):
+        sink.register_message(user_id, 'normal message')
+    await sink.flush()
+
+    assert sink.failed == 3
+    assert sink.sent == 0
+    assert len(sink) == 0
+
+
+@pytest.mark.asyncio
+async def test_jsonl_sink(tmp_path):
+    path = tmp_path / 'analytics.jsonl'
+    sink = get_sink('jsonl', path=str(path), batch_size=2)
+    assert isinstance(sink, JSONLSink)
+    await sink.open()
+
+    sink.register_message(1, 'normal message', 'привет')
+    sink.register_message(2, 'explicit message')
+    sink.register_message(3, 'normal message')
+    await sink.close()
+
+    events = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert [(event['user_id'], event['intent']) for event in events] == \
+           [(1, 'normal message'), (2, 'explicit message'), (3, 'normal message')]
+    assert events[0]['message'] == 'привет'
+
+
+def test_get_sink():
+    assert isinstance(get_sink(False), NullSink)
+    with pytest.raises(ValueError):
+        get_sink('statsd')
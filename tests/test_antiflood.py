@@ -0,0 +1,90 @@
+import pytest
+from aiogram import types
+from aiogram.dispatcher import CancelHandler
+
+from analytics import NullSink
+from antiflood import FloodDetector, FloodMiddleware, BURST, SUSTAINED, FLOODING
+from moderator import Moderator
+from tests.conftest import ADMIN, CHAT, USER, message
+
+
+def test_burst(clock):
+    detector = FloodDetector(burst_count=3, burst_window=1, mute_time=10, clock=clock)
+
+    assert detector.hit(1, 10) is None
+    assert detector.hit(1, 10) is None
+    # other users and chats are counted apart
+    assert detector.hit(1, 11) is None
+    assert detector.hit(2, 10) is None
+    assert detector.hit(1, 10) == BURST
+    assert detector.hit(1, 10) == FLOODING
+
+    clock.now += 11
+    assert detector.hit(1, 10) is None
+
+
+def test_sustained(clock):
+    detector = FloodDetector(burst_count=3, burst_window=1, sustained_count=5, sustained_window=10, clock=clock)
+
+    verdicts = []
+    for _ in range(5):
+        verdicts.append(detector.hit(1, 10))
+        clock.now += 2
+    assert verdicts == [None, None, None, None, SUSTAINED]
+
+
+def test_idle_eviction(clock):
+    detector = FloodDetector(burst_window=1, sustained_window=10, mute_time=10, max_size=3, clock=clock)
+
+    for user_id in range(3):
+        detector.hit(1, user_id)
+    clock.now += 5
+    detector.hit(1, 3)
+    assert len(detector) == 3
+
+    clock.now += 6
+    detector.hit(1, 4)
+    assert len(detector) == 2
+
+
+def test_album_counted_once(clock):
+    detector = FloodDetector(burst_count=3, burst_window=1, clock=clock)
+
+    assert [detector.hit(1, 10, 'album') for _ in range(10)] == [None] * 10
+    assert detector.hit(1, 10, 'other album') is None
+    assert detector.hit(1, 10) == BURST
+    # album of punished user is still flooding
+    assert detector.hit(1, 10, 'one more album') == FLOODING
+    assert detector.hit(1, 10, 'one more album') == FLOODING
+
+
+def photo(message_id, media_group_id, user=USER):
+    return types.Message(message_id=message_id, date=1530000000, chat=CHAT, media_group_id=media_group_id,
+                         photo=[{'file_id': str(message_id), 'width': 1, 'height': 1}], **{'from': user})
+
+
+@pytest.mark.asyncio
+async def test_middleware_album(bot):
+    middleware = FloodMiddleware(Moderator(bot, NullSink()))
+
+    for message_id in range(10):
+        await middleware.on_pre_process_message(photo(message_id, 'album'))
+
+    assert bot.methods() == []
+
+
+@pytest.mark.asyncio
+async def test_middleware_admin_commands(bot):
+    middleware = FloodMiddleware(Moderator(bot, NullSink()))
+
+    for message_id in range(10):
+        await middleware.on_pre_process_message(message('!бан', message_id=message_id, user=ADMIN))
+    assert bot.methods() == []
+    assert len(middleware.detector) == 0
+
+    # the same burst of user is flood
+    with pytest.raises(CancelHandler):
+        for message_id in range(10):
+            await middleware.on_pre_process_message(message('!бан', message_id=message_id))
+    await middleware.moder.scheduler.close()
+    assert bot.methods() == ['restrict_chat_member', 'send_message']
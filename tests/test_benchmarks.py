@@ -0,0 +1,47 @@
+import json
+import logging
+
+from benchmarks import suite
+from explicit import matcher
+
+
+def report(per_second, p99_ms):
+    return {'results': [{'name': 'dispatcher', 'count': 100, 'per_second': per_second, 'p50_ms': 0.3,
+                         'p99_ms': p99_ms}]}
+
+
+def test_result():
+    item = suite.result('get_time', [0.001] * 99 + [0.01], 0.5, 0.2)
+    assert item == {'name': 'get_time', 'count': 100, 'per_second': 200.0, 'p50_ms': 1.0, 'p99_ms': 10.0,
+                    'cpu_ms': 2.0}
+
+
+def test_compare():
+    baseline = report(1000, 5.0)
+
+    assert suite.compare(report(900, 5.5), baseline) == []
+    assert suite.compare(report(700, 5.0), baseline) == ['dispatcher: 700 msg/s, was 1000']
+    assert suite.compare(report(1000, 7.0), baseline) == ['dispatcher: p99 7.0 ms, was 5.0']
+    assert suite.compare(report(100, 50.0), {'results': []}) == []
+
+
+def test_failed_benchmark(monkeypatch, tmp_path):
+    def fail(count, prefilter=True):
+        raise AttributeError('current_task')
+
+    # explicit benchmark turns verdict cache off
+    monkeypatch.setattr(matcher.cache, 'size', matcher.cache.size)
+    monkeypatch.setattr(suite, 'bench_dispatcher', fail)
+    monkeypatch.setattr(suite, 'isolated', lambda func, *args: func(*args))
+    output = tmp_path / 'results.json'
+
+    try:
+        assert suite.main(['--count', '10', '--output', str(output)]) == 0
+    finally:
+        logging.disable(logging.NOTSET)
+
+    results = json.loads(output.read_text())['results']
+    assert [item['name'] for item in results if 'skipped' in item] == ['dispatcher.full_chain', 'dispatcher']
+    assert results[-1]['skipped'] == 'AttributeError: current_task'
+    assert all(item['count'] == 10 for item in results if 'skipped' not in item)
+    assert suite.compare({'results': results}, report(1000, 5.0)) == []
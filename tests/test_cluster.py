@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+import pytest
+
+import cluster
+
+
+def update(chat_id=None, user_id=1):
+    message = {'message_id': 1, 'from': {'id': user_id, 'is_bot': False, 'first_name': 'User'}, 'text': 'text'}
+    if chat_id is not None:
+        message['chat'] = {'id': chat_id, 'type': 'supergroup'}
+    return json.dumps({'update_id': 1, 'message': message}).encode()
+
+
+def test_route():
+    assert cluster.route(update(-1001234567890), 4) == -1001234567890 % 4
+    assert cluster.route(update(-1001234567891), 4) == cluster.route(update(-1001234567891, user_id=2), 4)
+    assert cluster.route(update(user_id=7), 4) == 3
+    assert cluster.route(b'{"update_id": 1}', 4) == 0
+
+
+@pytest.mark.asyncio
+async def test_forward(tmp_path):
+    sockets = [str(tmp_path / f'worker-{index}.sock') for index in range(2)]
+    received = [[], []]
+
+    def processor(index):
+        async def process(body):
+            received[index].append(json.loads(body)['message']['chat']['id'])
+        return process
+
+    servers = [await cluster.serve(socket_path, processor(index)) for index, socket_path in enumerate(sockets)]
+    master = cluster.Master(sockets)
+
+    chats = [-100, -101, -102, -103, -100]
+    for chat_id in chats:
+        assert await master.forward(update(chat_id))
+    await asyncio.sleep(0.05)
+
+    assert received == [[-100, -102, -100], [-101, -103]]
+    assert master.forwarded == [3, 2]
+
+    await master.close()
+    for server in servers:
+        server.close()
+    assert not await master.forward(update(-200, 1))
+    assert master.failed == 1
+
+
+@pytest.mark.asyncio
+async def test_handle(tmp_path):
+    class Request:
+        async def read(self):
+            return update(-100)
+
+    socket_path = str(tmp_path / 'worker.sock')
+    server = await cluster.serve(socket_path, lambda body: asyncio.sleep(0))
+    master = cluster.Master([socket_path])
+
+    response = await master.handle(Request())
+    assert response.status == 200
+
+    await master.close()
+    server.close()
+    await server.wait_closed()
+    response = await master.handle(Request())
+    assert response.status == 503
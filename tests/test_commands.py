@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+import pytest
+
+from commands import Command, CommandRouter
+
+
+def message(text):
+    return SimpleNamespace(text=text, message_id=1, chat=SimpleNamespace(id=-100))
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('!бан', Command('ban')),
+    ('!бан 2 дня -', Command('ban', '2 дня -', True)),
+    ('!БАН на сутки', Command('ban', 'на сутки')),
+    ('! мут 5 минут', Command('mute', '5 минут')),
+    ('!молчи на пару часов', Command('mute', 'на пару часов')),
+    ('!mute@TrueModerBot 30 мин', Command('mute', '30 мин')),
+    ('!разбан', Command('unban')),
+    ('!unban', Command('unban')),
+    ('!пред -', Command('warn', '-', True)),
+    ('!удали', Command('delete')),
+    ('!бан -5 минут', Command('ban', '-5 минут')),
+    ('!забанить 2 дня', Command('ban', '2 дня')),
+    ('!Удалить', Command('delete')),
+    # words, which merely start like commands
+    ('!Удалось починить!', None),
+    ('!Предлагаю встретиться', None),
+    ('!банально', None),
+    ('!мутная тема', None),
+    ('!delicious', None),
+    ('!молчание', None),
+    ('!привет', None),
+    ('!!!', None),
+    ('привет !бан', None),
+    ('бан', None),
+    ('', None),
+])
+def test_parse(text, expected):
+    assert CommandRouter().parse(text) == expected
+
+
+def test_duration():
+    command = CommandRouter().parse('!мут на полчаса -')
+    assert command.duration.seconds == 30 * 60
+    assert command.delete
+
+
+def test_register_unknown():
+    with pytest.raises(ValueError):
+        CommandRouter().register('kill', None)
+
+
+@pytest.mark.asyncio
+async def test_dispatch():
+    router = CommandRouter()
+    calls = []
+
+    async def ban(msg, command):
+        calls.append((msg.text, command))
+
+    router.register('ban', ban)
+
+    assert await router.dispatch(message('!бан 3 дня'))
+    assert calls == [('!бан 3 дня', Command('ban', '3 дня'))]
+
+    # known command without handler and not a command
+    assert not await router.dispatch(message('!мут'))
+    assert not await router.dispatch(message('обычное сообщение'))
+    assert len(calls) == 1
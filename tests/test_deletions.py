@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from aiogram.utils.exceptions import BadRequest, MessageToDeleteNotFound, NotFound
+
+from deletions import DeletionQueue
+
+pytestmark = pytest.mark.asyncio
+
+
+def request(method, data):
+    if '-' in data['message_ids']:
+        return BadRequest('Message can\'t be deleted')
+    return True
+
+
+def delete_message(chat_id, message_id):
+    if message_id < 0:
+        return MessageToDeleteNotFound('Message to delete not found')
+    return True
+
+
+@pytest.fixture
+def bot(bot):
+    bot.results.update(request=request, delete_message=delete_message)
+    return bot
+
+
+def requests(bot):
+    return [args[1]['message_ids'] for method, args, kwargs in bot.calls if method == 'request']
+
+
+def deleted(bot):
+    return sorted(args for method, args, kwargs in bot.calls if method == 'delete_message' and args[1] >= 0)
+
+
+async def test_bulk_deletion(bot):
+    queue = DeletionQueue(bot, batch_size=3, delay=0.01)
+
+    futures = [queue.delete(1, message_id) for message_id in range(4)] + [queue.delete(2, 10)]
+    assert queue.depth == 5
+    assert await asyncio.gather(*futures) == [True] * 5
+
+    assert requests(bot) == ['[0, 1, 2]']
+    assert deleted(bot) == [(1, 3), (2, 10)]
+    assert queue.depth == 0
+    assert queue.deleted == 5
+    assert queue.latency_max >= queue.latency_avg > 0
+
+
+async def test_fanout_fallback(bot):
+    bot.results['request'] = NotFound('Not Found')
+    queue = DeletionQueue(bot, delay=0.01)
+
+    futures = [queue.delete(1, message_id) for message_id in (1, 2, -3)]
+    assert await asyncio.gather(*futures) == [True, True, False]
+    assert not queue.bulk
+    assert queue.failed == 1
+
+
+async def test_bulk_failure_fallback(bot):
+    queue = DeletionQueue(bot, delay=0.01)
+
+    futures = [queue.delete(1, message_id) for message_id in (1, -2, 3)]
+    assert await asyncio.gather(*futures) == [True, False, True]
+    assert queue.bulk
+    assert len(requests(bot)) == 1
+    assert deleted(bot) == [(1, 1), (1, 3)]
+    assert queue.failed == 1
+
+
+async def test_close_flushes(bot):
+    queue = DeletionQueue(bot, delay=60)
+
+    futures = [queue.delete(1, 1), queue.delete(1, 2)]
+    await queue.close()
+    assert all(future.done() for future in futures)
+    assert len(requests(bot)) == 1
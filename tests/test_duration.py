@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+import pytest
+from hypothesis import given, strategies as st
+
+import duration
+from duration import MAX_SECONDS, UNIT_SECONDS, Duration, parse
+
+UNITS = {
+    'минут': 'minutes', 'мин': 'minutes', 'минуты': 'minutes',
+    'час': 'hours', 'часа': 'hours', 'часов': 'hours',
+    'день': 'days', 'дня': 'days', 'дней': 'days', 'сутки': 'days', 'суток': 'days',
+    'неделю': 'weeks', 'недели': 'weeks', 'недель': 'weeks',
+}
+COMMANDS = ('!мут', '!бан', '!молчи', '/mute', '/ban')
+FILLER = st.text(alphabet='abc xyz,.!абв эюя', max_size=20)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('!мут', Duration(1, 'hours', '1 час.')),
+    ('!мут 5 минут', Duration(5, 'minutes', '5 минут')),
+    ('!мут на 30 мин', Duration(30, 'minutes', '30 мин')),
+    ('!молчи 2 часа', Duration(2, 'hours', '2 часа')),
+    ('!мут на полчаса', Duration(0.5, 'hours', '0.5 часа')),
+    ('!мут пол часа -', Duration(0.5, 'hours', '0.5 часа')),
+    ('!мут на пару часов', Duration(2, 'hours', '2 часов')),
+    ('!бан на день', Duration(1, 'days', '1 день')),
+    ('!бан на сутки', Duration(1, 'days', '1 сутки')),
+    ('!бан 3 дня', Duration(3, 'days', '3 дня')),
+    ('!бан на пару недель', Duration(2, 'weeks', '2 недель')),
+    ('!бан 5 Минут', Duration(5, 'minutes', '5 Минут')),
+    ('!мут 30минут', Duration(30, 'minutes', '30 минут')),
+    ('!бан 3дня', Duration(3, 'days', '3 дня')),
+    ('!мут 10мин -', Duration(10, 'minutes', '10 мин')),
+    # units and "пол" inside other words are not tokens
+    ('!мут администратора 5', Duration(5, 'hours', '5 час.')),
+    ('!бан полный 2 дня', Duration(2, 'days', '2 дня')),
+])
+def test_parse(text, expected):
+    assert parse(text) == expected
+
+
+def test_delta():
+    assert parse('!мут 5 минут').delta == timedelta(minutes=5)
+    assert parse('!бан на полдня').seconds == 12 * 60 * 60
+    assert parse('!бан 999999999 недель').seconds == MAX_SECONDS
+
+
+@given(st.sampled_from(COMMANDS), st.integers(0, 10 ** 6), st.sampled_from(('', ' ')), st.sampled_from(sorted(UNITS)),
+       FILLER)
+def test_number_and_unit(command, number, space, unit, tail):
+    result = parse(f'{command} {number}{space}{unit} {tail}')
+    assert result.amount == number
+    assert result.unit == UNITS[unit]
+    assert result.text == f'{number} {unit}'
+    assert result.seconds == min(number * UNIT_SECONDS[UNITS[unit]], MAX_SECONDS)
+
+
+@given(st.sampled_from(COMMANDS), st.integers(1, 10 ** 6), st.sampled_from(sorted(UNITS)))
+def test_half(command, number, unit):
+    assert parse(f'{command} {number} пол{unit}').amount == number / 2
+
+
+@given(st.sampled_from(COMMANDS), st.sampled_from(sorted(UNITS)))
+def test_fuzzy_amounts(command, unit):
+    assert parse(f'{command} на пару {unit}').amount == duration.PAIR
+    assert duration.SEVERAL[0] <= parse(f'{command} на несколько {unit}').amount <= duration.SEVERAL[1]
+    assert parse(f'{command} на 7 пару {unit}').amount == 7
+
+
+@given(st.text())
+def test_any_text(text):
+    result = parse(text)
+    assert result.unit in UNIT_SECONDS
+    assert 0 <= result.seconds <= MAX_SECONDS
+    assert result.delta == timedelta(seconds=result.seconds)
@@ -1,15 +1,20 @@
+import json
 import logging
 
 import pytest
 
-from explicit import find_explicit
+from benchmarks import corpus
+from explicit import explicit_list, find_explicit, find_explicit_batch, matcher, normalize, setup_executor, \
+    shutdown_executor
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('TrueModerTest')
-pytestmark = pytest.mark.asyncio
 
-GOOD_WORDS = 'сабля', 'Употреблять', 'рубля', 'злоупотреблять', 'не психуй'
+GOOD_WORDS = 'сабля', 'Употреблять', 'рубля', 'злоупотреблять', 'не психуй', 'хлебать', 'не колеблясь', 'мандарин', \
+    'Дерматолог', 'хулиганы', 'XEP 45'
 BAD_WORDS = 'Хуй', 'хуйло', 'бля', 'пиздец'
+OBFUSCATED_WORDS = 'х.у.й', 'п-и-з-д-е-ц', 'xyйня', 'м_у_д_а_к', 'ПИИИЗДЕЦ'
+STRICT_WORDS = 'ж0пой', 'охуенный', 'у е б а н'
 
 
 @pytest.fixture(params=GOOD_WORDS)
@@ -22,6 +27,17 @@ def bad_word(request):
     return request.param
 
 
+@pytest.fixture(params=OBFUSCATED_WORDS)
+def obfuscated_word(request):
+    return request.param
+
+
+@pytest.fixture(params=STRICT_WORDS)
+def strict_word(request):
+    return request.param
+
+
+@pytest.mark.asyncio
 async def test_non_explicit(good_word):
     """ huy test """
     txt = f'Какое-то предложение и {good_word} среди него'
@@ -29,6 +45,7 @@ async def test_non_explicit(good_word):
     assert result is False
 
 
+@pytest.mark.asyncio
 async def test_explicit(bad_word):
     """ huy test """
     txt = f'Какое-то предложение и {bad_word} среди него'
@@ -37,3 +54,110 @@ async def test_explicit(bad_word):
 
 
 
+
+
+@pytest.mark.asyncio
+async def test_strict_non_explicit(good_word):
+    """ strict mode keeps exclude list """
+    txt = f'Какое-то предложение и {good_word} среди него'
+    result = await find_explicit(txt, strict=True)
+    assert result is False
+
+
+@pytest.mark.asyncio
+async def test_obfuscated_explicit(obfuscated_word):
+    """ normalized text reveals obfuscated words """
+    txt = f'Какое-то предложение и {obfuscated_word} среди него'
+    result = await find_explicit(txt)
+    assert result is True
+
+
+@pytest.mark.asyncio
+async def test_strict_explicit(strict_word):
+    """ strict mode finds words out of explicit list """
+    txt = f'Какое-то предложение и {strict_word} среди него'
+    assert await find_explicit(txt) is False
+    assert await find_explicit(txt, strict=True) is True
+
+
+def test_source_span(obfuscated_word):
+    """ explicit span points to source text """
+    txt = f'Какое-то предложение и {obfuscated_word}, да'
+    start, end = matcher.search(txt)
+    assert txt[start:end] == obfuscated_word
+
+
+def test_strict_clean_corpus():
+    """ strict patterns match whole words, not explicit stems inside clean ones """
+    texts = corpus.CLEAN + corpus.VOCABULARY + corpus.LOOKALIKE
+    assert [text for text in texts if matcher.strict.search(normalize(text).text)] == []
+
+
+def test_normalize():
+    normalized = normalize('Ну ты и х.у.й!!!')
+    assert normalized.text == 'ну ты и хуй!'
+    assert normalized.source_span(8, 11) == (8, 13)
+    assert normalize('х у й').text == 'хуй'
+    assert normalize('ну и с у к а').text == 'ну и сука'
+    assert normalize('XEP и xyйня').text == 'xep и хуйня'
+
+
+def test_verdict_cache():
+    matcher.cache.clear()
+    hits = matcher.cache.hits
+
+    assert matcher.match('Повтор: хуй') is True
+    assert matcher.match('ПОВТОР: ХУЙ') is True
+    assert matcher.cache.hits == hits + 1
+
+    matcher.update(words=explicit_list + ('повтор',))
+    assert len(matcher.cache) == 0
+    assert matcher.match('просто повтор') is True
+
+    matcher.update(words=explicit_list)
+    assert matcher.match('просто повтор') is False
+
+
+@pytest.mark.asyncio
+async def test_executor(bad_word):
+    """ long texts are scanned in worker process """
+    matcher.cache.clear()
+    executor = setup_executor(workers=1, threshold=100)
+    try:
+        txt = 'Какое-то длинное предложение без мата. ' * 10
+        assert await find_explicit(txt) is False
+        assert await find_explicit(f'{txt} {bad_word}') is True
+        assert await find_explicit(f'{txt} {bad_word}') is True
+        assert executor.calls == 2
+        assert executor.pending == 0
+    finally:
+        shutdown_executor()
+
+
+@pytest.mark.asyncio
+async def test_batch():
+    texts = [f'Какое-то предложение и {word} среди него' for word in GOOD_WORDS + BAD_WORDS]
+    expected = [False] * len(GOOD_WORDS) + [True] * len(BAD_WORDS)
+
+    assert await find_explicit_batch(texts) == expected
+
+    setup_executor(workers=2)
+    try:
+        assert await find_explicit_batch(texts, chunk_size=2) == expected
+    finally:
+        shutdown_executor()
+
+
+def test_main_keeps_lines(tmp_path, capsys):
+    from explicit import main
+
+    source = tmp_path / 'messages.jsonl'
+    source.write_text('{"text": "привет"}\n{"text": \n{"user": 1}\n"ну ты и хуйло"\n', encoding='utf-8')
+    main([str(source), '--jsonl', '--workers', '1'])
+
+    out, err = capsys.readouterr()
+    records = [json.loads(line) for line in out.splitlines()]
+    assert [record['explicit'] for record in records] == [False, None, None, True]
+    assert [record.get('line') for record in records] == [None, 2, 3, None]
+    assert 'invalid JSON' in records[1]['error']
+    assert '2 messages, 1 explicit, 2 skipped' in err
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from aiogram import types
+from aiogram.utils.exceptions import ChatNotFound, Unauthorized
+
+from mentions import MentionCache, USER, GROUP, CHANNEL, UNKNOWN
+
+pytestmark = pytest.mark.asyncio
+
+CHATS = {
+    '@someone': 'private',
+    '@somegroup': 'supergroup',
+    '@somechannel': 'channel',
+}
+
+
+def get_chat(chat_id):
+    if chat_id == '@hiddengroup':
+        return Unauthorized('Forbidden: bot is not a member of the supergroup chat')
+    if chat_id not in CHATS:
+        return ChatNotFound('Chat not found')
+    return types.Chat(id=1, type=CHATS[chat_id])
+
+
+@pytest.fixture
+def bot(bot):
+    bot.results['get_chat'] = get_chat
+    return bot
+
+
+@pytest.mark.parametrize('name, kind', [('@someone', USER), ('@SomeGroup', GROUP), ('@somechannel', CHANNEL),
+                                        ('@hiddengroup', GROUP), ('@nobody', UNKNOWN)])
+async def test_resolve(bot, name, kind):
+    cache = MentionCache(bot)
+    assert await cache.resolve(name) == kind
+
+
+async def test_coalescing(bot):
+    cache = MentionCache(bot)
+
+    kinds = await asyncio.gather(*(cache.resolve('@somegroup') for _ in range(10)))
+    assert kinds == [GROUP] * 10
+    assert await cache.resolve('@SOMEGROUP') == GROUP
+    assert len(bot.calls) == 1
+    assert cache.coalesced == 9
+    assert cache.hit_rate == 0.5
+
+
+async def test_ttl_and_size(bot, clock):
+    cache = MentionCache(bot, size=2, ttl=100, negative_ttl=10, clock=clock)
+
+    for name in ('@someone', '@nobody', '@somegroup'):
+        await cache.resolve(name)
+    assert len(cache) == 2
+
+    # negative entry expires earlier
+    clock.now += 50
+    await cache.resolve('@somegroup')
+    await cache.resolve('@nobody')
+    assert len(bot.calls) == 4
@@ -0,0 +1,96 @@
+import pytest
+
+import metrics
+
+
+def test_histogram_render():
+    histogram = metrics.Histogram('test_seconds', 'Test histogram', ('handler',), buckets=(0.01, 0.1))
+    histogram.observe(0.005, 'check_text')
+    histogram.observe(0.01, 'check_text')
+    histogram.observe(0.5, 'check_text')
+
+    assert histogram.render().splitlines() == [
+        '# HELP test_seconds Test histogram',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{handler="check_text",le="0.01"} 2',
+        'test_seconds_bucket{handler="check_text",le="0.1"} 2',
+        'test_seconds_bucket{handler="check_text",le="+Inf"} 3',
+        'test_seconds_sum{handler="check_text"} 0.515',
+        'test_seconds_count{handler="check_text"} 3',
+    ]
+    assert histogram.count('check_text') == 3
+    assert histogram.quantile(0.5, 'check_text') == 0.01
+    assert histogram.quantile(0.99, 'check_text') == float('inf')
+    assert histogram.quantile(0.5, 'welcome') == 0.0
+
+
+def test_counter_and_gauge():
+    counter = metrics.Counter('test_events', 'Test counter', ('reason',))
+    counter.inc('burst')
+    counter.inc('burst', amount=2)
+    assert counter.get('burst') == 3
+    assert 'test_events_total{reason="burst"} 3' in counter.render()
+
+    depth = [5]
+    gauge = metrics.Gauge('test_depth', 'Test gauge', ('queue',))
+    gauge.track(lambda: depth[0], 'deletions')
+    depth[0] = 7
+    assert 'test_depth{queue="deletions"} 7' in gauge.render()
+
+    assert 'name="a\\"b"' in metrics._labels(('name',), ('a"b',))
+
+
+@pytest.mark.asyncio
+async def test_handler_decorator():
+    metrics.HANDLER_LATENCY.clear()
+    metrics.HANDLER_ERRORS.clear()
+
+    @metrics.handler('check_link')
+    async def check_link(fail):
+        if fail:
+            raise ValueError('bad entity')
+
+    await check_link(False)
+    with pytest.raises(ValueError):
+        await check_link(True)
+
+    assert check_link.__name__ == 'check_link'
+    assert metrics.HANDLER_LATENCY.count('check_link') == 2
+    assert metrics.HANDLER_ERRORS.get('check_link') == 1
+
+
+@pytest.mark.asyncio
+async def test_measure_bot(bot):
+    metrics.API_LATENCY.clear()
+    metrics.API_ERRORS.clear()
+    bot.results['request'] = lambda method, data, files: ConnectionError('Telegram is down') \
+        if method == 'deleteMessage' else True
+    bot = metrics.measure_bot(bot)
+
+    assert await bot.request('sendMessage', {'text': 'hi'})
+    with pytest.raises(ConnectionError):
+        await bot.request('deleteMessage')
+
+    assert metrics.API_LATENCY.count('sendMessage') == 1
+    assert metrics.API_LATENCY.count('deleteMessage') == 1
+    assert metrics.API_ERRORS.get('deleteMessage', 'ConnectionError') == 1
+
+
+@pytest.mark.asyncio
+async def test_endpoint():
+    from aiohttp import web
+    from aiohttp.test_utils import TestClient, TestServer
+
+    metrics.THROTTLED.inc('burst')
+    app = web.Application()
+    app.router.add_get('/metrics', metrics.handle)
+
+    async with TestClient(TestServer(app)) as client:
+        response = await client.get('/metrics')
+        assert response.status == 200
+        assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+        text = await response.text()
+
+    assert '# TYPE truemoder_handler_seconds histogram' in text
+    assert 'truemoder_throttled_total{reason="burst"}' in text
+    assert any(line.startswith('truemoder_throttled{') for line in metrics.summary())
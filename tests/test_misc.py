@@ -0,0 +1,76 @@
+import io
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+from misc import JSONFormatter, QueueHandler, SamplingFilter
+
+
+def make_record(msg, *args, level=logging.INFO, lineno=10, exc_info=None):
+    return logging.LogRecord('TrueModer.moderator', level, 'moderator.py', lineno, msg, args, exc_info)
+
+
+def test_sampling_filter(clock):
+    sampling = SamplingFilter(limit=2, interval=60, clock=clock)
+
+    passed = [sampling.filter(make_record('Found explicit in message %s', message_id)) for message_id in range(5)]
+    assert passed == [True, True, False, False, False]
+
+    # other lines and warnings are not affected
+    assert sampling.filter(make_record('Checking entity', lineno=20))
+    assert sampling.filter(make_record('Flood control', level=logging.WARNING))
+
+    clock.now += 60
+    record = make_record('Found explicit in message %s', 6)
+    assert sampling.filter(record)
+    assert record.suppressed == 3
+    assert record.getMessage() == 'Found explicit in message 6 (+3 similar suppressed)'
+
+
+def test_sampling_disabled():
+    sampling = SamplingFilter(limit=0)
+    assert all(sampling.filter(make_record('text')) for _ in range(100))
+
+
+def test_json_formatter():
+    try:
+        raise ValueError('bad update')
+    except ValueError:
+        record = make_record('Error in update %s', 42, level=logging.ERROR, exc_info=sys.exc_info())
+
+    data = json.loads(JSONFormatter().format(record))
+    assert data['message'] == 'Error in update 42'
+    assert data['level'] == 'ERROR'
+    assert data['logger'] == 'TrueModer.moderator'
+    assert data['line'] == 10
+    assert 'ValueError: bad update' in data['exception']
+
+
+def test_queue_handler():
+    stream = io.StringIO()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JSONFormatter())
+
+    handler = QueueHandler(queue.SimpleQueue())
+    listener = logging.handlers.QueueListener(handler.queue, output)
+    listener.start()
+
+    test_logger = logging.getLogger('TrueModer.test_queue')
+    test_logger.propagate = False
+    test_logger.addHandler(handler)
+    try:
+        test_logger.warning('Deleted %d messages in chat %s', 3, -100)
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            test_logger.exception('Failed')
+    finally:
+        listener.stop()
+        test_logger.removeHandler(handler)
+
+    first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert first['message'] == 'Deleted 3 messages in chat -100'
+    assert second['message'] == 'Failed'
+    assert 'ZeroDivisionError' in second['exception']
@@ -0,0 +1,198 @@
+import time
+
+import pytest
+from aiogram import types
+
+from analytics import NullSink
+from moderator import Moderator
+from policy import MUTE
+from tests.conftest import ADMIN, CHAT, USER, message, url_entities
+
+EXPLICIT_URL = 'мудило http://example.com'
+
+
+def command(text):
+    return message(text, message_id=2, user=ADMIN, reply_to=message('спам', message_id=1))
+
+
+@pytest.fixture
+def moder(bot):
+    moder = Moderator(bot, NullSink())
+    moder.deletions.delay = 0
+    moder.deletions.bulk = False
+    return moder
+
+
+@pytest.mark.asyncio
+async def test_enforce_strongest_verdict(moder):
+    bot = moder._bot
+    # the third strike for explicit mutes for 15 minutes, which is longer than mute for link
+    moder.jail.set(CHAT['id'], USER['id'], 2)
+
+    now = time.time()
+    await moder.check_text(message(EXPLICIT_URL, entities=url_entities(EXPLICIT_URL)))
+    await moder.scheduler.close()
+
+    assert bot.methods().count('delete_message') == 1
+    restricts = [kwargs for method, args, kwargs in bot.calls if method == 'restrict_chat_member']
+    assert len(restricts) == 1
+    assert restricts[0]['until_date'] - now == pytest.approx(15 * 60, abs=5)
+    assert bot.methods().count('send_message') == 1
+
+
+@pytest.mark.asyncio
+async def test_enforce_link_only(moder):
+    bot = moder._bot
+    text = 'смотри http://example.com'
+
+    await moder.check_text(message(text, entities=url_entities(text)))
+    await moder.scheduler.close()
+
+    assert bot.methods() == ['delete_message', 'restrict_chat_member']
+
+
+@pytest.mark.asyncio
+async def test_failed_detector_keeps_other_verdicts(moder):
+    bot = moder._bot
+    bot.fail = ('get_chat',)
+    moder.policies.invalidate(CHAT['id'])
+    text = 'мудило @somegroup'
+
+    await moder.check_text(message(text, entities=[{'type': 'mention', 'offset': 7, 'length': 10}]))
+    await moder.scheduler.close()
+
+    # mention lookup failed, explicit is still deleted and warned
+    assert bot.methods() == ['get_chat', 'delete_message', 'send_message']
+    assert moder.jail.get(CHAT['id'], USER['id']) == 1
+
+
+@pytest.mark.asyncio
+async def test_enforce_without_delete(moder):
+    from policy import Verdict
+
+    bot = moder._bot
+    await moder.enforce(message('текст'), [Verdict('warn', MUTE, 60, 'Тише')], delete=False)
+    await moder.scheduler.close()
+
+    assert bot.methods() == ['send_message', 'restrict_chat_member']
+
+
+@pytest.mark.asyncio
+async def test_command_of_not_admin(moder):
+    bot = moder._bot
+    now = time.time()
+
+    await moder.check_text(message('!бан', message_id=2, reply_to=message('текст')))
+    await moder.scheduler.close()
+
+    assert bot.methods() == ['delete_message', 'restrict_chat_member']
+    args, kwargs = bot.call('delete_message')
+    assert args == (CHAT['id'], 2)
+    args, kwargs = bot.call('restrict_chat_member')
+    assert args[1] == USER['id']
+    assert kwargs['until_date'] - now == pytest.approx(30 * 60, abs=5)
+
+
+@pytest.mark.asyncio
+async def test_command_without_reply(moder):
+    bot = moder._bot
+
+    await moder.check_text(message('!мут', message_id=2, user=ADMIN))
+    await moder.scheduler.close()
+
+    assert bot.methods() == ['send_message']
+    assert bot.call('send_message')[1]['reply_to_message_id'] == 2
+
+
+@pytest.mark.asyncio
+async def test_ban_and_mute(moder):
+    bot = moder._bot
+    now = time.time()
+
+    await moder.check_text(command('!бан 2 дня -'))
+    await moder.check_text(command('!мут 5 минут'))
+    await moder.scheduler.close()
+
+    assert bot.methods() == ['kick_chat_member', 'send_message', 'delete_message',
+                             'restrict_chat_member', 'send_message']
+    args, kwargs = bot.call('kick_chat_member')
+    assert args == (CHAT['id'], USER['id'])
+    assert kwargs['until_date'] - now == pytest.approx(2 * 24 * 60 * 60, abs=5)
+    assert bot.call('delete_message')[0] == (CHAT['id'], 1)
+    assert bot.call('restrict_chat_member')[1]['until_date'] - now == pytest.approx(5 * 60, abs=5)
+
+
+@pytest.mark.asyncio
+async def test_unban(moder):
+    bot = moder._bot
+    moder.jail.set(CHAT['id'], USER['id'], 4)
+
+    bot.results['get_chat_member'] = types.ChatMember(user=USER, status='kicked')
+    await moder.check_text(command('!разбан'))
+    bot.results['get_chat_member'] = types.ChatMember(user=USER, status='member')
+    await moder.check_text(command('!разбан'))
+    await moder.scheduler.close()
+
+    assert bot.methods() == ['get_chat_member', 'unban_chat_member', 'send_message',
+                             'get_chat_member', 'restrict_chat_member', 'send_message']
+    assert bot.call('restrict_chat_member')[1]['can_send_messages'] is True
+    assert moder.jail.get(CHAT['id'], USER['id']) == 0
+
+
+@pytest.mark.asyncio
+async def test_warn(moder):
+    bot = moder._bot
+
+    await moder.check_text(command('!пред'))
+    assert bot.methods() == ['send_message']
+    assert moder.jail.get(CHAT['id'], USER['id']) == 1
+
+    bot.calls.clear()
+    await moder.check_text(command('!пред -'))
+    await moder.scheduler.close()
+    assert bot.methods() == ['delete_message', 'send_message']
+    assert bot.call('delete_message')[0] == (CHAT['id'], 1)
+    assert moder.jail.get(CHAT['id'], USER['id']) == 2
+
+
+@pytest.mark.asyncio
+async def test_delete_reply(moder):
+    bot = moder._bot
+
+    await moder.check_text(command('!удали'))
+    await moder.scheduler.close()
+
+    assert bot.methods() == ['delete_message', 'delete_message']
+    deleted = sorted(args for method, args, kwargs in bot.calls if method == 'delete_message')
+    assert deleted == [(CHAT['id'], 1), (CHAT['id'], 2)]
+
+
+@pytest.mark.asyncio
+async def test_raid_of_greetings(moder):
+    bot = moder._bot
+    greeting = 'Добро пожаловать к нам в чат, рады видеть!'
+
+    for user_id in range(30, 30 + moder.raids.size):
+        user = dict(USER, id=user_id)
+        await moder.check_text(message(greeting, message_id=user_id, user=user))
+    await moder.scheduler.close()
+
+    # similar messages alone are left alone
+    assert bot.methods() == []
+
+
+@pytest.mark.asyncio
+async def test_raid_with_links(moder):
+    bot = moder._bot
+    spam = 'Заходи в наш канал лучшие сигналы http://example.com'
+    now = time.time()
+
+    for user_id in range(30, 30 + moder.raids.size):
+        user = dict(USER, id=user_id)
+        await moder.check_text(message(spam, message_id=user_id, user=user, entities=url_entities(spam)))
+    await moder.scheduler.close()
+
+    # links before raid is found are muted for a while, then the whole raid is muted for a day
+    mutes = [kwargs['until_date'] - now for method, args, kwargs in bot.calls if method == 'restrict_chat_member']
+    assert len([seconds for seconds in mutes if seconds > 60 * 60]) == moder.raids.size
+    assert 'Похоже на рейд. Убираю спам.' in [args[1] for method, args, kwargs in bot.calls if method == 'send_message']
@@ -0,0 +1,65 @@
+from offenders import OffenderStore
+
+
+def test_strike_per_chat():
+    store = OffenderStore()
+
+    assert store.strike(1, 10) == 1
+    assert store.strike(1, 10) == 2
+    assert store.strike(2, 10) == 1
+    assert store.get(1, 10) == 2
+    assert store.get(3, 10) == 0
+
+
+def test_decay(clock):
+    store = OffenderStore(decay=60, clock=clock)
+
+    for _ in range(3):
+        store.strike(1, 10)
+
+    clock.now += 90
+    assert store.get(1, 10) == 2
+
+    # remainder of decay period is kept
+    clock.now += 30
+    assert store.get(1, 10) == 1
+    assert store.strike(1, 10) == 2
+
+    clock.now += 120
+    assert store.get(1, 10) == 0
+
+
+def test_set_and_forgive():
+    store = OffenderStore()
+
+    store.set(1, 10, 3)
+    assert store.get(1, 10) == 3
+
+    store.forgive(1, 10)
+    assert store.get(1, 10) == 0
+    assert not len(store)
+
+
+def test_hard_cap():
+    store = OffenderStore(max_size=3)
+
+    for user_id in range(5):
+        store.strike(1, user_id)
+    store.strike(1, 2)
+    store.strike(1, 5)
+
+    assert len(store) == 3
+    assert store.get(1, 3) == 0
+    assert store.get(1, 2) == 2
+
+
+def test_sweep(clock):
+    store = OffenderStore(decay=60, clock=clock)
+
+    store.strike(1, 10)
+    store.set(1, 11, 5)
+
+    clock.now += 60
+    assert store.sweep() == 1
+    assert len(store) == 1
+    assert store.get(1, 11) == 4
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+from policy import BAN, DEFAULT_POLICY, GROUP_MENTION, LINK, MUTE, WARN, Policy, PolicyCache, Verdict, strongest
+from storage import MemoryStorage
+
+
+class CountingStorage(MemoryStorage):
+    def __init__(self):
+        super(CountingStorage, self).__init__()
+        self.queries = 0
+
+    async def get_chat_settings(self, chat_id):
+        self.queries += 1
+        await asyncio.sleep(0)
+        return await super(CountingStorage, self).get_chat_settings(chat_id)
+
+
+def test_default_escalation():
+    assert [DEFAULT_POLICY.escalate(strikes) for strikes in range(7)] == [
+        (None, 0, None),
+        (WARN, 0, None),
+        (WARN, 0, None),
+        (MUTE, 15 * 60, None),
+        (MUTE, 20 * 60, None),
+        (BAN, 24 * 60 * 60, 3),
+        (BAN, 24 * 60 * 60, 3),
+    ]
+
+
+def test_content_types_and_entities():
+    assert DEFAULT_POLICY.deletes('sticker')
+    assert not DEFAULT_POLICY.deletes('voice')
+    assert not DEFAULT_POLICY.deletes('text')
+    assert DEFAULT_POLICY.entities == {'url': LINK, 'mention': GROUP_MENTION}
+
+    policy = Policy({'delete_types': ['voice'], 'entities': ['text_link'], 'entity_mute': 600, 'exempt': [7]})
+    assert policy.deletes('voice')
+    assert not policy.deletes('sticker')
+    assert policy.entities == {'text_link': LINK}
+    assert policy.entity_mute == 600
+    assert 7 in policy.exempt
+
+
+def test_custom_escalation():
+    policy = Policy({'escalation': [{'strikes': 2, 'action': BAN, 'seconds': 3600},
+                                    {'strikes': 1, 'action': MUTE, 'seconds': 60}]})
+    assert policy.escalate(1) == (MUTE, 60, None)
+    assert policy.escalate(10) == (BAN, 3600, None)
+    assert Policy({'escalation': []}).escalate(3) == (None, 0, None)
+
+    # steps are not expanded to a table of strikes
+    policy = Policy({'escalation': [{'strikes': 1, 'action': WARN}, {'strikes': 10 ** 9, 'action': BAN}]})
+    assert policy.escalate(0) == (None, 0, None)
+    assert policy.escalate(10 ** 9 - 1) == (WARN, 0, None)
+    assert policy.escalate(10 ** 12) == (BAN, 0, None)
+
+
+def test_strongest_verdict():
+    warn = Verdict('explicit', WARN, notice='Ай-ай-ай')
+    link = Verdict('link', MUTE, 65)
+    mute = Verdict('explicit', MUTE, 15 * 60)
+    ban = Verdict('explicit', BAN, 60)
+
+    assert strongest([]) is None
+    assert strongest([warn, link]) is link
+    assert strongest([link, mute]) is mute
+    assert strongest([mute, ban, link]) is ban
+    assert strongest([Verdict('group_mention')]).action is None
+
+
+@pytest.mark.parametrize('settings', [
+    {'delete_types': ['text']},
+    {'entities': ['hashtag']},
+    {'escalation': [{'strikes': 1, 'action': 'shoot'}]},
+    {'escalation': [{'action': WARN}]},
+    {'colour': 'red'},
+])
+def test_invalid_settings(settings):
+    with pytest.raises(ValueError):
+        Policy(settings)
+
+
+@pytest.mark.asyncio
+async def test_lazy_load_and_set():
+    storage = CountingStorage()
+    await storage.set_chat_settings(1, {'delete_types': ['voice']})
+    cache = PolicyCache(storage)
+
+    first, second = await asyncio.gather(cache.get(1), cache.get(1))
+    assert first is second
+    assert first.deletes('voice')
+    assert storage.queries == 1
+
+    assert await cache.get(1) is first
+    assert cache.hits == 1
+
+    assert await cache.get(2) is DEFAULT_POLICY
+
+    policy = await cache.set(2, {'exempt': [5]})
+    assert await cache.get(2) is policy
+    assert await storage.get_chat_settings(2) == {'exempt': [5]}
+
+    with pytest.raises(ValueError):
+        await cache.set(2, {'delete_types': ['text']})
+    assert await cache.get(2) is policy
+
+
+@pytest.mark.asyncio
+async def test_lru_and_invalid_stored_settings():
+    storage = CountingStorage()
+    await storage.set_chat_settings(3, {'delete_types': ['text']})
+    cache = PolicyCache(storage, size=2)
+
+    assert await cache.get(3) is DEFAULT_POLICY
+
+    await cache.get(1)
+    await cache.get(2)
+    await cache.get(1)
+    assert len(cache) == 2
+    queries = storage.queries
+
+    await cache.get(3)
+    await cache.get(1)
+    assert storage.queries == queries + 1
+
+    cache.invalidate(1)
+    await cache.get(1)
+    assert storage.queries == queries + 2
@@ -0,0 +1,60 @@
+import pytest
+from aiogram.dispatcher import CancelHandler
+
+from analytics import NullSink
+from moderator import Moderator
+from prefilter import PrefilterMiddleware
+from tests.conftest import CHAT, USER, message, url_entities
+
+CLEAN = 'Кто знает, когда выйдет новая версия библиотеки?'
+
+
+class Sink(NullSink):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def register_message(self, user_id, intent, message=None):
+        self.messages.append((user_id, intent))
+
+
+@pytest.fixture
+def prefilter(bot):
+    return PrefilterMiddleware(Moderator(bot, Sink()))
+
+
+@pytest.mark.asyncio
+async def test_clean_message(prefilter):
+    moder = prefilter.moder
+
+    with pytest.raises(CancelHandler):
+        await prefilter.on_pre_process_message(message(CLEAN))
+
+    assert prefilter.skipped == 1
+    assert prefilter.passed == 0
+    # registered by raid detector and analytics
+    assert len(moder.raids) == 1
+    assert moder.analytics.messages == [(USER['id'], 'normal message')]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('text, entities', [
+    ('смотри http://example.com', True),
+    ('ну ты и хуйло', False),
+    ('!бан 2 дня', False),
+])
+async def test_fall_through(prefilter, text, entities):
+    await prefilter.on_pre_process_message(message(text, entities=url_entities(text) if entities else None))
+
+    assert prefilter.skipped == 0
+    assert len(prefilter.moder.raids) == 0
+
+
+@pytest.mark.asyncio
+async def test_user_with_strikes(prefilter):
+    prefilter.moder.jail.set(CHAT['id'], USER['id'], 1)
+
+    await prefilter.on_pre_process_message(message(CLEAN))
+
+    assert prefilter.passed == 1
+    assert prefilter.skipped == 0
@@ -0,0 +1,86 @@
+from raid import Raid, RaidDetector, sketch, similarity
+
+SPAM = 'Заходи в наш канал лучшие сигналы крипта заработок без вложений пиши в лс бонус каждому'
+CHATTER = (
+    'Привет всем, как у вас дела сегодня?',
+    'Кто знает, когда выйдет новая версия библиотеки?',
+    'Посмотрите документацию, там всё расписано подробно',
+)
+
+
+def variant(text, index):
+    words = text.split()
+    words[index % len(words)] = f'слово{index}'
+    return ' '.join(words)
+
+
+def test_similarity():
+    assert sketch('два слова') is None
+    assert similarity(sketch(SPAM), sketch(variant(SPAM, 3))) >= 0.5
+    assert similarity(sketch(SPAM), sketch(CHATTER[0])) < 0.5
+
+
+def test_raid():
+    now = [0.0]
+    detector = RaidDetector(size=3, window=60, clock=lambda: now[0])
+
+    assert detector.check(1, 100, 1, SPAM) == Raid()
+    # the same user is not a raid
+    assert detector.check(1, 100, 2, variant(SPAM, 1)) == Raid()
+    # other chat
+    assert detector.check(2, 101, 3, SPAM) == Raid()
+    for message_id, text in enumerate(CHATTER, 10):
+        assert detector.check(1, message_id, message_id, text) == Raid()
+
+    assert detector.check(1, 101, 4, variant(SPAM, 2)) == Raid()
+    raid = detector.check(1, 102, 5, variant(SPAM, 3))
+    assert sorted(raid.messages) == [(100, 1), (100, 2), (101, 4), (102, 5)]
+    assert detector.raids == 1
+
+    # late messages of raid are reported one by one
+    assert detector.check(1, 103, 6, variant(SPAM, 4)).messages == [(103, 6)]
+
+    # raid is forgotten out of window
+    now[0] += 61
+    assert detector.check(1, 104, 7, SPAM) == Raid()
+
+
+def test_confirmed():
+    now = [0.0]
+    detector = RaidDetector(size=3, window=60, large_size=5, clock=lambda: now[0])
+
+    # wave of greetings is not confirmed, until it grows large
+    for user_id in range(100, 102):
+        detector.check(1, user_id, user_id, variant(SPAM, user_id))
+    assert detector.check(1, 102, 102, variant(SPAM, 102)).confirmed is False
+    assert detector.check(1, 103, 103, variant(SPAM, 103)).confirmed is False
+    assert detector.check(1, 104, 104, variant(SPAM, 104)).confirmed is True
+
+    # links or mentions
+    detector.check(2, 100, 1, SPAM)
+    detector.check(2, 101, 2, SPAM, signal=True)
+    assert detector.check(2, 102, 3, SPAM) == Raid([(100, 1), (101, 2), (102, 3)], True)
+
+    # new members
+    detector.check(3, 100, 1, SPAM)
+    detector.joined(3, 101)
+    detector.joined(3, 102)
+    detector.check(3, 101, 2, SPAM)
+    assert detector.check(3, 102, 3, SPAM).confirmed is True
+
+    # members joined long ago are not new
+    detector.joined(4, 101)
+    detector.joined(4, 102)
+    now[0] += detector.new_member_time + 1
+    detector.check(4, 100, 1, SPAM)
+    detector.check(4, 101, 2, SPAM)
+    assert detector.check(4, 102, 3, SPAM).confirmed is False
+
+
+def test_bounded():
+    detector = RaidDetector(max_entries=10, max_chats=2, clock=lambda: 0.0)
+
+    for message_id in range(20):
+        detector.check(message_id % 3, message_id, message_id, f'{SPAM} {message_id}')
+    assert len(detector) == 2
+    assert all(len(index.entries) <= 10 for index in detector._chats.values())
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+from aiogram.utils.exceptions import RetryAfter
+
+from scheduler import ActionScheduler, CHATTER, ENFORCE
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def bot(bot):
+    bot.results['send_message'] = lambda chat_id, text, **kwargs: text
+    return bot
+
+
+def flood(bot, times):
+    """ Make restricts of bot fail by flood control that many times """
+    left = [times]
+
+    def restrict_chat_member(chat_id, user_id, until_date):
+        if left[0]:
+            left[0] -= 1
+            return RetryAfter(0.01)
+        return True
+
+    bot.results['restrict_chat_member'] = restrict_chat_member
+
+
+async def test_priority(bot):
+    scheduler = ActionScheduler()
+
+    await asyncio.gather(
+        scheduler.run(CHATTER, 1, bot.send_message, 1, 'warning'),
+        scheduler.run(ENFORCE, 1, bot.restrict_chat_member, 1, 10, until_date=100),
+    )
+    assert bot.methods() == ['restrict_chat_member', 'send_message']
+    await scheduler.close()
+
+
+async def test_merge_restricts(bot):
+    scheduler = ActionScheduler()
+
+    results = await asyncio.gather(*(
+        scheduler.run(ENFORCE, 1, bot.restrict_chat_member, 1, 10, until_date=until, merge_key=('restrict', 1, 10))
+        for until in (100, 300, 200)
+    ))
+    assert results == [True] * 3
+    assert bot.calls == [('restrict_chat_member', (1, 10), {'until_date': 300})]
+    assert scheduler.merged == 2
+    await scheduler.close()
+
+
+async def test_chat_rate(bot):
+    scheduler = ActionScheduler(chat_rate=100, chat_burst=1)
+
+    # second message in chat 1 waits for token, chat 2 goes without waiting
+    await asyncio.gather(*(scheduler.run(CHATTER, chat_id, bot.send_message, chat_id, 'text')
+                           for chat_id in (1, 1, 2)))
+    assert [args[0] for method, args, kwargs in bot.calls] == [1, 2, 1]
+    await scheduler.close()
+
+
+async def test_retry_after(bot):
+    flood(bot, 2)
+    scheduler = ActionScheduler()
+
+    assert await scheduler.run(ENFORCE, 1, bot.restrict_chat_member, 1, 10, until_date=100)
+    assert scheduler.retried == 2
+
+    flood(bot, 5)
+    with pytest.raises(RetryAfter):
+        await scheduler.run(ENFORCE, 1, bot.restrict_chat_member, 1, 10, until_date=100)
+    await scheduler.close()
+
+
+async def test_enforce_bucket(bot):
+    scheduler = ActionScheduler(chat_rate=0.001, chat_burst=1, enforce_chat_rate=100, enforce_chat_burst=1)
+
+    # notifications have used up the chat bucket, restricts of the chat have own one
+    await scheduler.run(CHATTER, 1, bot.send_message, 1, 'text')
+    await asyncio.wait_for(asyncio.gather(*(
+        scheduler.run(ENFORCE, 1, bot.restrict_chat_member, 1, user_id, until_date=100) for user_id in range(3)
+    )), 1)
+    assert len(bot.calls) == 4
+    await scheduler.close()
+
+
+async def test_close_cancels_queued(bot):
+    scheduler = ActionScheduler(rate=0.001, burst=2, chat_rate=0.001, chat_burst=1)
+
+    await scheduler.run(CHATTER, 1, bot.send_message, 1, 'first')
+    # the second waits for chat token, the fourth for global one
+    pending = [asyncio.ensure_future(scheduler.run(CHATTER, 1, bot.send_message, 1, 'second')),
+               asyncio.ensure_future(scheduler.run(CHATTER, 2, bot.send_message, 2, 'third')),
+               asyncio.ensure_future(scheduler.run(CHATTER, 3, bot.send_message, 3, 'fourth'))]
+    await asyncio.sleep(0.01)
+    assert len(bot.calls) == 2
+    await scheduler.close()
+
+    done, not_done = await asyncio.wait(pending, timeout=1)
+    assert not not_done
+    assert pending[0].cancelled() and pending[2].cancelled()
+    assert pending[1].result() == 'third'
+
+
+async def test_moderator_say(bot):
+    from moderator import Moderator
+
+    moder = Moderator(bot, analytics=None)
+
+    assert await moder.say(-100, 'Привет') == 'Привет'
+    assert bot.methods() == ['send_message']
+    assert bot.call('send_message')[0] == (-100, 'Привет')
+    await moder.scheduler.close()
@@ -0,0 +1,111 @@
+import time
+
+import pytest
+
+from offenders import OffenderStore
+from storage import SQLiteStorage, MemoryStorage, get_storage
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def db(tmp_path):
+    return SQLiteStorage(str(tmp_path / 'test.db'), flush_interval=60)
+
+
+async def test_write_behind(db):
+    await db.open()
+    now = time.time()
+    for strikes in range(1, 4):
+        db.save_offender(1, 10, strikes, now)
+    db.save_offender(1, 11, 1, now)
+    db.save_offender(2, 10, 1, now)
+
+    # pending updates are seen before flush
+    assert sorted(await db.load_offenders(1)) == [(10, 3, now), (11, 1, now)]
+
+    await db.flush()
+    assert db.flushes == 1
+    assert db.written == 3
+    assert sorted(await db.load_offenders(1)) == [(10, 3, now), (11, 1, now)]
+
+    db.save_offender(1, 11, 0, now)
+    await db.flush()
+    assert await db.load_offenders(1) == [(10, 3, now)]
+    await db.close()
+
+
+async def test_reopen(tmp_path):
+    path = str(tmp_path / 'test.db')
+    now = time.time()
+
+    db = SQLiteStorage(path, decay=60)
+    await db.open()
+    db.save_offender(1, 10, 2, now)
+    db.save_offender(1, 11, 1, now - 120)
+    await db.set_chat_settings(1, {'strict': True})
+    await db.close()
+
+    db = SQLiteStorage(path, decay=60)
+    await db.open()
+    assert await db.load_offenders(1) == [(10, 2, now)]
+    assert await db.get_chat_settings(1) == {'strict': True}
+    assert await db.get_chat_settings(2) is None
+    await db.close()
+
+
+async def test_offenders_warm_load(db):
+    await db.open()
+    store = OffenderStore(storage=db)
+    store.strike(1, 10)
+    store.strike(1, 10)
+    await db.flush()
+
+    store = OffenderStore(storage=db)
+    assert store.get(1, 10) == 0
+    await store.load(1)
+    assert store.get(1, 10) == 2
+    assert store.strike(1, 10) == 3
+
+    # chat is loaded once
+    db.save_offender(1, 10, 5, time.time())
+    await store.load(1)
+    assert store.get(1, 10) == 3
+    await db.close()
+
+
+async def test_offenders_evict_chats(db):
+    await db.open()
+    queries = []
+    load_offenders = db.load_offenders
+
+    async def counting(chat_id):
+        queries.append(chat_id)
+        return await load_offenders(chat_id)
+
+    db.load_offenders = counting
+    store = OffenderStore(max_size=3, storage=db)
+    for chat_id in (1, 2):
+        await store.load(chat_id)
+        store.strike(chat_id, 10)
+        store.strike(chat_id, 11)
+    await db.flush()
+
+    # the longest untouched chat is dropped as a whole
+    assert len(store) == 2
+    assert store.get(1, 10) == 0
+
+    # and is loaded again once
+    await store.load(1)
+    await store.load(1)
+    assert store.get(1, 10) == 1
+    assert store.get(1, 11) == 1
+    assert queries == [1, 2, 1]
+    await db.close()
+
+
+async def test_get_storage():
+    assert isinstance(get_storage(False), MemoryStorage)
+    assert isinstance(get_storage('sqlite', path=':memory:'), SQLiteStorage)
+    with pytest.raises(ValueError):
+        get_storage('mongo')